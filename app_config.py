@@ -0,0 +1,189 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+import aiofiles
+import aiofiles.os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# необязательный JSON с настройками, которые меняются без рестарта (пример - config/app.example.json)
+CONFIG_FILE = os.getenv("CONFIG_FILE", "config/app.json")
+CONFIG_WATCH_SEC = float(os.getenv("CONFIG_WATCH_SEC", "5"))  # как часто проверять mtime файлов, 0 - только /reload_config
+
+def _env_list(name: str, default: str = "", sep: str = ",") -> tuple[str, ...]:
+    return tuple(x.strip() for x in os.getenv(name, default).split(sep) if x.strip())
+
+@dataclass(frozen=True)
+class Settings:
+    """
+    Снимок настроек: значения из .env, поверх - из CONFIG_FILE.
+    Объект неизменяемый и заменяется целиком, поэтому поток браузера
+    читает его без блокировок.
+    """
+    allowed_cities: tuple[str, ...] = ()
+    sched_interval_sec: int = 30
+    no_slots_phrases: Optional[tuple[str, ...]] = None  # None - встроенные английские фразы (web_bot.NO_SLOTS_PHRASES)
+    no_slots_locales: tuple[str, ...] = ("ru",)
+    no_slots_extra: tuple[str, ...] = ()
+    locators: dict = field(default_factory=dict)  # группа -> [(By.*, selector)], заменяет встроенный список
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            allowed_cities=_env_list("ALLOWED_CITIES"),
+            sched_interval_sec=int(os.getenv("SCHED_INTERVAL_SEC", "30")),
+            no_slots_locales=tuple(c.lower() for c in _env_list("NO_SLOTS_LOCALES", "ru")),
+            no_slots_extra=_env_list("NO_SLOTS_EXTRA", sep="|"),
+        )
+
+    def merged(self, data: dict) -> "Settings":
+        """Настройки с переопределениями из файла; ошибка формата - ValueError."""
+        if not isinstance(data, dict):
+            raise ValueError("ожидается JSON-объект")
+        values = {}
+        if "allowed_cities" in data:
+            values["allowed_cities"] = tuple(str(c).strip() for c in data["allowed_cities"] if str(c).strip())
+        if "sched_interval_sec" in data:
+            interval = int(data["sched_interval_sec"])
+            if interval <= 0:
+                raise ValueError("sched_interval_sec должен быть > 0")
+            values["sched_interval_sec"] = interval
+        no_slots = data.get("no_slots") or {}
+        if "phrases" in no_slots:
+            values["no_slots_phrases"] = tuple(str(p) for p in no_slots["phrases"] if str(p).strip())
+        if "locales" in no_slots:
+            values["no_slots_locales"] = tuple(str(c).strip().lower() for c in no_slots["locales"] if str(c).strip())
+        if "extra" in no_slots:
+            values["no_slots_extra"] = tuple(str(p) for p in no_slots["extra"] if str(p).strip())
+        if "locators" in data:
+            locators = {}
+            for group, items in (data["locators"] or {}).items():
+                pairs = [tuple(map(str, item)) for item in items]
+                if not pairs or any(len(p) != 2 for p in pairs):
+                    raise ValueError(f"locators.{group}: нужен список пар [by, selector]")
+                locators[group] = pairs
+            values["locators"] = locators
+        return Settings(**{**self.__dict__, **values})
+
+Listener = Callable[[Settings, set[str]], Awaitable[None]]
+
+class ConfigStore:
+    """
+    Настройки и файловые ресурсы (текст соглашения, профили опроса) в памяти.
+    Файлы читаются асинхронно (aiofiles) при старте и заново - только когда меняется
+    их mtime (фоновая проверка раз в CONFIG_WATCH_SEC) или по /reload_config.
+    Обработчики апдейтов берут готовые значения и не трогают диск.
+    """
+    def __init__(self, path: str = CONFIG_FILE, watch_sec: float = CONFIG_WATCH_SEC):
+        self.path = path
+        self.watch_sec = watch_sec
+        self._env = Settings.from_env()
+        self.current: Settings = self._env
+        self._texts: dict[str, Optional[str]] = {}            # путь -> содержимое (None - файла нет)
+        self._mtimes: dict[str, Optional[float]] = {}
+        self._listeners: list[Listener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+        self.last_error: Optional[str] = None
+
+    # ---- чтение (без I/O) ----
+    def text(self, path: str) -> Optional[str]:
+        """Закешированное содержимое файла-ресурса или None, если его нет."""
+        return self._texts.get(path)
+
+    # ---- регистрация ----
+    def add_resource(self, path: str):
+        """Файл, который нужно держать в кеше; читается при следующей загрузке."""
+        if path and path not in self._mtimes:
+            self._mtimes[path] = -1.0  # ещё не читали
+
+    def subscribe(self, listener: Listener):
+        """async listener(settings, changed) - после перезагрузки; changed - изменившиеся пути."""
+        self._listeners.append(listener)
+
+    # ---- загрузка ----
+    async def reload(self, force: bool = False) -> set[str]:
+        """Перечитать изменившиеся файлы (force - все). Возвращает изменившиеся пути."""
+        async with self._lock:
+            self.add_resource(self.path)
+            changed = set()
+            for path in list(self._mtimes):
+                mtime = await self._mtime(path)
+                if not force and mtime == self._mtimes[path]:
+                    continue
+                self._mtimes[path] = mtime
+                text = await self._read(path) if mtime is not None else None
+                if text != self._texts.get(path):
+                    self._texts[path] = text
+                    changed.add(path)
+
+            if self.path in changed or force:
+                self._apply_config()
+            if not changed:
+                return changed
+            log.info("config reloaded", extra={"changed": sorted(changed)})
+
+        for listener in self._listeners:
+            try:
+                await listener(self.current, changed)
+            except Exception:
+                log.warning("config listener failed", exc_info=True)
+        return changed
+
+    def _apply_config(self):
+        raw = self._texts.get(self.path)
+        if raw is None:
+            self.current, self.last_error = self._env, None
+            return
+        try:
+            self.current = self._env.merged(json.loads(raw))
+            self.last_error = None
+        except (ValueError, TypeError) as e:
+            # битый файл - остаёмся на прежних настройках
+            self.last_error = f"{self.path}: {e}"
+            log.error("config file invalid, keeping previous settings: %s", self.last_error)
+
+    @staticmethod
+    async def _mtime(path: str) -> Optional[float]:
+        try:
+            return (await aiofiles.os.stat(path)).st_mtime
+        except OSError:
+            return None
+
+    @staticmethod
+    async def _read(path: str) -> Optional[str]:
+        try:
+            async with aiofiles.open(path, "r", encoding="utf-8") as f:
+                return await f.read()
+        except OSError:
+            return None
+
+    # ---- фоновая проверка mtime ----
+    def start(self):
+        if self._task is None and self.watch_sec > 0:
+            self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.watch_sec)
+            try:
+                await self.reload()
+            except Exception:
+                log.warning("config watch failed", exc_info=True)
+
+# общие настройки процесса
+config = ConfigStore()
@@ -0,0 +1,135 @@
+import contextlib
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DIR = os.getenv("LOG_DIR", "logs")
+LOG_FILE = os.getenv("LOG_FILE", "app.log")
+LOG_MAX_MB = float(os.getenv("LOG_MAX_MB", "20"))      # размер файла до ротации
+LOG_BACKUPS = int(os.getenv("LOG_BACKUPS", "5"))       # сколько старых файлов хранить
+LOG_STDOUT_JSON = os.getenv("LOG_STDOUT_JSON", "0").strip().lower() in ("1", "true", "yes")
+
+# id прогона: один тик планировщика = один job_id во всех записях (контроллер, поток браузера, БД)
+job_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("job_id", default=None)
+
+# стандартные поля LogRecord - всё остальное из extra= попадает в JSON
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "job_id", "job"}
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex[:12]
+
+@contextlib.contextmanager
+def job_context(job_id: Optional[str]):
+    """Установить job_id на время блока (в том числе в потоке браузера)."""
+    token = job_id_var.set(job_id)
+    try:
+        yield job_id
+    finally:
+        job_id_var.reset(token)
+
+class ContextFilter(logging.Filter):
+    """Проставляет job_id в запись в потоке, где она создана (до передачи в очередь)."""
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "job_id", None) is None:
+            record.job_id = job_id_var.get()
+        return True
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Как QueueHandler, но traceback остаётся отдельным полем (exc_text), а не склеивается с msg."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName,
+        }
+        if getattr(record, "job_id", None):
+            data["job_id"] = record.job_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Читаемый вывод в консоль (docker compose logs)."""
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(job)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        job_id = getattr(record, "job_id", None)
+        record.job = f" [{job_id}]" if job_id else ""
+        return super().format(record)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+def setup_logging(level: str = LOG_LEVEL, log_dir: str = LOG_DIR) -> logging.handlers.QueueListener:
+    """
+    Корневой логгер пишет только в очередь (QueueHandler) - ни event loop, ни поток
+    браузера не ждут диска. QueueListener в своём потоке отдаёт записи в
+    RotatingFileHandler (JSON, logs/app.log) и в stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    os.makedirs(log_dir, exist_ok=True)
+    file_handler = logging.handlers.RotatingFileHandler(
+        os.path.join(log_dir, LOG_FILE),
+        maxBytes=int(LOG_MAX_MB * 1024 * 1024),
+        backupCount=LOG_BACKUPS,
+        encoding="utf-8",
+    )
+    file_handler.setFormatter(JsonFormatter())
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(JsonFormatter() if LOG_STDOUT_JSON else TextFormatter())
+
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    queue_handler = _QueueHandler(q)
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers[:] = [queue_handler]
+    root.setLevel(level)
+    # болтливые библиотеки - только предупреждения
+    for name in ("aiogram.event", "apscheduler", "urllib3", "selenium", "aiosqlite", "asyncio"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(q, file_handler, console, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def shutdown_logging():
+    """Дописать очередь и закрыть файлы (при остановке приложения)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
@@ -0,0 +1,177 @@
+# benchmarks/bench_broadcast.py
+"""
+Бенчмарк рассылок: гоняет bot.notify_users и bot.send_admin_event
+против локальной заглушки Telegram Bot API (benchmarks/fake_tg_api.py).
+
+Пример:
+    python -m benchmarks.bench_broadcast --recipients 1000,10000 --rate 0 --blocked-ratio 0.02
+    python -m benchmarks.bench_broadcast --recipients 50000 --admin-events 100
+    python -m benchmarks.bench_broadcast --recipients 10000 --critical-during 20
+
+notify_users пишет рассылку в outbox — бенчмарк поднимает временную sqlite-БД
+(или использует DATABASE_URL из окружения) и ждёт, пока outbox опустеет.
+
+Метрики:
+- msg/s        — доставленные сообщения в секунду (по данным заглушки)
+- p50/p95/p99  — задержка одного запроса к API (на стороне клиента)
+- amplification — запросов к API на одного получателя (повторы из-за 429)
+- critical     — задержка срочного события админа (captcha), отправленного посреди рассылки
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+
+from benchmarks.fake_tg_api import FakeTelegramApi, start_fake_server, add_config_args, config_from_args
+
+CHAT_ID_BASE = 10_000_000  # синтетические chat_id получателей
+
+
+class _TimingMiddleware(BaseRequestMiddleware):
+    """Замеряет время каждого запроса к Bot API на стороне клиента."""
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors: dict[str, int] = {}
+
+    async def __call__(self, make_request, bot, method):
+        t0 = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        except Exception as e:
+            name = type(e).__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+            raise
+        finally:
+            self.latencies.append(time.perf_counter() - t0)
+
+    def reset(self):
+        self.latencies.clear()
+        self.errors.clear()
+
+
+def _pct(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[int(p) - 1]
+
+
+def _report(name: str, recipients: int, wall: float, api: FakeTelegramApi, timing: _TimingMiddleware):
+    s = api.stats
+    sends = sum(v for k, v in s.requests.items() if k in ("sendMessage", "editMessageText"))
+    lat_ms = [x * 1000 for x in timing.latencies]
+    rate = s.delivered / wall if wall else 0.0
+    print(
+        f"{name:<18} n={recipients:<7} wall={wall:8.2f}s  delivered={s.delivered:<7} "
+        f"msg/s={rate:7.1f}  p50={_pct(lat_ms, 50):6.1f}ms p95={_pct(lat_ms, 95):6.1f}ms "
+        f"p99={_pct(lat_ms, 99):6.1f}ms  amplification={sends / max(recipients, 1):.3f}  "
+        f"429(global/chat)={s.retry_after_global}/{s.retry_after_chat}  "
+        f"403={s.forbidden} 400={s.not_found}  client_errors={timing.errors}"
+    )
+
+
+async def _bench_notify(bot_module, api, timing, recipients: int):
+    chat_ids = list(range(CHAT_ID_BASE, CHAT_ID_BASE + recipients))
+    api.reset(); timing.reset()
+    t0 = time.perf_counter()
+    await bot_module.notify_users(chat_ids, "Moscow", True)
+    await bot_module.outbox.wait_idle()
+    _report("notify_users", recipients, time.perf_counter() - t0, api, timing)
+    print(f"{'':<18} outbox: {(await bot_module.outbox.progress(limit=1))[0]}")
+
+
+async def _bench_admin(bot_module, api, timing, events: int):
+    api.reset(); timing.reset()
+    t0 = time.perf_counter()
+    for i in range(events):
+        try:
+            await bot_module.send_admin_event({"type": "scheduler", "message": f"bench {i}", "city": "Moscow"})
+        except Exception:
+            # send_admin_event не ловит ошибки сам — считаем их в middleware
+            pass
+    _report("send_admin_event", events, time.perf_counter() - t0, api, timing)
+
+
+async def _bench_critical_during(bot_module, api, timing, recipients: int, events: int):
+    """Срочные события админа посреди рассылки: сколько они ждут за очередью получателей."""
+    chat_ids = list(range(CHAT_ID_BASE, CHAT_ID_BASE + recipients))
+    api.reset(); timing.reset()
+    t0 = time.perf_counter()
+    await bot_module.notify_users(chat_ids, "Moscow", True)
+    waits = []
+    for i in range(events):
+        await asyncio.sleep(1.1)  # не чаще лимита Telegram на один чат
+        t = time.perf_counter()
+        try:
+            await bot_module.send_admin_event({"type": "captcha", "message": f"bench {i}"})
+        except Exception:
+            pass
+        waits.append((time.perf_counter() - t) * 1000)
+    await bot_module.outbox.wait_idle()
+    _report("notify+critical", recipients, time.perf_counter() - t0, api, timing)
+    print(f"{'':<18} critical n={events} p50={_pct(waits, 50):6.1f}ms p95={_pct(waits, 95):6.1f}ms "
+          f"max={max(waits):6.1f}ms  lanes={bot_module.outgoing.stats()}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Broadcast throughput benchmark")
+    parser.add_argument("--recipients", default="1000", help="список размеров рассылки через запятую")
+    parser.add_argument("--admin-events", type=int, default=0, help="сколько событий отправить админу")
+    parser.add_argument("--critical-during", type=int, default=0,
+                        help="сколько срочных событий админа отправить посреди последней рассылки")
+    parser.add_argument("--workers", type=int, default=None, help="OUTBOX_WORKERS (по умолчанию — как в bot.py)")
+    parser.add_argument("--rate", type=float, default=None,
+                        help="темп рассылок и общий темп исходящих (OUT_BROADCAST_RATE / OUT_RATE_PER_SEC), "
+                             "0 — без ограничения (по умолчанию — как в bot.py)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    api = FakeTelegramApi(config_from_args(args))
+    runner = await start_fake_server(api, args.host, args.port)
+
+    # bot.py читает окружение при импорте
+    os.environ["TELEGRAM_API_URL"] = f"http://{args.host}:{args.port}"
+    os.environ.setdefault("API_TOKEN", "123456:BENCHMARK-TOKEN")
+    os.environ.setdefault("ADMIN_CHAT_ID", "1")
+    if args.workers is not None:
+        os.environ["OUTBOX_WORKERS"] = str(args.workers)
+    if args.rate is not None:
+        os.environ["OUT_BROADCAST_RATE"] = str(args.rate)
+        os.environ["OUT_RATE_PER_SEC"] = str(args.rate)
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp.name, 'bench.db')}")
+    import bot as bot_module
+    from db.db import init_db, engine
+
+    await init_db()
+    bot_module.outbox._on_job_done = None  # итоги рассылок админу не смешиваем с замерами
+    bot_module.outbox.start()
+    timing = _TimingMiddleware()
+    bot_module.bot.session.middleware(timing)
+
+    try:
+        for n in [int(x) for x in args.recipients.split(",") if x.strip()]:
+            await _bench_notify(bot_module, api, timing, n)
+        if args.critical_during:
+            await _bench_critical_during(bot_module, api, timing, n, args.critical_during)
+        if args.admin_events:
+            await _bench_admin(bot_module, api, timing, args.admin_events)
+    finally:
+        await bot_module.outbox.stop()
+        await bot_module.outgoing.stop()
+        await bot_module.bot.session.close()
+        await engine.dispose()
+        await runner.cleanup()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,174 @@
+# benchmarks/bench_db.py
+"""
+Бенчмарк слоя данных (db/data_access.py) на sqlite и/или postgres.
+
+Засевает N синтетических Users и JobResult и замеряет
+next_user_to_apply, change_user_status, get_chat_ids_by_status (и потоковый
+iter_chat_ids_by_status), register_basic_user, save_result.
+
+ВНИМАНИЕ: таблицы в целевой БД пересоздаются. Для postgres используйте
+отдельную пустую базу и передайте её явно через --pg-url.
+
+Пример:
+    python -m benchmarks.bench_db --backend sqlite --users 50000 --results 100000
+    python -m benchmarks.bench_db --backend both --pg-url postgresql+asyncpg://u:p@localhost:55432/bench
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+CHAT_ID_BASE = 10_000_000
+
+
+def _stats(name: str, samples: list[float]):
+    ms = sorted(x * 1000 for x in samples)
+    p95 = ms[min(len(ms) - 1, int(len(ms) * 0.95))]
+    print(f"  {name:<26} n={len(ms):<5} mean={statistics.mean(ms):8.2f}ms "
+          f"p50={statistics.median(ms):8.2f}ms p95={p95:8.2f}ms")
+
+
+async def _seed(users: int, results: int, waiting: int, batch: int = 5000):
+    from sqlalchemy import insert
+    from db.db import engine
+    from db.models import Base, Users, JobResult
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+
+    t0 = time.perf_counter()
+    async with engine.begin() as conn:
+        rows = []
+        for i in range(users):
+            if i < waiting:
+                # аккаунты для карусели next_user_to_apply
+                rows.append({"login": f"login{i}", "password": "x", "telegram_username": f"acc{i}",
+                             "city": "Moscow", "apply_status": "0_waiting", "chat_id": None})
+            else:
+                rows.append({"login": None, "password": None, "telegram_username": f"user{i}",
+                             "city": None, "apply_status": "3_user", "chat_id": CHAT_ID_BASE + i})
+            if len(rows) >= batch:
+                await conn.execute(insert(Users), rows)
+                rows = []
+        if rows:
+            await conn.execute(insert(Users), rows)
+
+        rows = []
+        for i in range(results):
+            rows.append({"user_id": i % max(waiting, 1) + 1, "status": "fail", "url": None,
+                         "payload": {"ok": False, "message": "no application slots"}})
+            if len(rows) >= batch:
+                await conn.execute(insert(JobResult), rows)
+                rows = []
+        if rows:
+            await conn.execute(insert(JobResult), rows)
+    print(f"  seeded users={users} results={results} in {time.perf_counter() - t0:.2f}s")
+
+
+async def _run(args):
+    from db.db import engine
+    from db.data_access import UserActions, JobActions
+
+    print(f"backend: {engine.dialect.name} ({engine.url.render_as_string(hide_password=True)})")
+    await _seed(args.users, args.results, args.waiting)
+
+    ua, ja = UserActions(), JobActions()
+
+    samples = []
+    for _ in range(args.iterations):
+        t0 = time.perf_counter()
+        await ua.next_user_to_apply()
+        samples.append(time.perf_counter() - t0)
+    _stats("next_user_to_apply", samples)
+
+    samples = []
+    for _ in range(args.iterations):
+        # как в контроллере после неудачного прогона: вернуть аккаунт в очередь
+        user_id = (await ua.next_user_to_apply())[0]
+        t0 = time.perf_counter()
+        await ua.change_user_status(user_id=user_id, apply_status="0_waiting")
+        samples.append(time.perf_counter() - t0)
+    _stats("change_user_status", samples)
+
+    samples = []
+    for _ in range(max(1, args.iterations // 10)):
+        t0 = time.perf_counter()
+        await ua.get_chat_ids_by_status()
+        samples.append(time.perf_counter() - t0)
+    _stats("get_chat_ids_by_status", samples)
+
+    samples, first = [], []
+    for _ in range(max(1, args.iterations // 10)):
+        t0 = time.perf_counter()
+        got_first = False
+        async for _chunk in ua.iter_chat_ids_by_status():
+            if not got_first:
+                first.append(time.perf_counter() - t0)
+                got_first = True
+        samples.append(time.perf_counter() - t0)
+    _stats("iter_chat_ids (total)", samples)
+    _stats("iter_chat_ids (1st chunk)", first)
+
+    samples = []
+    for i in range(args.iterations):
+        # половина — повторная регистрация существующих, половина — новые
+        chat_id = CHAT_ID_BASE + args.users - 1 - i if i % 2 else CHAT_ID_BASE + args.users + i
+        t0 = time.perf_counter()
+        await ua.register_basic_user(telegram_username=f"bench{chat_id}", chat_id=chat_id)
+        samples.append(time.perf_counter() - t0)
+    _stats("register_basic_user", samples)
+
+    samples = []
+    for i in range(args.iterations):
+        t0 = time.perf_counter()
+        await ja.save_result(status="fail", user_id=1, url=None, payload={"ok": False, "i": i})
+        samples.append(time.perf_counter() - t0)
+    _stats("save_result", samples)
+
+    await engine.dispose()
+
+
+def _spawn(url: str, argv: list[str]) -> int:
+    env = {**os.environ, "DATABASE_URL": url}
+    return subprocess.call([sys.executable, "-m", "benchmarks.bench_db", "--child", *argv], env=env)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DB layer benchmark")
+    parser.add_argument("--backend", choices=["sqlite", "postgres", "both"], default="sqlite")
+    parser.add_argument("--pg-url", default="", help="postgresql+asyncpg://... (отдельная база, таблицы пересоздаются)")
+    parser.add_argument("--sqlite-path", default="", help="файл sqlite (по умолчанию временный)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--results", type=int, default=10_000)
+    parser.add_argument("--waiting", type=int, default=100, help="сколько аккаунтов в статусе 0_waiting")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # движок создаётся при импорте db.db — поэтому каждый бэкенд в своём процессе
+        asyncio.run(_run(args))
+        return 0
+
+    passthrough = ["--users", str(args.users), "--results", str(args.results),
+                   "--waiting", str(args.waiting), "--iterations", str(args.iterations)]
+    rc = 0
+    if args.backend in ("sqlite", "both"):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = args.sqlite_path or os.path.join(tmp, "bench.db")
+            rc |= _spawn(f"sqlite+aiosqlite:///{path}", passthrough)
+    if args.backend in ("postgres", "both"):
+        if not args.pg_url:
+            print("postgres: пропущено — укажите --pg-url (отдельная база, таблицы пересоздаются)")
+        else:
+            rc |= _spawn(args.pg_url, passthrough)
+    return rc
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+# benchmarks/bench_updates.py
+"""
+Сравнение задержки обработки апдейтов: long polling vs webhook.
+
+Burst из N сообщений /start от разных пользователей подаётся
+- polling: в очередь getUpdates заглушки (benchmarks/fake_tg_api.py),
+- webhook: POST-запросами на aiohttp-приложение bot.make_webhook_app(),
+и для каждого замеряется время от подачи апдейта до ответа бота (sendMessage в заглушку).
+
+Пример:
+    python -m benchmarks.bench_updates --burst 200 --rounds 3
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from benchmarks.fake_tg_api import FakeTelegramApi, FakeApiConfig, start_fake_server
+
+USER_ID_BASE = 20_000_000
+
+
+def _update(user_id: int, message_id: int) -> dict:
+    return {
+        "message": {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"u{user_id}"},
+            "text": "/start",
+            "entities": [{"type": "bot_command", "offset": 0, "length": 6}],
+        }
+    }
+
+
+async def _wait_replies(api: FakeTelegramApi, user_ids: list[int], timeout: float = 60):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if all(uid in api.stats.deliveries for uid in user_ids):
+            return
+        await asyncio.sleep(0.005)
+
+
+def _report(mode: str, api: FakeTelegramApi, sent_at: dict[int, float]):
+    lat = sorted((api.stats.deliveries[uid][0] - t0) * 1000
+                 for uid, t0 in sent_at.items() if uid in api.stats.deliveries)
+    if not lat:
+        print(f"{mode:<8} нет ответов")
+        return
+    p = lambda q: lat[min(len(lat) - 1, int(len(lat) * q))]
+    print(f"{mode:<8} n={len(lat):<5} p50={p(0.5):7.1f}ms p95={p(0.95):7.1f}ms p99={p(0.99):7.1f}ms "
+          f"max={lat[-1]:7.1f}ms mean={statistics.mean(lat):7.1f}ms lost={len(sent_at) - len(lat)}")
+
+
+async def _burst_polling(bot_module, api, burst: int, base: int):
+    sent_at = {}
+    for i in range(burst):
+        uid = base + i
+        sent_at[uid] = time.monotonic()
+        api.inject_update(_update(uid, i + 1))
+    await _wait_replies(api, list(sent_at))
+    return sent_at
+
+
+async def _burst_webhook(session: aiohttp.ClientSession, url: str, secret: str, burst: int, base: int, api):
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    sent_at = {}
+
+    async def post(uid: int, i: int):
+        sent_at[uid] = time.monotonic()
+        async with session.post(url, json={"update_id": i + 1, **_update(uid, i + 1)}, headers=headers) as r:
+            await r.read()
+
+    # Telegram сам шлёт апдейты параллельно (max_connections у setWebhook до 100)
+    await asyncio.gather(*(post(base + i, i) for i in range(burst)))
+    await _wait_replies(api, list(sent_at))
+    return sent_at
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Polling vs webhook update latency")
+    parser.add_argument("--burst", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--api-port", type=int, default=8081)
+    parser.add_argument("--webhook-port", type=int, default=8088)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="задержка ответа заглушки Bot API")
+    args = parser.parse_args()
+
+    api = FakeTelegramApi(FakeApiConfig(global_rps=0, per_chat_interval_sec=0,
+                                        latency_ms=args.latency_ms, jitter_ms=args.latency_ms))
+    api_runner = await start_fake_server(api, "127.0.0.1", args.api_port)
+
+    os.environ["TELEGRAM_API_URL"] = f"http://127.0.0.1:{args.api_port}"
+    os.environ.setdefault("API_TOKEN", "123456:BENCHMARK-TOKEN")
+    os.environ.setdefault("WEBHOOK_SECRET", "bench-secret")
+    # /start не ходит в БД, но bot.py создаёт движок при импорте
+    tmp = tempfile.TemporaryDirectory()
+    os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{os.path.join(tmp.name, 'bench.db')}")
+    import bot as bot_module
+
+    try:
+        # --- polling ---
+        polling = asyncio.create_task(
+            bot_module.dp.start_polling(bot_module.bot, handle_signals=False, close_bot_session=False)
+        )
+        await asyncio.sleep(0.5)
+        for r in range(args.rounds):
+            api.reset()
+            _report("polling", api, await _burst_polling(bot_module, api, args.burst, USER_ID_BASE + r * args.burst))
+        await bot_module.dp.stop_polling()
+        await polling
+
+        # --- webhook ---
+        wh_runner = web.AppRunner(bot_module.make_webhook_app(), access_log=None)
+        await wh_runner.setup()
+        await web.TCPSite(wh_runner, "127.0.0.1", args.webhook_port).start()
+        url = f"http://127.0.0.1:{args.webhook_port}{bot_module.WEBHOOK_PATH}"
+        async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=100)) as session:
+            for r in range(args.rounds):
+                api.reset()
+                base = USER_ID_BASE + (args.rounds + r) * args.burst
+                _report("webhook", api, await _burst_webhook(session, url, bot_module.WEBHOOK_SECRET,
+                                                            args.burst, base, api))
+        await wh_runner.cleanup()
+    finally:
+        await bot_module.bot.session.close()
+        await api_runner.cleanup()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
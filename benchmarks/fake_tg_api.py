@@ -0,0 +1,265 @@
+# benchmarks/fake_tg_api.py
+"""
+Локальная заглушка Telegram Bot API для бенчмарков.
+
+aiogram направляется сюда через TELEGRAM_API_URL (см. bot.py).
+Симулирует:
+- глобальный лимит бота (429 + retry_after),
+- лимит на один чат (429 + retry_after),
+- пользователей, заблокировавших бота (403) и несуществующие чаты (400).
+
+Запуск отдельно:
+    python -m benchmarks.fake_tg_api --port 8081 --global-rps 30 --blocked-ratio 0.02
+Статистика: GET /stats, сброс: POST /reset
+"""
+import argparse
+import asyncio
+import math
+import random
+import time
+from dataclasses import dataclass, field
+
+from aiohttp import web
+
+
+@dataclass
+class FakeApiConfig:
+    global_rps: float = 30.0          # сообщений в секунду на бота (как у настоящего Telegram)
+    per_chat_interval_sec: float = 1.0  # не чаще одного сообщения в чат за интервал
+    blocked_ratio: float = 0.0        # доля чатов, заблокировавших бота (403)
+    not_found_ratio: float = 0.0      # доля несуществующих чатов (400 chat not found)
+    latency_ms: float = 5.0           # базовая задержка ответа
+    jitter_ms: float = 5.0            # случайная добавка к задержке
+
+
+@dataclass
+class FakeApiStats:
+    started_at: float = field(default_factory=time.monotonic)
+    requests: dict = field(default_factory=dict)   # method -> кол-во запросов
+    delivered: int = 0
+    retry_after_global: int = 0
+    retry_after_chat: int = 0
+    forbidden: int = 0
+    not_found: int = 0
+    first_delivery_at: float | None = None
+    last_delivery_at: float | None = None
+    # chat_id -> список монотонных отметок доставки (для бенчмарка задержек)
+    deliveries: dict = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "requests_total": sum(self.requests.values()),
+            "delivered": self.delivered,
+            "retry_after_global": self.retry_after_global,
+            "retry_after_chat": self.retry_after_chat,
+            "forbidden": self.forbidden,
+            "not_found": self.not_found,
+            "first_delivery_at": self.first_delivery_at,
+            "last_delivery_at": self.last_delivery_at,
+        }
+
+
+class FakeTelegramApi:
+    def __init__(self, config: FakeApiConfig | None = None):
+        self.config = config or FakeApiConfig()
+        self.stats = FakeApiStats()
+        self._message_id = 0
+        # токен-бакет глобального лимита
+        self._tokens = self.config.global_rps
+        self._tokens_at = time.monotonic()
+        self._chat_last: dict[int, float] = {}
+        # очередь апдейтов для getUpdates (инжектится бенчмарком)
+        self._updates: asyncio.Queue = asyncio.Queue()
+        self._update_id = 0
+
+    # ---- классификация чатов (детерминированно по chat_id) ----
+    def _is_blocked(self, chat_id: int) -> bool:
+        r = self.config.blocked_ratio
+        return r > 0 and (chat_id * 2654435761 % 10_000) < r * 10_000
+
+    def _is_not_found(self, chat_id: int) -> bool:
+        r = self.config.not_found_ratio
+        return r > 0 and (chat_id * 40503 % 10_000) < r * 10_000
+
+    # ---- лимиты ----
+    def _take_global_token(self) -> float:
+        """0 если можно отправлять, иначе сколько секунд ждать."""
+        now = time.monotonic()
+        rps = self.config.global_rps
+        if rps <= 0:
+            return 0.0
+        self._tokens = min(rps, self._tokens + (now - self._tokens_at) * rps)
+        self._tokens_at = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / rps
+
+    def _chat_wait(self, chat_id: int) -> float:
+        interval = self.config.per_chat_interval_sec
+        if interval <= 0:
+            return 0.0
+        now = time.monotonic()
+        last = self._chat_last.get(chat_id)
+        if last is not None and now - last < interval:
+            return interval - (now - last)
+        self._chat_last[chat_id] = now
+        return 0.0
+
+    # ---- ответы ----
+    @staticmethod
+    def _ok(result) -> web.Response:
+        return web.json_response({"ok": True, "result": result})
+
+    @staticmethod
+    def _error(code: int, description: str, retry_after: float | None = None) -> web.Response:
+        body = {"ok": False, "error_code": code, "description": description}
+        if retry_after is not None:
+            # Telegram отдаёт целые секунды
+            body["parameters"] = {"retry_after": max(1, math.ceil(retry_after))}
+        return web.json_response(body, status=code)
+
+    def _message(self, chat_id: int, text: str) -> dict:
+        self._message_id += 1
+        return {
+            "message_id": self._message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "text": text,
+        }
+
+    async def _params(self, request: web.Request) -> dict:
+        if request.content_type == "application/json":
+            return await request.json()
+        return dict(await request.post())
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        self.stats.requests[method] = self.stats.requests.get(method, 0) + 1
+        params = await self._params(request)
+
+        delay = (self.config.latency_ms + random.random() * self.config.jitter_ms) / 1000
+        if method != "getUpdates" and delay > 0:
+            await asyncio.sleep(delay)
+
+        if method == "getMe":
+            return self._ok({"id": 1, "is_bot": True, "first_name": "FakeBot", "username": "fake_bot"})
+        if method in ("deleteWebhook", "setWebhook", "setMyCommands", "pinChatMessage", "unpinChatMessage"):
+            return self._ok(True)
+        if method == "getUpdates":
+            return await self._get_updates(params)
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            return self._send(method, params)
+        return self._ok(True)
+
+    def _send(self, method: str, params: dict) -> web.Response:
+        chat_id = int(params.get("chat_id", 0))
+
+        wait = self._take_global_token()
+        if wait:
+            self.stats.retry_after_global += 1
+            return self._error(429, f"Too Many Requests: retry after {math.ceil(wait)}", wait)
+        if self._is_blocked(chat_id):
+            self.stats.forbidden += 1
+            return self._error(403, "Forbidden: bot was blocked by the user")
+        if self._is_not_found(chat_id):
+            self.stats.not_found += 1
+            return self._error(400, "Bad Request: chat not found")
+        if method == "sendMessage":
+            wait = self._chat_wait(chat_id)
+            if wait:
+                self.stats.retry_after_chat += 1
+                return self._error(429, f"Too Many Requests: retry after {math.ceil(wait)}", wait)
+
+        now = time.monotonic()
+        self.stats.delivered += 1
+        self.stats.first_delivery_at = self.stats.first_delivery_at or now
+        self.stats.last_delivery_at = now
+        self.stats.deliveries.setdefault(chat_id, []).append(now)
+
+        if method == "editMessageText":
+            msg = self._message(chat_id, params.get("text", ""))
+            msg["message_id"] = int(params.get("message_id", 0))
+            return self._ok(msg)
+        return self._ok(self._message(chat_id, params.get("text", "")))
+
+    # ---- long polling ----
+    def inject_update(self, update: dict) -> int:
+        self._update_id += 1
+        update = {"update_id": self._update_id, **update}
+        self._updates.put_nowait(update)
+        return self._update_id
+
+    async def _get_updates(self, params: dict) -> web.Response:
+        timeout = float(params.get("timeout") or 0)
+        batch = []
+        try:
+            if self._updates.empty() and timeout:
+                batch.append(await asyncio.wait_for(self._updates.get(), timeout=timeout))
+        except asyncio.TimeoutError:
+            pass
+        while not self._updates.empty() and len(batch) < 100:
+            batch.append(self._updates.get_nowait())
+        return self._ok(batch)
+
+    # ---- служебное ----
+    async def handle_stats(self, request: web.Request) -> web.Response:
+        return web.json_response(self.stats.as_dict())
+
+    async def handle_reset(self, request: web.Request) -> web.Response:
+        self.reset()
+        return web.json_response({"ok": True})
+
+    def reset(self):
+        self.stats = FakeApiStats()
+        self._chat_last.clear()
+        self._tokens = self.config.global_rps
+        self._tokens_at = time.monotonic()
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self.handle)
+        app.router.add_get("/stats", self.handle_stats)
+        app.router.add_post("/reset", self.handle_reset)
+        return app
+
+
+async def start_fake_server(api: FakeTelegramApi, host: str = "127.0.0.1", port: int = 8081) -> web.AppRunner:
+    """Поднять сервер в текущем event loop; вернуть runner (для runner.cleanup())."""
+    runner = web.AppRunner(api.make_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    return runner
+
+
+def add_config_args(parser: argparse.ArgumentParser):
+    parser.add_argument("--global-rps", type=float, default=30.0)
+    parser.add_argument("--per-chat-interval", type=float, default=1.0)
+    parser.add_argument("--blocked-ratio", type=float, default=0.0)
+    parser.add_argument("--not-found-ratio", type=float, default=0.0)
+    parser.add_argument("--latency-ms", type=float, default=5.0)
+    parser.add_argument("--jitter-ms", type=float, default=5.0)
+
+
+def config_from_args(args) -> FakeApiConfig:
+    return FakeApiConfig(
+        global_rps=args.global_rps,
+        per_chat_interval_sec=args.per_chat_interval,
+        blocked_ratio=args.blocked_ratio,
+        not_found_ratio=args.not_found_ratio,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    add_config_args(parser)
+    args = parser.parse_args()
+
+    api = FakeTelegramApi(config_from_args(args))
+    web.run_app(api.make_app(), host=args.host, port=args.port, access_log=None)
@@ -1,75 +1,124 @@
 # bot.py
 import asyncio
 import contextlib
-from typing import Optional
+from typing import AsyncIterable, Optional
 
 from aiogram import Bot, Dispatcher, Router
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.filters import Command
-from aiogram.types import Message
-from aiogram.exceptions import TelegramRetryAfter
+from aiogram.types import Message, FSInputFile
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
 
+import logging
 import signal
+import ssl
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 from web_bot.controller import Controller
+from web_bot.artifacts import artifact_store
+from web_bot.async_driver import webdriver_client
+from app_logging import setup_logging, shutdown_logging
+from app_config import config
 from db.db import init_db
+from db.subscriptions import subscription_index
+from db.cluster import ClusterCoordinator, CLUSTER_MODE
 
 from telegram_bot.admin_router import create_admin_router
 from telegram_bot.tg_registration import create_user_registration_router, create_admin_registration_router
 from telegram_bot.start import make_start_kb
+from telegram_bot.outbox import OutboxWorker
+from telegram_bot.outgoing import OutgoingScheduler, ADMIN_CRITICAL, ADMIN_INFO
+from telegram_bot.status_panel import StatusPanel
+from web_bot.admin_digest import AdminDigest
+from telegram_bot.fsm_storage import create_storage, SQLAlchemyStorage
+
+log = logging.getLogger(__name__)
 
 controller = Controller()
 
 TOKEN = os.getenv("API_TOKEN")
 ADMIN_CHAT_ID = int(os.getenv("ADMIN_CHAT_ID", "0"))
 AGREEMENT_PATH = os.getenv("AGREEMENT_PATH", "agreements/pd_agreement.txt")
+# свой сервер Bot API (локальный telegram-bot-api или заглушка из benchmarks/fake_tg_api.py)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "")
+
+# webhook-режим: если задан WEBHOOK_URL - вместо long polling поднимаем aiohttp-сервер
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")     # публичный https-адрес, напр. https://bot.example.com
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")           # заголовок X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_LISTEN_HOST = os.getenv("WEBHOOK_LISTEN_HOST", "0.0.0.0")
+WEBHOOK_LISTEN_PORT = int(os.getenv("WEBHOOK_LISTEN_PORT", "8080"))
+# самоподписанный сертификат: TLS терминирует само приложение, публичный сертификат отдаём Telegram
+WEBHOOK_SSL_CERT = os.getenv("WEBHOOK_SSL_CERT", "")
+WEBHOOK_SSL_KEY = os.getenv("WEBHOOK_SSL_KEY", "")
 
-bot = Bot(TOKEN)
-dp = Dispatcher()
+session = AiohttpSession(api=TelegramAPIServer.from_base(TELEGRAM_API_URL)) if TELEGRAM_API_URL else None
+bot = Bot(TOKEN, session=session)
+# состояния диалогов регистрации - в БД (FSM_STORAGE), общие для реплик
+fsm_storage = create_storage()
+dp = Dispatcher(storage=fsm_storage)
 router = Router()
+# все исходящие сообщения - через полосы приоритета: админ не ждёт за рассылкой
+outgoing = OutgoingScheduler(bot)
+
+# события, требующие действий админа (AdminDigest.is_urgent), - в срочную полосу
+def admin_lane(event: dict) -> str:
+    if AdminDigest.is_urgent(event):
+        return ADMIN_CRITICAL
+    return ADMIN_INFO
+
+# закреплённая панель статуса в чате админа (STATUS_PANEL_SEC), работает на ведущей реплике
+status_panel = StatusPanel(outgoing, ADMIN_CHAT_ID, controller.status)
 
 async def send_admin_event(event: dict):
     """Уведомления из потока бота админу в чат"""
     if not ADMIN_CHAT_ID:
         return
+    if status_panel.enabled:
+        status_panel.poke()
+        if event.get("type") == "scheduler" and admin_lane(event) == ADMIN_INFO:
+            return  # рутинный результат прогона виден в панели
     t = event.get("type", "event")
     msg = event.get("message", "")
     url = event.get("url", "")
     text = "\n".join(x for x in [f"Событие: {t}", msg, url] if x)
-    await bot.send_message(ADMIN_CHAT_ID, text)
+    await outgoing.send(admin_lane(event), ADMIN_CHAT_ID, text)
+
+async def on_broadcast_done(progress: dict):
+    """Итог рассылки админу (через сводку, если она включена)"""
+    msg = (f"Рассылка #{progress['id']} ({progress['city'] or '-'}): отправлено {progress['sent']}/{progress['total']}, "
+           f"ошибок {progress['failed']}, недоступно {progress['unreachable']}")
+    await controller.admin_event({"type": "outbox", "message": msg, "pruned": progress["unreachable"]},
+                                 send_admin_event)
+
+# outbox рассылок: воркеры и общий темп отправки
+outbox = OutboxWorker(
+    outgoing,
+    workers=int(os.getenv("OUTBOX_WORKERS", "4")),
+    on_job_done=on_broadcast_done,
+)
 
 async def notify_users(
-    chat_ids: list[int],
+    chat_ids: list[int] | AsyncIterable[list[int]],
     city: str,
     flag: bool,
     true_text: str = "Появились заявки, город - ",
-    false_text: str = "⚠️ False, город - ",
-    per_message_delay_sec: int = 0.1, #пауза между сообщениями
-    retry_after_margin_sec: int = 1 #пауза если вышло предупреждение
-) -> None:
-    """Уведомления пользователям о появлении заявок"""
+    false_text: str = "Свободных заявок больше нет, город - ",
+    details: str | None = None,
+) -> int:
+    """
+    Уведомления пользователям о появлении / исчезновении заявок (details - список новых слотов).
+    Рассылка пишется в outbox (БД) и доставляется воркерами в фоне,
+    после рестарта продолжается с места остановки. Возвращает id рассылки.
+    """
     text = true_text + city if flag else false_text + city
-    
-    for chat_id in chat_ids:
-        try:
-            await bot.send_message(chat_id, text)
-            pass
-
-        except TelegramRetryAfter as e:
-            # на случай если превышен лимит подождем и попытаемся отправить еще раз
-            await asyncio.sleep(retry_after_margin_sec)
-            try:
-                await bot.send_message(chat_id, text)
-            except Exception:
-                pass
-
-        except Exception:
-            # при другой ошибке пропускаем этого пользователя
-            pass
-
-        await asyncio.sleep(per_message_delay_sec)
+    if details:
+        text += "\n" + details
+    return await outbox.enqueue(text, chat_ids, city=city)
 
 @router.message(Command("start"))
 async def hello(m: Message):
@@ -80,24 +129,170 @@ async def hello(m: Message):
 dp.include_router(router)
 dp.include_router(create_user_registration_router(AGREEMENT_PATH))
 dp.include_router(create_admin_registration_router(ADMIN_CHAT_ID))
-dp.include_router(create_admin_router(controller, ADMIN_CHAT_ID, send_admin_event, notify_users))
+# ---- несколько реплик: ведущая держит планировщик/браузер/outbox, команды идут через БД ----
+async def on_elected():
+    outbox.start()
+    if cluster.enabled:
+        # индекс мог устареть, пока реплика была ведомой
+        await subscription_index.load()
+        log.info("replica elected leader", extra={"replica": cluster.replica_id})
+    # тёплый рестарт: состояние контроллера из чекпоинта (runtime_state)
+    msg = await controller.restore(asyncio.get_running_loop(), send_admin_event, notify_users)
+    if cluster.enabled:
+        msg = f"Реплика {cluster.replica_id} стала ведущей." + (f"\n{msg}" if msg else "")
+    if msg:
+        await send_admin_event({"type": "restore", "message": msg})
+    await status_panel.start()
+
+async def on_demoted():
+    log.warning("replica lost leadership", extra={"replica": cluster.replica_id})
+    # чекпоинт не трогаем - новая ведущая продолжит с того же места
+    await status_panel.stop()
+    await controller.stop(demoted=True)
+    await outbox.stop()
+
+async def on_cluster_command(message: dict):
+    """Команда из NOTIFY: общие применяются на всех репликах, управляющие - только на ведущей"""
+    cmd = message.get("cmd")
+    log.debug("cluster command", extra={"cmd": cmd, "from_replica": message.get("from")})
+    if cmd == "subs":
+        subscription_index.set_user(int(message["chat_id"]), message.get("cities") or [])
+        return
+    if cmd == "subs_reload":
+        # массовый импорт подписчиков - индекс перестраивается целиком
+        await subscription_index.load()
+        return
+    if cmd == "digest":
+        msg = await controller.set_digest_interval(int(message.get("interval", 0)))
+        if cluster.is_leader:
+            await send_admin_event({"type": "cluster", "message": msg})
+        return
+    if cmd == "reload_config":
+        # файлы у каждой реплики свои - перечитывают все
+        changed = await config.reload(force=True)
+        if cluster.is_leader:
+            await send_admin_event({"type": "cluster", "message": f"[{cluster.replica_id}] Конфигурация перечитана: "
+                                                                  f"{len(changed)} файл(ов) изменилось."})
+        return
+    if cmd == "continue":
+        if await controller.resume(message.get("park_id")):
+            await send_admin_event({"type": "cluster", "message": f"[{cluster.replica_id}] Продолжаю."})
+        return
+    if not cluster.is_leader:
+        return
+
+    if cmd == "start_job":
+        msg = await controller.start(asyncio.get_running_loop(), send_admin_event, notify_users)
+    elif cmd == "stop_job":
+        msg = await controller.stop()
+    elif cmd == "run_once":
+        msg = str(await controller.run_once())
+    elif cmd == "profile":
+        msg = await controller.set_profile(str(message.get("name", "")))
+    elif cmd == "panel":
+        if await status_panel.recreate():
+            return
+        msg = "Панель статуса выключена (STATUS_PANEL_SEC=0)."
+    else:
+        return
+    await send_admin_event({"type": "cluster", "message": f"[{cluster.replica_id}] {msg}"})
+
+# в polling-режиме две реплики получали бы 409 на getUpdates - кластер только с webhook
+cluster = ClusterCoordinator(on_elected=on_elected, on_demoted=on_demoted, on_command=on_cluster_command,
+                             enabled=CLUSTER_MODE and bool(WEBHOOK_URL))
+if cluster.enabled:
+    subscription_index.publisher = lambda chat_id, cities: cluster.publish("subs", chat_id=chat_id, cities=cities)
+
+dp.include_router(create_admin_router(controller, ADMIN_CHAT_ID, send_admin_event, notify_users, outbox, cluster,
+                                     status_panel))
 
-async def on_shutdown():
-    await controller.stop()
+def make_webhook_app() -> web.Application:
+    """aiohttp-приложение, принимающее апдейты Telegram на WEBHOOK_PATH"""
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=WEBHOOK_SECRET or None,
+    ).register(app, path=WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook():
+    ssl_ctx = None
+    if WEBHOOK_SSL_CERT and WEBHOOK_SSL_KEY:
+        ssl_ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        ssl_ctx.load_cert_chain(WEBHOOK_SSL_CERT, WEBHOOK_SSL_KEY)
+
+    runner = web.AppRunner(make_webhook_app())
+    await runner.setup()
+    site = web.TCPSite(runner, WEBHOOK_LISTEN_HOST, WEBHOOK_LISTEN_PORT, ssl_context=ssl_ctx)
+    await site.start()
+    try:
+        await bot.set_webhook(
+            WEBHOOK_URL + WEBHOOK_PATH,
+            secret_token=WEBHOOK_SECRET or None,
+            certificate=FSInputFile(WEBHOOK_SSL_CERT) if ssl_ctx else None,
+        )
+        # сервер работает, пока процесс не остановят
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 async def main():
+    setup_logging()
+    log.info("starting", extra={"mode": "webhook" if WEBHOOK_URL else "polling"})
+    # настройки и файлы-ресурсы (config/app.json, профили опроса, соглашение) - в память, дальше по mtime
+    await config.reload(force=True)
+    config.start()
     await init_db()
+    # индекс подписок город -> chat_id строится один раз, дальше обновляется инкрементально
+    await subscription_index.load()
+    if isinstance(fsm_storage, SQLAlchemyStorage):
+        fsm_storage.start()  # фоновая очистка брошенных диалогов
+    if CLUSTER_MODE and not cluster.enabled:
+        log.warning("CLUSTER_MODE ignored: cluster mode needs postgres and WEBHOOK_URL, running as a single replica")
+    # выбор ведущей реплики; ведущая дочитывает недоставленные рассылки с прошлого запуска
+    await cluster.start()
+
+    # SIGTERM/SIGINT (docker stop, Ctrl+C): штатная остановка с чекпоинтом контроллера
     loop = asyncio.get_running_loop()
-    try:
-        loop.add_signal_handler(signal.SIGINT, loop.stop)
-        loop.add_signal_handler(signal.SIGTERM, loop.stop)
-    except NotImplementedError:
-        pass
+    stop = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        with contextlib.suppress(NotImplementedError):
+            loop.add_signal_handler(sig, stop.set)
 
+    if WEBHOOK_URL:
+        server = asyncio.create_task(run_webhook())
+    else:
+        # вебхук от прошлого запуска мешает getUpdates
+        await bot.delete_webhook()
+        server = asyncio.create_task(dp.start_polling(bot, handle_signals=False))
+    stopper = asyncio.create_task(stop.wait())
     try:
-        await dp.start_polling(bot, shutdown=on_shutdown)
+        await asyncio.wait({server, stopper}, return_when=asyncio.FIRST_COMPLETED)
     finally:
-        await controller.stop()
+        log.info("shutting down")
+        stopper.cancel()
+        if not server.done():
+            if not WEBHOOK_URL:
+                with contextlib.suppress(RuntimeError):
+                    await dp.stop_polling()
+            server.cancel()
+        with contextlib.suppress(asyncio.CancelledError, Exception):
+            await server
+        # сначала контроллер (чекпоинт + закрытие браузера), потом лидерство
+        await status_panel.stop()
+        await controller.stop(persist=False)
+        await cluster.stop()
+        await outbox.stop()
+        await outgoing.stop()
+        await fsm_storage.close()
+        await config.stop()
+        await webdriver_client.close()
+        # дописать артефакты падений, стоящие в очереди
+        await asyncio.to_thread(artifact_store.close)
+        log.info("stopped")
+        shutdown_logging()
 
 if __name__ == "__main__":
     asyncio.run(main())
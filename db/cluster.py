@@ -0,0 +1,154 @@
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import text
+
+from db.db import engine, IS_SQLITE
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# включить несколько реплик app (нужен postgres и webhook-режим Telegram)
+CLUSTER_MODE = os.getenv("CLUSTER_MODE", "0").strip().lower() in ("1", "true", "yes")
+REPLICA_ID = os.getenv("REPLICA_ID") or f"{socket.gethostname()}-{os.getpid()}"
+LEADER_LOCK_KEY = int(os.getenv("LEADER_LOCK_KEY", "7315040001"))   # ключ pg advisory lock
+LEADER_HEARTBEAT_SEC = float(os.getenv("LEADER_HEARTBEAT_SEC", "5"))
+LEADER_LEASE_SEC = float(os.getenv("LEADER_LEASE_SEC", "30"))
+CONTROL_CHANNEL = "app_control"                                     # канал LISTEN/NOTIFY для админ-команд
+
+class ClusterCoordinator:
+    """
+    Выбор ведущей реплики через pg_try_advisory_lock на выделенном соединении.
+
+    - Ведущая реплика запускает планировщик, браузер и outbox (on_elected),
+      остальные только принимают апдейты Telegram.
+    - Аренда: на соединении стоит idle_session_timeout = LEADER_LEASE_SEC, и реплика
+      раз в LEADER_HEARTBEAT_SEC делает запрос. Если процесс завис или пропала сеть,
+      postgres закрывает сессию, блокировка освобождается, и её забирает другая реплика.
+      Ведущая, у которой heartbeat не прошёл, сама снимает с себя роль (on_demoted).
+    - Админ-команды расходятся по всем репликам через NOTIFY app_control (on_command).
+
+    Без CLUSTER_MODE (или на sqlite, или в polling-режиме - см. bot.py) реплика одна: она сразу ведущая, publish вызывает on_command напрямую.
+    """
+    def __init__(self, *,
+                 on_elected: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_demoted: Optional[Callable[[], Awaitable[None]]] = None,
+                 on_command: Optional[Callable[[dict], Awaitable[None]]] = None,
+                 enabled: bool = CLUSTER_MODE):
+        self.enabled = enabled and not IS_SQLITE
+        self.replica_id = REPLICA_ID
+        self.is_leader = False
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._on_command = on_command
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    # ---- публичные методы ----
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        if not self.enabled:
+            await self._elected()
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self.is_leader:
+            await self._demoted()
+
+    async def publish(self, cmd: str, **data):
+        """Отправить команду всем репликам (включая эту)."""
+        message = {"cmd": cmd, "from": self.replica_id, **data}
+        if not self.enabled:
+            await self._dispatch(message)
+            return
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT pg_notify(:ch, :payload)"),
+                               {"ch": CONTROL_CHANNEL, "payload": json.dumps(message)})
+            await conn.commit()
+
+    # ---- внутреннее ----
+    async def _elected(self):
+        self.is_leader = True
+        if self._on_elected:
+            try:
+                await self._on_elected()
+            except Exception:
+                log.exception("on_elected failed")
+
+    async def _demoted(self):
+        self.is_leader = False
+        if self._on_demoted:
+            try:
+                await self._on_demoted()
+            except Exception:
+                log.exception("on_demoted failed")
+
+    async def _dispatch(self, message: dict):
+        if self._on_command:
+            try:
+                await self._on_command(message)
+            except Exception:
+                log.exception("cluster command failed", extra={"cmd": message.get("cmd")})
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str):
+        # коллбек asyncpg - вызывается в event loop, но синхронно
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        self._loop.create_task(self._dispatch(message))
+
+    async def _run(self):
+        lease_ms = int(LEADER_LEASE_SEC * 1000)
+        while True:
+            conn = None
+            try:
+                conn = await engine.connect()
+                # аренда: зависшую сессию postgres закроет сам (PostgreSQL 14+)
+                await conn.exec_driver_sql(f"SET idle_session_timeout = {lease_ms}")
+                await conn.commit()
+
+                raw = await conn.get_raw_connection()
+                await raw.driver_connection.add_listener(CONTROL_CHANNEL, self._on_notify)
+
+                while True:
+                    if not self.is_leader:
+                        got = (await conn.execute(text("SELECT pg_try_advisory_lock(:k)"),
+                                                  {"k": LEADER_LOCK_KEY})).scalar()
+                        await conn.commit()
+                        if got:
+                            await self._elected()
+                    else:
+                        # heartbeat должен успеть до истечения аренды
+                        await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout=LEADER_LEASE_SEC / 2)
+                        await conn.commit()
+                    await asyncio.sleep(LEADER_HEARTBEAT_SEC)
+
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # соединение потеряно - блокировка (если была) уже не наша
+                log.warning("leader election connection lost", exc_info=True,
+                            extra={"replica": self.replica_id, "was_leader": self.is_leader})
+                if self.is_leader:
+                    await self._demoted()
+                await asyncio.sleep(LEADER_HEARTBEAT_SEC)
+            finally:
+                if conn is not None:
+                    # соединение не возвращаем в пул: закрытие сессии снимает lock и LISTEN
+                    with contextlib.suppress(Exception):
+                        await conn.invalidate()
+                    with contextlib.suppress(Exception):
+                        await conn.close()
@@ -1,24 +1,76 @@
-from sqlalchemy import select, or_
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, or_, insert, update, delete, func, exists, bindparam, case
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.exc import IntegrityError
-from db.db import SessionLocal
-from db.models import JobResult, Users
-from typing import Literal
+from db.db import SessionLocal, engine
+from db.models import (JobResult, Users, NotificationJob, NotificationDelivery, UserCity, RuntimeState, LocatorStat,
+                       FsmState)
+from typing import Literal, AsyncIterator
 
 import asyncio # убрать
+import logging
+
+log = logging.getLogger(__name__)
+
+# ---- Core-выражения горячих методов (тик планировщика, рассылки) ----
+# Строятся один раз при импорте и выполняются на соединении без ORM-сессии:
+# скомпилированный SQL берётся из кеша движка, на postgres asyncpg держит
+# подготовленные statements в кеше соединения (DB_PREPARED_CACHE в db.db).
+_INSERT_RESULT = insert(JobResult).returning(JobResult.id)
+_CURRENT_HOLDER = (
+    select(Users.id).where(Users.apply_status == "1_in_progress").order_by(Users.id.asc()).limit(1)
+)
+_NEXT_WAITING = (
+    select(Users.id)
+    .where(Users.apply_status == "0_waiting", Users.id > bindparam("after_id"))
+    .order_by(Users.id.asc())
+    .limit(1)
+)
+_ACCOUNT_ROW = select(Users.id, Users.login, Users.password, Users.city).where(Users.id == bindparam("uid"))
+_SET_STATUS = update(Users).where(Users.id == bindparam("uid")).values(apply_status=bindparam("new_status"))
+_TAKE_TOKEN = _SET_STATUS.returning(Users.id, Users.login, Users.password, Users.city)
+_CHANGE_STATUS = (
+    update(Users)
+    .where(Users.id == bindparam("uid"), Users.apply_status == "1_in_progress")
+    .values(apply_status=bindparam("new_status"))
+)
+_CHAT_IDS_BY_STATUS = select(Users.chat_id).where(
+    Users.apply_status == bindparam("status"),
+    Users.chat_id.is_not(None),
+    Users.is_active.is_(True),
+)
+
+def _upsert(model):
+    """INSERT ... ON CONFLICT текущего диалекта (postgres / sqlite)."""
+    dialect = postgresql if engine.dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
+# регистрация / импорт подписчика: одна запись на chat_id, повторная - обновляет ник и активирует чат
+_UPSERT_SUBSCRIBER = _upsert(Users)
+_UPSERT_SUBSCRIBER = _UPSERT_SUBSCRIBER.on_conflict_do_update(
+    index_elements=[Users.chat_id],
+    set_={
+        "telegram_username": _UPSERT_SUBSCRIBER.excluded.telegram_username,
+        "apply_status": _UPSERT_SUBSCRIBER.excluded.apply_status,
+        "is_active": _UPSERT_SUBSCRIBER.excluded.is_active,
+    },
+).returning(Users.id, Users.chat_id)
 
 class JobActions:
     async def save_result(self, *,
                           status: str,
                           user_id: int,
                           url: str | None,
-                          payload: dict | None):
-        
-        async with SessionLocal() as session:
-            obj = JobResult(status=status, user_id=user_id, url=url, payload=payload)
-            session.add(obj)
-            await session.commit()
-            await session.refresh(obj)
-            return obj
+                          payload: dict | None,
+                          artifact_id: str | None = None) -> int:
+        """Записать результат прогона одним INSERT ... RETURNING id. Возвращает id."""
+        async with engine.begin() as conn:
+            job_result_id = (await conn.execute(_INSERT_RESULT, {
+                "status": status, "user_id": user_id, "url": url,
+                "payload": payload, "artifact_id": artifact_id,
+            })).scalar_one()
+        log.info("job result saved", extra={"job_result_id": job_result_id, "status": status, "user_id": user_id})
+        return job_result_id
 
     async def get_last(self):
         async with SessionLocal() as session:
@@ -48,43 +100,68 @@ class UserActions:
             except IntegrityError:
                 await session.rollback()
                 raise ValueError("Логин или Telegram-ник уже заняты.")
-            await session.refresh(user)
+            # expire_on_commit=False: поля и id уже в объекте, refresh не нужен
             return user
         
     async def register_basic_user(self, *,
                                   telegram_username: str,
                                   chat_id: int) -> Users:
-        
+        """
+        Регистрация подписчика одним INSERT ... ON CONFLICT (chat_id) DO UPDATE:
+        без SELECT перед записью, параллельные регистрации одного чата не конфликтуют.
+        """
+        telegram_username = telegram_username.strip()
+        async with engine.begin() as conn:
+            user_id, _ = (await conn.execute(_UPSERT_SUBSCRIBER, {
+                "telegram_username": telegram_username, "chat_id": chat_id,
+                "apply_status": "3_user", "is_active": True,  # повторная регистрация - чат снова доступен
+            })).one()
+        return Users(id=user_id, chat_id=chat_id, telegram_username=telegram_username,
+                     apply_status="3_user", is_active=True)
+
+    async def upsert_subscribers(self, rows: list[dict]) -> list[tuple[int, int]]:
+        """
+        Пачка подписчиков {chat_id, telegram_username, is_active} одним executemany:
+        SQLAlchemy склеивает её в многострочные INSERT ... ON CONFLICT ... RETURNING.
+        chat_id в пачке должны быть уникальны. Возвращает пары (user_id, chat_id).
+        """
+        if not rows:
+            return []
+        params = [{"apply_status": "3_user", **r} for r in rows]
+        async with engine.begin() as conn:
+            return [tuple(r) for r in (await conn.execute(_UPSERT_SUBSCRIBER, params)).all()]
+
+    async def iter_subscribers(self,
+                               chunk_size: int = 5000) -> AsyncIterator[list[tuple[int, str, bool, list[str]]]]:
+        """
+        Подписчики для экспорта пачками с серверного курсора:
+        (chat_id, telegram_username, is_active, [города]); пустой список - все города.
+        """
         async with SessionLocal() as session:
-            # если уже есть запись по chat_id или username — сопоставим/обновим
-            res = await session.execute(
-                select(Users).where(
-                    or_(Users.chat_id == chat_id, Users.telegram_username == telegram_username.strip())
-                )
+            stmt = (
+                select(Users.id, Users.chat_id, Users.telegram_username, Users.is_active, UserCity.city)
+                .outerjoin(UserCity, UserCity.user_id == Users.id)
+                .where(Users.apply_status == "3_user", Users.chat_id.is_not(None))
+                .order_by(Users.id, UserCity.city)
+                .execution_options(yield_per=chunk_size)
             )
-            user = res.scalar_one_or_none()
-            if user:
-                user.chat_id = chat_id
-                user.telegram_username = telegram_username.strip()
-                user.apply_status = "3_user"
-                await session.commit()
-                await session.refresh(user)
-                return user
+            res = await session.stream(stmt)
+            # строки одного пользователя идут подряд, но могут попасть в две пачки
+            current_id, current = None, None
+            async for chunk in res.partitions(chunk_size):
+                out = []
+                for user_id, chat_id, username, is_active, city in chunk:
+                    if user_id != current_id:
+                        if current is not None:
+                            out.append(current)
+                        current_id, current = user_id, (chat_id, username, is_active, [])
+                    if city:
+                        current[3].append(city)
+                if out:
+                    yield out
+            if current is not None:
+                yield [current]
 
-            user = Users(
-                telegram_username=telegram_username.strip(),
-                chat_id=chat_id,
-                apply_status="3_user"
-            )
-            session.add(user)
-            try:
-                await session.commit()
-            except IntegrityError:
-                await session.rollback()
-                raise ValueError("Пользователь с таким chat_id или ником уже существует.")
-            await session.refresh(user)
-            return user
-        
     async def next_user_to_apply(self) -> tuple[int, str | None, str | None, str | None, bool] | None:
         """
         Карусель по пользователям:
@@ -92,63 +169,30 @@ class UserActions:
           иначе переходим к минимальному id.
         - Перекладываем токен: current ставим 0_waiting, next ставим 1_in_progress.
         - Если 0_waiting нет совсем — возвращаем current.
+        Вызывается на каждом тике: одна транзакция на соединении, без ORM-объектов,
+        данные аккаунта приходят из UPDATE ... RETURNING.
         """
-        async with SessionLocal() as session:
+        async with engine.begin() as conn:
             # 1) текущий держатель токена
-            res = await session.execute(
-                select(Users)
-                .where(Users.apply_status == "1_in_progress")
-                .order_by(Users.id.asc())
-                .limit(1)
-            )
-            current = res.scalar_one_or_none()
-
-            if current is None:
-                # первый запуск: берём самого раннего ожидающего
-                res = await session.execute(
-                    select(Users)
-                    .where(Users.apply_status == "0_waiting")
-                    .order_by(Users.id.asc())
-                    .limit(1)
-                )
-                nxt = res.scalar_one_or_none()
-                if nxt is None:
-                    return None  # пустая очередь
-                nxt.apply_status = "1_in_progress"
-                await session.commit()
-                await session.refresh(nxt)
-                return nxt.id, nxt.login, nxt.password, nxt.city, False
+            current = (await conn.execute(_CURRENT_HOLDER)).scalar()
 
-            # 2) есть current: ищем следующего после него
-            res = await session.execute(
-                select(Users)
-                .where(Users.apply_status == "0_waiting", Users.id > current.id)
-                .order_by(Users.id.asc())
-                .limit(1)
-            )
-            nxt = res.scalar_one_or_none()
+            # 2) следующий ожидающий после него; с начала - если дальше никого
+            nxt = (await conn.execute(_NEXT_WAITING, {"after_id": current or 0})).scalar()
+            if nxt is None and current is not None:
+                nxt = (await conn.execute(_NEXT_WAITING, {"after_id": 0})).scalar()
 
             if nxt is None:
-                # переходим к самому маленькому ожидающему
-                res = await session.execute(
-                    select(Users)
-                    .where(Users.apply_status == "0_waiting")
-                    .order_by(Users.id.asc())
-                    .limit(1)
-                )
-                nxt = res.scalar_one_or_none()
-                
-            if nxt is None:
+                if current is None:
+                    return None  # пустая очередь
                 # Никто не ждёт — продолжаем текущего
-                await session.refresh(current)
-                return current.id, current.login, current.password, current.city, True
+                row = (await conn.execute(_ACCOUNT_ROW, {"uid": current})).one()
+                return (*row, True)
 
             # 3) перекладываем токен
-            current.apply_status = "0_waiting"
-            nxt.apply_status = "1_in_progress"
-            await session.commit()
-            await session.refresh(nxt)
-            return nxt.id, nxt.login, nxt.password, nxt.city, False
+            if current is not None:
+                await conn.execute(_SET_STATUS, {"uid": current, "new_status": "0_waiting"})
+            row = (await conn.execute(_TAKE_TOKEN, {"uid": nxt, "new_status": "1_in_progress"})).one()
+            return (*row, False)
 
     async def change_user_status(self, *,
                                  user_id: int,
@@ -157,34 +201,356 @@ class UserActions:
         Меняет статус пользователя тольео если текущий статус == '1_in_progress'.
         По умолчанию переводит в '2_apply_made', опционально в '0_waiting'.
         Возвращает True при успехе, иначе False.
+        Проверка статуса - в WHERE того же UPDATE, без предварительного SELECT.
         """
-        async with SessionLocal() as session:
-            user = await session.get(Users, user_id)
-            if user is None:
-                return False
-
-            if user.apply_status != '1_in_progress': # TO_DO добавить нормальный raise ошибок
-                return False
-
-            user.apply_status = apply_status
-            await session.commit()
-            return True
+        async with engine.begin() as conn:
+            res = await conn.execute(_CHANGE_STATUS, {"uid": user_id, "new_status": apply_status})
+            return (res.rowcount or 0) > 0
         
 
     async def get_chat_ids_by_status(self,
                                      status: str = "3_user") -> list[int]:
         """
         Вернуть список chat_id всех пользователей с заданным статусом.
-        По умолчанию — '3_user'. NULL-значения исключаются.
+        По умолчанию — '3_user'. NULL-значения и отключённые (is_active=False) исключаются.
+        """
+        async with engine.connect() as conn:
+            res = await conn.execute(_CHAT_IDS_BY_STATUS, {"status": status})
+            return list(res.scalars().all())
+
+    async def deactivate_chat_ids(self, chat_ids: list[int]) -> int:
+        """Пометить чаты недоступными одним UPDATE. Возвращает число изменённых строк."""
+        if not chat_ids:
+            return 0
+        async with SessionLocal() as session:
+            res = await session.execute(
+                update(Users)
+                .where(Users.chat_id.in_(chat_ids), Users.is_active.is_(True))
+                .values(is_active=False)
+            )
+            await session.commit()
+            return res.rowcount or 0
+
+    async def iter_chat_ids_by_status(self,
+                                      status: str = "3_user",
+                                      chunk_size: int = 1000) -> AsyncIterator[list[int]]:
+        """
+        То же, что get_chat_ids_by_status, но без загрузки всего списка в память:
+        серверный курсор (stream_scalars) отдаёт chat_id пачками по chunk_size.
+        Рассылка может начинаться сразу после первой пачки.
+        """
+        async with SessionLocal() as session:
+            stmt = (
+                select(Users.chat_id)
+                .where(Users.apply_status == status, Users.chat_id.is_not(None), Users.is_active.is_(True))
+                .order_by(Users.id.asc())
+                .execution_options(yield_per=chunk_size)
+            )
+            res = await session.stream_scalars(stmt)
+            async for chunk in res.partitions(chunk_size):
+                yield [cid for cid in chunk if cid is not None]
+
+class OutboxActions:
+    """
+    Outbox рассылок: каждая рассылка - NotificationJob,
+    каждому получателю - строка NotificationDelivery со статусом pending/sent/failed.
+    После рестарта недоставленное дочитывается из pending.
+    """
+    async def create_job(self, *, text: str, city: str | None = None) -> int:
+        """
+        Создать рассылку в статусе building. Получатели добавляются пачками (add_deliveries),
+        доставка идёт уже во время построения; seal_job переводит рассылку в pending.
+        Возвращает job_id.
+        """
+        async with engine.begin() as conn:
+            return (await conn.execute(
+                insert(NotificationJob).values(text=text, city=city, status="building")
+                .returning(NotificationJob.id)
+            )).scalar_one()
+
+    async def add_deliveries(self, job_id: int, chat_ids: list[int]) -> int:
+        """
+        Добавить пачку получателей в своей транзакции: первые сообщения уходят,
+        не дожидаясь записи остальных. Дубли в рассылке пропускаются.
+        Возвращает число добавленных строк.
+        """
+        rows = [{"job_id": job_id, "chat_id": cid} for cid in dict.fromkeys(chat_ids) if cid is not None]
+        if not rows:
+            return 0
+        stmt = _upsert(NotificationDelivery).values(rows).on_conflict_do_nothing(
+            index_elements=[NotificationDelivery.job_id, NotificationDelivery.chat_id])
+        async with engine.begin() as conn:
+            return (await conn.execute(stmt)).rowcount
+
+    async def seal_job(self, job_id: int, total: int):
+        """Все получатели записаны: building -> pending (пустая рассылка - сразу done)."""
+        async with engine.begin() as conn:
+            await conn.execute(
+                update(NotificationJob).where(NotificationJob.id == job_id)
+                .values(total=total, status="pending" if total else "done",
+                        finished_at=None if total else func.now())
+            )
+
+    async def seal_interrupted(self) -> list[int]:
+        """
+        Рассылки, построение которых прервал рестарт (остались building):
+        total - по уже записанным получателям, дальше они доставляются как обычные.
+        """
+        async with engine.begin() as conn:
+            ids = list((await conn.execute(
+                select(NotificationJob.id).where(NotificationJob.status == "building")
+            )).scalars().all())
+            if ids:
+                written = (
+                    select(func.count()).select_from(NotificationDelivery)
+                    .where(NotificationDelivery.job_id == NotificationJob.id)
+                    .scalar_subquery()
+                )
+                await conn.execute(
+                    update(NotificationJob).where(NotificationJob.id.in_(ids))
+                    .values(total=written, status="pending")
+                )
+            return ids
+
+    async def next_batch(self, limit: int = 200) -> list[tuple[int, int, int, str, int]]:
+        """
+        Следующие pending-доставки: [(delivery_id, job_id, chat_id, text, attempts)], старые рассылки первыми.
+        Рассылки в статусе building тоже: их уже записанные получатели не ждут остальных.
         """
         async with SessionLocal() as session:
             res = await session.execute(
-                select(Users.chat_id).where(
-                    Users.apply_status == status,
-                    Users.chat_id.is_not(None)
+                select(NotificationDelivery.id, NotificationDelivery.job_id,
+                       NotificationDelivery.chat_id, NotificationJob.text, NotificationDelivery.attempts)
+                .join(NotificationJob, NotificationJob.id == NotificationDelivery.job_id)
+                .where(NotificationDelivery.status == "pending", NotificationJob.status.in_(("building", "pending")),
+                       or_(NotificationDelivery.next_attempt_at.is_(None),
+                           NotificationDelivery.next_attempt_at <= datetime.now(timezone.utc)))
+                .order_by(NotificationDelivery.job_id.asc(), NotificationDelivery.id.asc())
+                .limit(limit)
+            )
+            return [tuple(r) for r in res.all()]
+
+    async def next_retry_at(self) -> datetime | None:
+        """Ближайший момент повтора отложенных pending-доставок (None - отложенных нет)."""
+        async with engine.connect() as conn:
+            return (await conn.execute(
+                select(func.min(NotificationDelivery.next_attempt_at))
+                .where(NotificationDelivery.status == "pending", NotificationDelivery.next_attempt_at.is_not(None))
+            )).scalar_one_or_none()
+
+    async def mark_batch(self, *,
+                         sent: list[int],
+                         failed: dict[str, list[int]] | None = None,
+                         unreachable: dict[str, list[int]] | None = None,
+                         retry: list[tuple[int, float]] | None = None,
+                         throttled: list[tuple[int, float]] | None = None):
+        """
+        Пакетно обновить статусы: sent, failed / unreachable (ошибка -> ids).
+        retry и throttled - (id, через сколько секунд повторить), остаются pending:
+        retry (сеть, 5xx) тратит попытку, throttled (429) - нет.
+        """
+        async with SessionLocal() as session:
+            if sent:
+                await session.execute(
+                    update(NotificationDelivery)
+                    .where(NotificationDelivery.id.in_(sent))
+                    .values(status="sent", attempts=NotificationDelivery.attempts + 1)
+                )
+            for status, groups in (("failed", failed), ("unreachable", unreachable)):
+                for error, ids in (groups or {}).items():
+                    await session.execute(
+                        update(NotificationDelivery)
+                        .where(NotificationDelivery.id.in_(ids))
+                        .values(status=status, error=error[:255], attempts=NotificationDelivery.attempts + 1)
+                    )
+            now = datetime.now(timezone.utc)
+            for rows, inc in ((retry, 1), (throttled, 0)):
+                if rows:
+                    # Core-таблица: executemany с разным next_attempt_at на строку
+                    t = NotificationDelivery.__table__
+                    await session.execute(
+                        update(t)
+                        .where(t.c.id == bindparam("did"))
+                        .values(attempts=t.c.attempts + inc, next_attempt_at=bindparam("at")),
+                        [{"did": did, "at": now + timedelta(seconds=delay)} for did, delay in rows],
+                    )
+            await session.commit()
+
+    async def finish_jobs(self) -> list[int]:
+        """Пометить done рассылки без pending-доставок. Возвращает их id."""
+        async with SessionLocal() as session:
+            pending = exists().where(
+                NotificationDelivery.job_id == NotificationJob.id,
+                NotificationDelivery.status == "pending",
+            )
+            res = await session.execute(
+                select(NotificationJob.id).where(NotificationJob.status == "pending", ~pending)
+            )
+            ids = list(res.scalars().all())
+            if ids:
+                await session.execute(
+                    update(NotificationJob)
+                    .where(NotificationJob.id.in_(ids))
+                    .values(status="done", finished_at=func.now())
                 )
+                await session.commit()
+            return ids
+
+    async def progress(self, *, job_ids: list[int] | None = None, limit: int = 5) -> list[dict]:
+        """Прогресс рассылок (последние limit или заданные): id, city, status, total, sent, pending, failed, unreachable."""
+        async with SessionLocal() as session:
+            stmt = select(NotificationJob).order_by(NotificationJob.id.desc())
+            if job_ids:
+                stmt = stmt.where(NotificationJob.id.in_(job_ids))
+            else:
+                stmt = stmt.limit(limit)
+            jobs = (await session.execute(stmt)).scalars().all()
+            if not jobs:
+                return []
+
+            res = await session.execute(
+                select(NotificationDelivery.job_id, NotificationDelivery.status, func.count())
+                .where(NotificationDelivery.job_id.in_([j.id for j in jobs]))
+                .group_by(NotificationDelivery.job_id, NotificationDelivery.status)
             )
-            return [cid for cid in res.scalars().all() if cid is not None]
+            counts: dict[int, dict[str, int]] = {}
+            for job_id, status, n in res.all():
+                counts.setdefault(job_id, {})[status] = n
+
+            return [{
+                "id": j.id, "city": j.city, "status": j.status, "total": j.total,
+                "sent": counts.get(j.id, {}).get("sent", 0),
+                "pending": counts.get(j.id, {}).get("pending", 0),
+                "failed": counts.get(j.id, {}).get("failed", 0),
+                "unreachable": counts.get(j.id, {}).get("unreachable", 0),
+            } for j in jobs]
+
+class SubscriptionActions:
+    """Подписки пользователей на города (таблица user_cities)"""
+    async def set_cities(self, *, chat_id: int, cities: list[str]) -> list[str]:
+        """Заменить набор городов пользователя. Пустой список - подписка на все города."""
+        async with SessionLocal() as session:
+            user_id = (await session.execute(
+                select(Users.id).where(Users.chat_id == chat_id)
+            )).scalar_one_or_none()
+            if user_id is None:
+                raise ValueError("Пользователь не найден. Сначала пройдите регистрацию.")
+
+            cities = list(dict.fromkeys(c.strip() for c in cities if c and c.strip()))
+            await session.execute(delete(UserCity).where(UserCity.user_id == user_id))
+            if cities:
+                await session.execute(insert(UserCity), [{"user_id": user_id, "city": c} for c in cities])
+            await session.commit()
+            return cities
+
+    async def replace_many(self, cities_by_user: dict[int, list[str]]):
+        """Заменить города сразу у многих пользователей: один DELETE и один executemany INSERT."""
+        if not cities_by_user:
+            return
+        async with engine.begin() as conn:
+            await conn.execute(delete(UserCity).where(UserCity.user_id.in_(list(cities_by_user))))
+            rows = [{"user_id": uid, "city": c} for uid, cities in cities_by_user.items() for c in cities]
+            if rows:
+                await conn.execute(insert(UserCity), rows)
+
+    async def get_cities(self, *, chat_id: int) -> list[str]:
+        async with SessionLocal() as session:
+            res = await session.execute(
+                select(UserCity.city)
+                .join(Users, Users.id == UserCity.user_id)
+                .where(Users.chat_id == chat_id)
+                .order_by(UserCity.city)
+            )
+            return list(res.scalars().all())
+
+    async def iter_subscriptions(self,
+                                 status: str = "3_user",
+                                 chunk_size: int = 5000) -> AsyncIterator[list[tuple[int, str | None]]]:
+        """
+        Пары (chat_id, city) для построения индекса подписок, пачками с серверного курсора.
+        city = None - у пользователя нет подписок (получает все города).
+        """
+        async with SessionLocal() as session:
+            stmt = (
+                select(Users.chat_id, UserCity.city)
+                .outerjoin(UserCity, UserCity.user_id == Users.id)
+                .where(Users.apply_status == status, Users.chat_id.is_not(None), Users.is_active.is_(True))
+                .execution_options(yield_per=chunk_size)
+            )
+            res = await session.stream(stmt)
+            async for chunk in res.partitions(chunk_size):
+                yield [(chat_id, city) for chat_id, city in chunk]
+
+class StateActions:
+    """Состояние приложения по ключу (таблица runtime_state)"""
+    async def get(self, key: str) -> dict | None:
+        async with SessionLocal() as session:
+            obj = await session.get(RuntimeState, key)
+            return obj.data if obj else None
+
+    async def set(self, key: str, data: dict | None):
+        async with SessionLocal() as session:
+            await session.merge(RuntimeState(key=key, data=data))
+            await session.commit()
+
+class FsmActions:
+    """Состояния FSM aiogram (таблица fsm_states) - см. telegram_bot.fsm_storage"""
+    async def get(self, key: str, now: datetime) -> tuple[str | None, dict | None]:
+        """(state, data); просроченная запись - как отсутствующая."""
+        async with engine.connect() as conn:
+            row = (await conn.execute(
+                select(FsmState.state, FsmState.data).where(FsmState.key == key, FsmState.expires_at > now)
+            )).first()
+            return (row[0], row[1]) if row else (None, None)
+
+    async def put(self, key: str, now: datetime, expires_at: datetime, **values):
+        """
+        Записать state и/или data одним upsert, продлив срок жизни записи.
+        Незаданное поле сохраняется, если запись ещё не истекла, иначе сбрасывается.
+        """
+        keep = {
+            name: case((FsmState.expires_at > now, getattr(FsmState, name)), else_=None)
+            for name in ("state", "data") if name not in values
+        }
+        stmt = _upsert(FsmState).values(
+            {"key": key, "expires_at": expires_at, "state": None, "data": None, **values}
+        ).on_conflict_do_update(
+            index_elements=[FsmState.key],
+            set_={"expires_at": expires_at, **values, **keep},
+        )
+        async with engine.begin() as conn:
+            await conn.execute(stmt)
+
+    async def delete(self, key: str):
+        async with engine.begin() as conn:
+            await conn.execute(delete(FsmState).where(FsmState.key == key))
+
+    async def delete_expired(self, now: datetime, batch_size: int = 500) -> int:
+        """Удалить до batch_size просроченных записей одним DELETE. Возвращает число удалённых."""
+        expired = select(FsmState.key).where(FsmState.expires_at <= now).limit(batch_size)
+        async with engine.begin() as conn:
+            res = await conn.execute(delete(FsmState).where(FsmState.key.in_(expired.scalar_subquery())))
+            return res.rowcount or 0
+
+class LocatorActions:
+    """Статистика локаторов (таблица locator_stats)"""
+    async def load_all(self) -> list[tuple[str, str, int, int, float | None]]:
+        async with SessionLocal() as session:
+            res = await session.execute(
+                select(LocatorStat.group, LocatorStat.locator, LocatorStat.hits,
+                       LocatorStat.misses, LocatorStat.avg_ms)
+            )
+            return [tuple(r) for r in res.all()]
+
+    async def save_many(self, rows: list[tuple[str, str, int, int, float | None]]):
+        """rows: (group, locator, hits, misses, avg_ms) - абсолютные значения, перезаписываются."""
+        if not rows:
+            return
+        async with SessionLocal() as session:
+            for group, locator, hits, misses, avg_ms in rows:
+                await session.merge(LocatorStat(group=group, locator=locator,
+                                                hits=hits, misses=misses, avg_ms=avg_ms))
+            await session.commit()
 
 if __name__ == "__main__":
 
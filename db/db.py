@@ -1,37 +1,110 @@
+from sqlalchemy import event, inspect
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from db.models import Base
+import logging
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 DB_USER = os.getenv("DB_USER")
 DB_PASSWORD = os.getenv("DB_PASSWORD")
 DB_HOST = os.getenv("DB_HOST")
 DB_PORT = os.getenv("DB_PORT")
 DB_NAME = os.getenv("DB_NAME")
 
-DB_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+# postgres (по умолчанию) или sqlite - для локального запуска без контейнера с БД
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").strip().lower()
+SQLITE_PATH = os.getenv("SQLITE_PATH", "data/app.db")
+
+# пул соединений postgres (см. README: Database pool)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_RECYCLE_SEC = int(os.getenv("DB_POOL_RECYCLE_SEC", "1800"))
+# pre_ping - проверка соединения при выдаче из пула: после рестарта / failover postgres первый
+# запрос не падает на мёртвом соединении. Стоит round trip на выдачу; 0 - выключить
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").strip().lower() in ("1", "true", "yes")
+# кеш подготовленных statements asyncpg на соединение; 0 - за pgbouncer в режиме transaction
+DB_PREPARED_CACHE = int(os.getenv("DB_PREPARED_CACHE", "500"))
+
+def build_db_url() -> str:
+    """DATABASE_URL имеет приоритет, иначе собираем из DB_BACKEND и DB_* переменных."""
+    url = os.getenv("DATABASE_URL", "").strip()
+    if url:
+        return url
+    if DB_BACKEND == "sqlite":
+        return f"sqlite+aiosqlite:///{SQLITE_PATH}"
+    return f'postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+def make_engine(url: str):
+    if make_url(url).get_backend_name() == "sqlite":
+        eng = create_async_engine(
+            url,
+            connect_args={"timeout": 30},  # ждать снятия блокировки записи, а не падать сразу
+        )
+
+        @event.listens_for(eng.sync_engine, "connect")
+        def _sqlite_pragmas(dbapi_conn, _):
+            cur = dbapi_conn.cursor()
+            cur.execute("PRAGMA journal_mode=WAL")      # читатели не блокируют писателя
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA foreign_keys=ON")
+            cur.close()
+
+        return eng
+
+    return create_async_engine(
+        url,
+        pool_size=DB_POOL_SIZE,          # под кол-во concurency
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_recycle=DB_POOL_RECYCLE_SEC,
+        pool_pre_ping=DB_POOL_PRE_PING,
+        connect_args={"prepared_statement_cache_size": DB_PREPARED_CACHE},
+    )
+
+DB_URL = build_db_url()
+
+engine = make_engine(DB_URL)
+IS_SQLITE = engine.dialect.name == "sqlite"
 
-engine = create_async_engine(
-    DB_URL,
-    pool_size=5,          # под кол-во concurency
-    max_overflow=5,
-    pool_pre_ping=True,
-)
 SessionLocal = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
 )
 
+def _add_missing_columns(sync_conn):
+    """
+    create_all не меняет существующие таблицы - новые колонки моделей
+    добавляем через ALTER TABLE ADD COLUMN (только добавление, со server_default).
+    """
+    insp = inspect(sync_conn)
+    existing_tables = set(insp.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in have:
+                continue
+            ddl = CreateColumn(column).compile(dialect=sync_conn.dialect)
+            table_name = sync_conn.dialect.identifier_preparer.quote(table.name)
+            sync_conn.exec_driver_sql(f"ALTER TABLE {table_name} ADD COLUMN {ddl}")
+            log.info("column added", extra={"table": table.name, "column": column.name})
+
 async def init_db():
+    if IS_SQLITE:
+        # каталог под файл БД (data/app.db по умолчанию)
+        db_path = engine.url.database
+        if db_path and db_path != ":memory:" and os.path.dirname(db_path):
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_add_missing_columns)
 
 
 
 if __name__ == "__main__":
     import asyncio
     asyncio.run(init_db())
-
-
-
-
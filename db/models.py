@@ -1,5 +1,5 @@
 from datetime import datetime
-from sqlalchemy import String, DateTime, Integer, BigInteger, JSON
+from sqlalchemy import String, DateTime, Integer, BigInteger, JSON, Text, Boolean, Float, ForeignKey, Index, UniqueConstraint, func, true
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 class Base(DeclarativeBase):
@@ -15,6 +15,8 @@ class Users(Base):
     telegram_username: Mapped[str] = mapped_column(String(64), unique=False, nullable=False) # ДЛЯ ОТЛАДКИ unique=False
     city: Mapped[str | None] = mapped_column(String(64), nullable=True)
     apply_status:  Mapped[str] = mapped_column(String(64), nullable=False, default="0_waiting", server_default="0_waiting")
+    # False - чат недоступен (бот заблокирован / чат удалён), из рассылок исключается
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True, server_default=true())
 
     def __repr__(self):
         return f"<User id={self.id} login={self.login} tg=@{self.telegram_username} apply_status={self.apply_status}>"
@@ -25,4 +27,64 @@ class JobResult(Base):
     user_id: Mapped[int] = mapped_column(Integer, primary_key=False) #Нужно добавить логику в остальном коде под это
     status: Mapped[str] = mapped_column(String(16))
     url: Mapped[str | None] = mapped_column(String(512))
-    payload: Mapped[dict | None] = mapped_column(JSON)
\ No newline at end of file
+    payload: Mapped[dict | None] = mapped_column(JSON)
+    artifact_id: Mapped[str | None] = mapped_column(String(64), nullable=True)  # каталог в logs/artifacts при падении
+
+class NotificationJob(Base):
+    """Рассылка в outbox: одна запись на broadcast"""
+    __tablename__ = "notification_jobs"
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    text: Mapped[str] = mapped_column(Text)
+    city: Mapped[str | None] = mapped_column(String(64), nullable=True)
+    status: Mapped[str] = mapped_column(String(16), default="pending", server_default="pending") # building / pending / done
+    total: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    finished_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class NotificationDelivery(Base):
+    """Состояние доставки рассылки конкретному получателю"""
+    __tablename__ = "notification_deliveries"
+    __table_args__ = (
+        UniqueConstraint("job_id", "chat_id", name="uq_delivery_job_chat"),
+        Index("ix_delivery_status_job", "status", "job_id"),
+    )
+    # BigInteger в sqlite не автоинкрементится - там Integer (тот же 64-битный rowid)
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(ForeignKey("notification_jobs.id", ondelete="CASCADE"))
+    chat_id: Mapped[int] = mapped_column(BigInteger)
+    status: Mapped[str] = mapped_column(String(16), default="pending", server_default="pending") # pending / sent / failed / unreachable
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    error: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    # повтор не раньше этого момента (после 429 / сетевой ошибки); NULL - можно сразу
+    next_attempt_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
+
+class UserCity(Base):
+    """Подписки пользователей на города (many-to-many Users <-> город)"""
+    __tablename__ = "user_cities"
+    user_id: Mapped[int] = mapped_column(ForeignKey("Users.id", ondelete="CASCADE"), primary_key=True)
+    city: Mapped[str] = mapped_column(String(64), primary_key=True, index=True)
+
+class RuntimeState(Base):
+    """Произвольное состояние приложения по ключу (желаемый режим работы и т.п.)"""
+    __tablename__ = "runtime_state"
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    data: Mapped[dict | None] = mapped_column(JSON)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class LocatorStat(Base):
+    """Статистика локаторов веб-бота: какой из вариантов селектора сейчас находит элемент"""
+    __tablename__ = "locator_stats"
+    group: Mapped[str] = mapped_column(String(64), primary_key=True)
+    locator: Mapped[str] = mapped_column(String(255), primary_key=True)
+    hits: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    misses: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    avg_ms: Mapped[float | None] = mapped_column(Float, nullable=True)  # скользящее среднее времени до находки
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class FsmState(Base):
+    """Состояние FSM aiogram (диалоги регистрации) - общее для всех реплик, переживает рестарт"""
+    __tablename__ = "fsm_states"
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)  # DefaultKeyBuilder: бот:чат:пользователь:...
+    state: Mapped[str | None] = mapped_column(String(255), nullable=True)
+    data: Mapped[dict | None] = mapped_column(JSON, nullable=True)
+    expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), index=True)  # брошенные диалоги удаляются
@@ -0,0 +1,105 @@
+import asyncio
+import logging
+from array import array
+from bisect import bisect_left
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from db.data_access import SubscriptionActions
+
+log = logging.getLogger(__name__)
+
+# ключ для пользователей без выбранных городов - получают уведомления по всем городам
+ALL_CITIES = "*"
+
+class SubscriptionIndex:
+    """
+    Индекс подписок в памяти: город -> отсортированный array('q') из chat_id
+    (8 байт на подписку, без python-объектов на каждый id).
+    Строится один раз при старте из БД и дальше обновляется инкрементально
+    при регистрации / смене городов / отключении получателя.
+    """
+    def __init__(self):
+        self._by_city: dict[str, array] = {}
+        self._loaded = False
+        self._lock = asyncio.Lock()
+        self.actions = SubscriptionActions()
+        # в кластере изменения рассылаются остальным репликам: async (chat_id, cities)
+        self.publisher: Optional[Callable[[int, list[str]], Awaitable[None]]] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    async def load(self):
+        """Полная перестройка индекса из БД (потоково, без загрузки всех строк разом)."""
+        async with self._lock:
+            buckets: dict[str, array] = {}
+            async for chunk in self.actions.iter_subscriptions():
+                for chat_id, city in chunk:
+                    buckets.setdefault(city or ALL_CITIES, array("q")).append(chat_id)
+            by_city = {}
+            for city, ids in buckets.items():
+                by_city[city] = array("q", sorted(set(ids)))
+            self._by_city = by_city
+            self._loaded = True
+        log.info("subscription index loaded", extra={"cities": len(by_city),
+                                                     "subscriptions": sum(map(len, by_city.values()))})
+
+    # ---- инкрементальные изменения ----
+    @staticmethod
+    def _insert(arr: array, chat_id: int):
+        i = bisect_left(arr, chat_id)
+        if i == len(arr) or arr[i] != chat_id:
+            arr.insert(i, chat_id)
+
+    @staticmethod
+    def _remove(arr: array, chat_id: int):
+        i = bisect_left(arr, chat_id)
+        if i < len(arr) and arr[i] == chat_id:
+            del arr[i]
+
+    def set_user(self, chat_id: int, cities: list[str]):
+        """Заменить подписки пользователя; пустой список - все города."""
+        self.remove_user(chat_id)
+        for city in cities or [ALL_CITIES]:
+            self._insert(self._by_city.setdefault(city, array("q")), chat_id)
+
+    async def update_user(self, chat_id: int, cities: list[str]):
+        """set_user + уведомить другие реплики (если настроен publisher)."""
+        self.set_user(chat_id, cities)
+        if self.publisher:
+            try:
+                await self.publisher(chat_id, cities)
+            except Exception:
+                log.warning("subscription change not published", exc_info=True, extra={"chat_id": chat_id})
+
+    def remove_user(self, chat_id: int):
+        for arr in self._by_city.values():
+            self._remove(arr, chat_id)
+
+    def remove_many(self, chat_ids: list[int]):
+        for chat_id in chat_ids:
+            self.remove_user(chat_id)
+
+    # ---- выборка получателей ----
+    def count(self, city: str) -> int:
+        return len(self._by_city.get(city, ())) + len(self._by_city.get(ALL_CITIES, ()))
+
+    async def iter_chunks(self, city: str, chunk_size: int = 1000) -> AsyncIterator[list[int]]:
+        """
+        Получатели события по городу пачками: подписчики города + подписанные на все.
+        Массивы копируются срезом на момент вызова - параллельные изменения индекса не мешают.
+        """
+        for key in (city, ALL_CITIES):
+            arr = self._by_city.get(key)
+            if not arr:
+                continue
+            snapshot = arr[:]
+            for i in range(0, len(snapshot), chunk_size):
+                yield snapshot[i:i + chunk_size].tolist()
+
+    def stats(self) -> dict[str, int]:
+        return {city: len(arr) for city, arr in self._by_city.items()}
+
+# общий индекс процесса (строится в bot.main)
+subscription_index = SubscriptionIndex()
@@ -1,19 +1,42 @@
 import asyncio
-from typing import Awaitable, Callable, Optional
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from typing import AsyncIterable, Awaitable, Callable, Optional
 from aiogram import Router, F
-from aiogram.filters import Command
-from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, FSInputFile
 from telegram_bot.start import make_start_kb
+from web_bot.artifacts import artifact_store
+from web_bot.site_check import check_site
+from app_config import config
+from db.subscriptions import subscription_index
+from telegram_bot.user_csv import import_users, export_users, USER_CSV_FIELDS
+
+log = logging.getLogger(__name__)
 
 def create_admin_router(controller,
                         admin_chat_id: int,
                         send_admin_event: Optional[Callable[[dict], Awaitable[None]]] = None,
-                        notify_users: Optional[Callable[[list[int], str, bool], Awaitable[None]]] = None):
+                        notify_users: Optional[Callable[[list[int] | AsyncIterable[list[int]], str, bool], Awaitable[int]]] = None,
+                        outbox=None,
+                        cluster=None,
+                        status_panel=None):
     router = Router()
 
     def _is_admin(m: Message) -> bool:
         return bool(admin_chat_id) and (m.from_user.id == admin_chat_id)
 
+    async def _to_cluster(m: Message, cmd: str, **data) -> bool:
+        """В кластере команда уходит всем репликам (выполняет ведущая). True - отправлено."""
+        if cluster is None or not cluster.enabled:
+            return False
+        await cluster.publish(cmd, **data)
+        await m.answer("Команда отправлена репликам, результат придёт отдельным сообщением.")
+        return True
+
     @router.message(F.text == "Админ")
     async def admin_menu(m: Message):
         if not _is_admin(m):
@@ -23,6 +46,11 @@ def create_admin_router(controller,
             keyboard=[
                 [KeyboardButton(text="/start_job"), KeyboardButton(text="/stop_job")],
                 [KeyboardButton(text="/run_once"),  KeyboardButton(text="/continue")],
+                [KeyboardButton(text="/digest"),   KeyboardButton(text="/outbox")],
+                [KeyboardButton(text="/slots"),    KeyboardButton(text="/profile")],
+                [KeyboardButton(text="/parked"),   KeyboardButton(text="/reload_config")],
+                [KeyboardButton(text="/export_users"), KeyboardButton(text="/import_users")],
+                [KeyboardButton(text="/panel"),    KeyboardButton(text="/site_check")],
                 [KeyboardButton(text="⬅️ Назад")],
             ],
             resize_keyboard=True
@@ -33,6 +61,8 @@ def create_admin_router(controller,
     async def start_job(m: Message):
         if not _is_admin(m):
             return await m.answer("Недостаточно прав.")
+        if await _to_cluster(m, "start_job"):
+            return
         msg = await controller.start(asyncio.get_running_loop(), send_admin_event, notify_users)
         await m.answer(msg)
 
@@ -40,6 +70,8 @@ def create_admin_router(controller,
     async def stop_job(m: Message):
         if not _is_admin(m):
             return await m.answer("Недостаточно прав.")
+        if await _to_cluster(m, "stop_job"):
+            return
         msg = await controller.stop()
         await m.answer(msg)
 
@@ -47,16 +79,223 @@ def create_admin_router(controller,
     async def run_once(m: Message):
         if not _is_admin(m):
             return await m.answer("Недостаточно прав.")
+        if await _to_cluster(m, "run_once"):
+            return
         res = await controller.run_once()
         await m.answer(str(res))
 
     @router.message(Command("continue"))
-    async def cmd_continue(m: Message):
+    async def cmd_continue(m: Message, command: CommandObject):
+        # /continue - самый старый отложенный прогон, /continue <id> - конкретный
         if not _is_admin(m):
             return await m.answer("Недостаточно прав.")
-        ok = await controller.resume()
+        park_id = (command.args or "").strip() or None
+        if await _to_cluster(m, "continue", park_id=park_id):
+            return
+        ok = await controller.resume(park_id)
         await m.answer("Продолжаю." if ok else "Сейчас ничего не на паузе.")
 
+    @router.message(Command("parked"))
+    async def cmd_parked(m: Message):
+        # прогоны, отложенные паузой (captcha/new_tab), и сколько они ждут
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        if cluster is not None and cluster.enabled and not cluster.is_leader:
+            return await m.answer("Прогоны выполняет ведущая реплика, эта - ведомая.")
+        parked = controller.parked()
+        if not parked:
+            return await m.answer("Отложенных прогонов нет.")
+        lines = [f"#{p['park_id']} {p['kind']} {p['city'] or '-'}: ждёт {p['waited_sec']} с, "
+                 f"закроется через {p['left_sec']} с — /continue {p['park_id']}" for p in parked]
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("digest"))
+    async def cmd_digest(m: Message, command: CommandObject):
+        # /digest 600 - сводка раз в 10 минут, /digest off - каждое событие сразу
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        arg = (command.args or "").strip().lower()
+        if not arg:
+            return await m.answer("Использование: /digest <секунды> или /digest off")
+        if arg in ("off", "0"):
+            arg = "0"
+        if not arg.isdigit():
+            return await m.answer("Интервал должен быть числом секунд.")
+        if await _to_cluster(m, "digest", interval=int(arg)):
+            return
+        await m.answer(await controller.set_digest_interval(int(arg)))
+
+    @router.message(Command("outbox"))
+    async def cmd_outbox(m: Message):
+        # прогресс последних рассылок: отправлено / в очереди / с ошибкой
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        if outbox is None:
+            return await m.answer("Outbox не подключён.")
+        jobs = await outbox.progress(limit=5)
+        if not jobs:
+            return await m.answer("Рассылок ещё не было.")
+        lines = ["Последние рассылки:"]
+        for j in jobs:
+            lines.append(
+                f"#{j['id']} {j['city'] or '-'} [{j['status']}] — "
+                f"отправлено {j['sent']}/{j['total']}, в очереди {j['pending']}, ошибок {j['failed']}, "
+                f"недоступно {j['unreachable']}"
+            )
+        lines.append(f"Отключено недоступных получателей с запуска: {outbox.pruned_total}")
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("import_users"), F.document)
+    async def cmd_import_users(m: Message):
+        # CSV приходит документом с подписью /import_users
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        tmp = tempfile.mkdtemp(prefix="users_import_")
+        try:
+            path = os.path.join(tmp, "users.csv")
+            await m.bot.download(m.document, destination=path)
+            await m.answer("Импортирую...")
+            stats = await import_users(path, list(config.current.allowed_cities))
+        except ValueError as e:
+            return await m.answer(f"Ошибка в файле: {e}")
+        except Exception as e:
+            # часть пачек могла уже записаться - индекс всё равно перестраиваем
+            log.warning("users import failed", exc_info=True)
+            stats = {"rows": "?", "imported": "?", "skipped": "?",
+                     "errors": [f"Импорт прерван: {type(e).__name__}: {str(e)[:200]}"]}
+        finally:
+            await asyncio.to_thread(shutil.rmtree, tmp, True)
+
+        # индекс подписок перестраиваем целиком (в кластере - на всех репликах)
+        if cluster is not None and cluster.enabled:
+            await cluster.publish("subs_reload")
+        else:
+            await subscription_index.load()
+        lines = [f"Импорт: строк {stats['rows']}, записано {stats['imported']}, пропущено {stats['skipped']}"]
+        lines += stats["errors"]
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("import_users"))
+    async def cmd_import_users_help(m: Message):
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        await m.answer("Пришлите CSV документом с подписью /import_users.\n"
+                       f"Колонки: {', '.join(USER_CSV_FIELDS)} (обязателен chat_id; города через «;», "
+                       "пусто - все города). Существующие chat_id обновляются.")
+
+    @router.message(Command("export_users"))
+    async def cmd_export_users(m: Message):
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        tmp = tempfile.mkdtemp(prefix="users_export_")
+        try:
+            path = os.path.join(tmp, f"users_{datetime.now():%Y%m%d_%H%M}.csv")
+            total = await export_users(path)
+            await m.answer_document(FSInputFile(path), caption=f"Подписчиков: {total}")
+        finally:
+            await asyncio.to_thread(shutil.rmtree, tmp, True)
+
+    @router.message(Command("slots"))
+    async def cmd_slots(m: Message):
+        # последний известный набор слотов по городам (уведомления уходят только при его изменении)
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        if cluster is not None and cluster.enabled and not cluster.is_leader:
+            return await m.answer("Слоты отслеживает ведущая реплика, эта - ведомая.")
+        slots = controller.last_slots()
+        if not slots:
+            return await m.answer("Свободных слотов сейчас не известно.")
+        lines = []
+        for city, availability in sorted(slots.items()):
+            for category, av in availability.items():
+                dates = ", ".join(av.get("dates") or []) or "-"
+                times = ", ".join(av.get("times") or []) or "-"
+                count = av.get("count") if av.get("count") is not None else "?"
+                lines.append(f"{city} / {category}: даты {dates}; время {times}; слотов {count}")
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("profile"))
+    async def cmd_profile(m: Message, command: CommandObject):
+        # /profile - список профилей опроса, /profile <имя> - переключить
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        name = (command.args or "").strip()
+        if name:
+            if await _to_cluster(m, "profile", name=name):
+                return
+            return await m.answer(await controller.set_profile(name))
+        try:
+            profiles, active = controller.profiles()
+        except ValueError as e:
+            return await m.answer(f"Ошибка в файле профилей: {e}")
+        lines = []
+        for pname, profile in sorted(profiles.items()):
+            mark = "▶️" if pname == active else "•"
+            lines.append(f"{mark} {pname}")
+            lines += [f"    {w.describe()}" for w in profile.windows]
+        lines.append("Переключить: /profile <имя>")
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("reload_config"))
+    async def cmd_reload_config(m: Message):
+        # перечитать config/app.json, профили опроса и текст соглашения, не дожидаясь проверки mtime
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        if await _to_cluster(m, "reload_config"):
+            return
+        changed = await config.reload(force=True)
+        cfg = config.current
+        lines = [f"Конфигурация перечитана, изменилось файлов: {len(changed)}"]
+        lines += [f"    {path}" for path in sorted(changed)]
+        lines.append(f"Города: {', '.join(cfg.allowed_cities) or '-'}; интервал по умолчанию {cfg.sched_interval_sec} с")
+        if config.last_error:
+            lines.append(f"⚠️ {config.last_error} - действуют прежние настройки")
+        await m.answer("\n".join(lines))
+
+    @router.message(Command("panel"))
+    async def cmd_panel(m: Message):
+        # заново создать и закрепить панель статуса (если старую удалили или она ушла далеко вверх)
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        if status_panel is None or not status_panel.enabled:
+            return await m.answer("Панель статуса выключена (STATUS_PANEL_SEC=0).")
+        if await _to_cluster(m, "panel"):
+            return
+        await status_panel.recreate()
+
+    @router.message(Command("site_check"))
+    async def cmd_site_check(m: Message):
+        # открыть страницу входа в отдельной сессии браузера, не дожидаясь очереди прогонов
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        await m.answer("Проверяю сайт...")
+        r = await check_site()
+        if r["error"]:
+            return await m.answer(f"Проверка не удалась: {r['error']}")
+        await m.answer(
+            f"{'✅' if r['ok'] else '⚠️'} {r['title'] or '-'}\n{r['url']}\n"
+            f"форма входа: {'есть' if r['login_form'] else 'нет'}, капча: {'есть' if r['captcha'] else 'нет'}, "
+            f"{r['elapsed_sec']} с"
+        )
+
+    @router.message(Command("artifact"))
+    async def cmd_artifact(m: Message, command: CommandObject):
+        # /artifact <id> - скриншот и сведения о падении (id приходит в событии scheduler)
+        if not _is_admin(m):
+            return await m.answer("Недостаточно прав.")
+        artifact_id = (command.args or "").strip()
+        if not artifact_id:
+            return await m.answer("Использование: /artifact <id>")
+        meta = artifact_store.get(artifact_id)
+        if meta is None:
+            return await m.answer("Артефакт не найден (возможно, уже вытеснен из буфера).")
+        caption = (f"{meta['id']}\n{meta.get('url') or '-'}\n{meta.get('reason') or ''}\n"
+                   f"Файлы: {', '.join(meta['files'])} ({artifact_store.path(artifact_id)})")[:1000]
+        if "screenshot.png" in meta["files"]:
+            shot = FSInputFile(f"{artifact_store.path(artifact_id)}/screenshot.png")
+            return await m.answer_photo(shot, caption=caption)
+        await m.answer(caption)
+
     @router.message(F.text == "⬅️ Назад")
     async def back_to_main(m: Message):
         await m.answer("Ок.", reply_markup=make_start_kb(is_admin=True))
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from db.data_access import FsmActions
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# db - состояния диалогов в БД (общие для реплик, переживают рестарт), memory - в памяти процесса
+FSM_STORAGE = os.getenv("FSM_STORAGE", "db").strip().lower()
+FSM_TTL_SEC = int(os.getenv("FSM_TTL_SEC", "86400"))            # брошенный диалог живёт сутки
+FSM_CLEANUP_SEC = int(os.getenv("FSM_CLEANUP_SEC", "600"))      # как часто чистить просроченные
+FSM_CLEANUP_BATCH = int(os.getenv("FSM_CLEANUP_BATCH", "500"))  # записей за один DELETE
+
+class SQLAlchemyStorage(BaseStorage):
+    """
+    FSM-хранилище aiogram на общем async-движке SQLAlchemy (таблица fsm_states).
+    Каждая запись продлевается на ttl_sec при записи; просроченная читается как пустая,
+    а фоновая задача удаляет такие записи пачками по batch_size, не держа длинных блокировок.
+    Данные FSM должны сериализоваться в JSON.
+    """
+    def __init__(self, *,
+                 ttl_sec: int = FSM_TTL_SEC,
+                 cleanup_sec: int = FSM_CLEANUP_SEC,
+                 batch_size: int = FSM_CLEANUP_BATCH,
+                 key_builder: Optional[KeyBuilder] = None):
+        self.ttl = timedelta(seconds=ttl_sec)
+        self.cleanup_sec = cleanup_sec
+        self.batch_size = batch_size
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self.actions = FsmActions()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- жизненный цикл ----
+    def start(self):
+        if self._task is None and self.cleanup_sec > 0:
+            self._task = asyncio.create_task(self._cleanup_loop())
+
+    async def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    # ---- BaseStorage ----
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._put(key, state=state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self.actions.get(self._key(key), self._now())
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._put(key, data=dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self.actions.get(self._key(key), self._now())
+        return dict(data or {})
+
+    # ---- внутреннее ----
+    @staticmethod
+    def _now() -> datetime:
+        return datetime.now(timezone.utc)
+
+    def _key(self, key: StorageKey) -> str:
+        return self.key_builder.build(key)
+
+    async def _put(self, key: StorageKey, **values):
+        now = self._now()
+        await self.actions.put(self._key(key), now, now + self.ttl, **values)
+
+    async def delete_expired(self) -> int:
+        """Удалить все просроченные записи пачками. Возвращает общее число удалённых."""
+        total = 0
+        while True:
+            n = await self.actions.delete_expired(self._now(), self.batch_size)
+            total += n
+            if n < self.batch_size:
+                return total
+            await asyncio.sleep(0)  # между пачками отдаём управление обработчикам апдейтов
+
+    async def _cleanup_loop(self):
+        while True:
+            await asyncio.sleep(self.cleanup_sec)
+            try:
+                removed = await self.delete_expired()
+                if removed:
+                    log.info("fsm states expired", extra={"removed": removed})
+            except Exception:
+                log.warning("fsm cleanup failed", exc_info=True)
+
+def create_storage() -> BaseStorage:
+    """Хранилище FSM по FSM_STORAGE: db (по умолчанию) или memory."""
+    if FSM_STORAGE == "memory":
+        return MemoryStorage()
+    return SQLAlchemyStorage()
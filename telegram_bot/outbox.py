@@ -0,0 +1,256 @@
+import asyncio
+import contextlib
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterable, Awaitable, Callable, Optional
+
+from aiogram.exceptions import (TelegramRetryAfter, TelegramForbiddenError, TelegramBadRequest,
+                                TelegramNotFound, TelegramNetworkError, TelegramServerError)
+
+from db.data_access import OutboxActions, UserActions
+from db.subscriptions import subscription_index
+from telegram_bot.outgoing import OutgoingScheduler, BROADCAST
+
+log = logging.getLogger(__name__)
+
+# пауза перед повтором после сетевой ошибки / 5xx: RETRY_BASE_SEC * 2**attempts
+RETRY_BASE_SEC = 5.0
+# получателей на одну транзакцию при записи рассылки (список chat_id режется на пачки)
+ENQUEUE_BATCH = 1000
+
+# ответы Telegram, после которых писать в чат бессмысленно
+_UNREACHABLE_MARKERS = (
+    "chat not found",
+    "user is deactivated",
+    "bot was blocked",
+    "bot was kicked",
+    "peer_id_invalid",
+    "have no rights to send",
+)
+
+def classify_error(e: Exception) -> str:
+    """
+    retry       - временная проблема (сеть, 5xx): доставка остаётся pending, попытка тратится
+                  (429 разбирает _deliver: это не ошибка сообщения, попытка не тратится)
+    unreachable - чат недоступен навсегда: получатель отключается
+    failed      - прочие ошибки конкретного сообщения
+    """
+    if isinstance(e, (TelegramNetworkError, TelegramServerError)):
+        return "retry"
+    if isinstance(e, TelegramForbiddenError):
+        return "unreachable"
+    if isinstance(e, (TelegramBadRequest, TelegramNotFound)):
+        text = str(e).lower()
+        if any(m in text for m in _UNREACHABLE_MARKERS):
+            return "unreachable"
+    return "failed"
+
+class OutboxWorker:
+    """
+    Разбирает outbox рассылок (db: notification_jobs / notification_deliveries).
+    - один цикл выбирает pending-доставки пачками по batch_size,
+    - workers корутин отправляют их через полосу broadcast планировщика исходящих
+      (её бюджет - темп рассылок; сообщения админа идут вне очереди),
+    - статусы пишутся одним пакетным UPDATE на пачку.
+    Рассылка записывается пачками получателей, каждая в своей транзакции, и цикл
+    будит каждая пачка: первое сообщение уходит, не дожидаясь записи всех получателей.
+    После рестарта цикл продолжает с первой pending-доставки; повтор возможен
+    только для пачки, которая была в полёте в момент падения. Рассылка, запись которой
+    прервал рестарт, доставляется уже записанным получателям.
+    429 откладывает доставку на retry_after и попытку не тратит; сетевые ошибки
+    и 5xx тратят попытку и откладывают доставку с экспоненциальной паузой.
+    Недоступные чаты (бот заблокирован, чат удалён) отключаются в Users
+    одним UPDATE на пачку и убираются из индекса подписок.
+    """
+    def __init__(self, outgoing: OutgoingScheduler, *,
+                 workers: int = 4,
+                 batch_size: int = 200,
+                 max_attempts: int = 3,
+                 idle_poll_sec: float = 30.0,
+                 on_job_done: Optional[Callable[[dict], Awaitable[None]]] = None):
+        self._outgoing = outgoing
+        self._workers = max(1, workers)
+        self._batch_size = batch_size
+        self._max_attempts = max_attempts
+        self._idle_poll_sec = idle_poll_sec
+        self.actions = OutboxActions()
+        self.user_actions = UserActions()
+        self._on_job_done = on_job_done  # async (progress: dict), когда рассылка завершена
+        self.pruned_total = 0            # сколько получателей отключено с момента старта
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._sealed = asyncio.Event()  # прерванные рестартом рассылки закрыты, можно писать новые
+        self._generation = 0  # растёт с каждой новой рассылкой
+
+    # ---- публичные методы ----
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._start())
+            self._task.add_done_callback(self._on_task_done)
+
+    @staticmethod
+    def _on_task_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            log.error("outbox worker stopped", exc_info=task.exception())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    async def enqueue(self, text: str,
+                      chat_ids: list[int] | AsyncIterable[list[int]],
+                      city: str | None = None) -> int:
+        """Записать рассылку в outbox пачками, будя цикл доставки после каждой. Возвращает job_id."""
+        if self._task is not None:
+            # иначе seal_interrupted примет эту рассылку за прерванную рестартом
+            await self._sealed.wait()
+        job_id = await self.actions.create_job(text=text, city=city)
+        total = 0
+        try:
+            if isinstance(chat_ids, list):
+                for i in range(0, len(chat_ids), ENQUEUE_BATCH):
+                    total += await self.actions.add_deliveries(job_id, chat_ids[i:i + ENQUEUE_BATCH])
+                    self._kick()
+            else:
+                async for chunk in chat_ids:
+                    total += await self.actions.add_deliveries(job_id, chunk)
+                    self._kick()
+        finally:
+            # и при ошибке источника получателей: записанным рассылка всё равно доставится
+            await self.actions.seal_job(job_id, total)
+            self._kick()
+        return job_id
+
+    def _kick(self):
+        self._generation += 1
+        self._idle.clear()
+        self._wake.set()
+
+    async def wait_idle(self):
+        """Дождаться, пока в outbox не останется pending-доставок."""
+        await self._idle.wait()
+
+    async def progress(self, limit: int = 5) -> list[dict]:
+        return await self.actions.progress(limit=limit)
+
+    # ---- цикл доставки ----
+    async def _start(self):
+        try:
+            ids = await self.actions.seal_interrupted()
+            if ids:
+                log.warning("outbox: jobs interrupted while being written, delivering to recorded recipients",
+                            extra={"job_ids": ids})
+        except Exception:
+            log.warning("outbox: seal_interrupted failed", exc_info=True)
+        finally:
+            self._sealed.set()
+        await self._run()
+
+    async def _run(self):
+        while True:
+            generation = self._generation
+            try:
+                batch = await self.actions.next_batch(self._batch_size)
+            except Exception:
+                # БД недоступна - пробуем позже
+                log.warning("outbox: next_batch failed", exc_info=True)
+                await asyncio.sleep(5)
+                continue
+
+            if not batch:
+                with contextlib.suppress(Exception):
+                    await self._finish_jobs()
+                if generation != self._generation:
+                    # пока читали, добавилась рассылка - пустой ответ уже устарел
+                    continue
+                timeout = self._idle_poll_sec
+                retry_at = None
+                with contextlib.suppress(Exception):
+                    retry_at = await self.actions.next_retry_at()
+                if retry_at is None:
+                    self._idle.set()
+                else:
+                    # есть отложенные доставки - просыпаемся к ближайшему повтору
+                    if retry_at.tzinfo is None:
+                        retry_at = retry_at.replace(tzinfo=timezone.utc)
+                    wait = (retry_at - datetime.now(timezone.utc)).total_seconds()
+                    timeout = min(timeout, max(0.1, wait))
+                self._wake.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=timeout)
+                continue
+
+            try:
+                await self._process(batch)
+            except Exception:
+                # не смогли записать статусы - пачка останется pending и будет выбрана снова
+                log.warning("outbox: batch processing failed", exc_info=True)
+                await asyncio.sleep(5)
+
+    async def _process(self, batch: list[tuple[int, int, int, str, int]]):
+        q: asyncio.Queue = asyncio.Queue()
+        for item in batch:
+            q.put_nowait(item)
+
+        sent: list[int] = []
+        failed: dict[str, list[int]] = {}
+        unreachable: dict[str, list[int]] = {}
+        unreachable_chats: list[int] = []
+        retry: list[tuple[int, float]] = []
+        throttled: list[tuple[int, float]] = []
+
+        async def worker():
+            while True:
+                try:
+                    delivery_id, _, chat_id, text, attempts = q.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                status, error, retry_after = await self._deliver(chat_id, text)
+                if status == "retry" and attempts + 1 >= self._max_attempts:
+                    status = "failed"
+                if status == "sent":
+                    sent.append(delivery_id)
+                elif status == "throttled":
+                    throttled.append((delivery_id, retry_after))
+                elif status == "retry":
+                    retry.append((delivery_id, RETRY_BASE_SEC * 2 ** attempts))
+                elif status == "unreachable":
+                    unreachable.setdefault(error, []).append(delivery_id)
+                    unreachable_chats.append(chat_id)
+                else:
+                    failed.setdefault(error, []).append(delivery_id)
+
+        await asyncio.gather(*(worker() for _ in range(self._workers)))
+        await self.actions.mark_batch(sent=sent, failed=failed, unreachable=unreachable,
+                                      retry=retry, throttled=throttled)
+        log.info("outbox batch delivered", extra={
+            "sent": len(sent), "retry": len(retry), "throttled": len(throttled),
+            "failed": sum(map(len, failed.values())), "unreachable": len(unreachable_chats),
+        })
+        if unreachable_chats:
+            self.pruned_total += await self.user_actions.deactivate_chat_ids(unreachable_chats)
+            subscription_index.remove_many(unreachable_chats)
+
+    async def _finish_jobs(self):
+        job_ids = await self.actions.finish_jobs()
+        if not job_ids or not self._on_job_done:
+            return
+        for progress in await self.actions.progress(job_ids=job_ids):
+            with contextlib.suppress(Exception):
+                await self._on_job_done(progress)
+
+    async def _deliver(self, chat_id: int, text: str) -> tuple[str, str, float]:
+        """(статус, ошибка, retry_after) для одной доставки."""
+        try:
+            await self._outgoing.send(BROADCAST, chat_id, text)
+            return "sent", "", 0.0
+        except TelegramRetryAfter as e:
+            # планировщик уже притормозил все полосы; доставку отложим на retry_after
+            return "throttled", "retry_after", float(e.retry_after)
+        except Exception as e:
+            return classify_error(e), f"{type(e).__name__}: {e}", 0.0
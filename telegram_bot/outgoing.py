@@ -0,0 +1,171 @@
+import asyncio
+import contextlib
+import logging
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# общий темп всех исходящих сообщений бота (лимит Telegram ~30/с на бота)
+OUT_RATE_PER_SEC = float(os.getenv("OUT_RATE_PER_SEC", "28"))
+# бюджеты полос, сообщений в секунду (0 - только общий темп)
+OUT_BROADCAST_RATE = float(os.getenv("OUT_BROADCAST_RATE", os.getenv("OUTBOX_RATE_PER_SEC", "25")))
+OUT_ADMIN_INFO_RATE = float(os.getenv("OUT_ADMIN_INFO_RATE", "1"))  # в один чат Telegram пускает ~1/с
+
+ADMIN_CRITICAL = "admin_critical"
+ADMIN_INFO = "admin_info"
+BROADCAST = "broadcast"
+
+@dataclass
+class Lane:
+    """Полоса исходящих: свой бюджет (token bucket) и очередь ожидающих в порядке прихода."""
+    name: str
+    priority: int               # меньше - раньше
+    rate: float = 0.0           # сообщений в секунду, 0 - без своего лимита
+    burst: float = 1.0          # сколько можно отправить подряд из накопленного бюджета
+    retries: int = 0            # сколько раз повторить после 429 (рассылки повторяет outbox)
+    global_backoff: bool = True # 429 тормозит все полосы (лимит бота); False - только эту (лимит одного чата)
+    waiters: deque = field(default_factory=deque)
+    tokens: float = 0.0
+    updated: float = 0.0
+    sent: int = 0
+    paused_until: float = 0.0
+
+    def refill(self, now: float):
+        if self.rate > 0:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def ready_in(self, now: float) -> float:
+        """Через сколько секунд у полосы будет бюджет на одно сообщение."""
+        paused = max(0.0, self.paused_until - now)
+        if self.rate <= 0 or self.tokens >= 1:
+            return paused
+        return max(paused, (1 - self.tokens) / self.rate)
+
+def default_lanes() -> list[Lane]:
+    return [
+        # админские полосы пишут в один чат: их 429 - лимит этого чата, рассылку он не тормозит
+        Lane(ADMIN_CRITICAL, priority=0, retries=3, global_backoff=False),
+        Lane(ADMIN_INFO, priority=1, rate=OUT_ADMIN_INFO_RATE, burst=1, retries=1, global_backoff=False),
+        Lane(BROADCAST, priority=2, rate=OUT_BROADCAST_RATE, burst=max(1.0, OUT_BROADCAST_RATE)),
+    ]
+
+class OutgoingScheduler:
+    """
+    Единая точка отправки сообщений бота с полосами приоритета.
+    Каждое сообщение ждёт своей очереди: диспетчер выдаёт разрешения с общим темпом
+    rate_per_sec, каждый раз - самой приоритетной полосе, у которой есть ожидающие
+    и бюджет. Поэтому событие админа (капча, new_tab) обгоняет рассылку на 10k
+    получателей и ждёт не дольше одного интервала общего темпа.
+    429 (RetryAfter) в рассылке тормозит все полосы, в админской полосе - только её
+    (это лимит одного чата); админские полосы повторяют отправку сами.
+    """
+    def __init__(self, bot: Bot, *, rate_per_sec: float = OUT_RATE_PER_SEC, lanes: Optional[list[Lane]] = None):
+        self.bot = bot
+        self._interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._lanes = sorted(lanes or default_lanes(), key=lambda l: l.priority)
+        self._by_name = {l.name: l for l in self._lanes}
+        self._next_at = 0.0  # раньше этого момента (loop.time) не выдаём разрешений
+        self._wake = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    # ---- публичные методы ----
+    async def send(self, lane: str, chat_id: int, text: str, **kwargs):
+        """send_message через полосу lane. Ошибки Telegram пробрасываются вызывающему."""
+        return await self.call(lane, self.bot.send_message, chat_id, text, **kwargs)
+
+    async def call(self, lane: str, method, *args, **kwargs):
+        """Любой метод Bot API (edit_message_text и т.п.) в очереди полосы lane."""
+        l = self._by_name[lane]
+        attempt = 0
+        while True:
+            await self._acquire(l)
+            try:
+                result = await method(*args, **kwargs)
+                l.sent += 1
+                return result
+            except TelegramRetryAfter as e:
+                self.backoff(e.retry_after, None if l.global_backoff else lane)
+                if attempt >= l.retries:
+                    raise
+                attempt += 1
+                log.info("outgoing retry after 429", extra={"lane": lane, "retry_after": e.retry_after})
+
+    def backoff(self, seconds: float, lane: Optional[str] = None):
+        """После 429 не отправлять seconds секунд: во всех полосах или только в lane."""
+        until = asyncio.get_running_loop().time() + seconds
+        if lane is None:
+            self._next_at = max(self._next_at, until)
+        else:
+            l = self._by_name[lane]
+            l.paused_until = max(l.paused_until, until)
+
+    def stats(self) -> dict[str, dict]:
+        return {l.name: {"waiting": len(l.waiters), "sent": l.sent} for l in self._lanes}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        for l in self._lanes:
+            while l.waiters:
+                fut = l.waiters.popleft()
+                if not fut.done():
+                    fut.cancel()
+
+    # ---- диспетчер ----
+    async def _acquire(self, lane: Lane):
+        self.start()  # ленивый запуск: отправка возможна и до bot.main (бенчмарки, тесты)
+        fut = asyncio.get_running_loop().create_future()
+        lane.waiters.append(fut)
+        self._wake.set()
+        await fut
+
+    def _pick(self, now: float) -> tuple[Optional[Lane], Optional[float]]:
+        """(полоса для следующего разрешения, None) или (None, сколько ждать бюджета / None - ждать некого)."""
+        wait = None
+        for l in self._lanes:
+            while l.waiters and l.waiters[0].done():
+                l.waiters.popleft()  # вызывающий отменил ожидание
+            if not l.waiters:
+                continue
+            l.refill(now)
+            ready_in = l.ready_in(now)
+            if ready_in <= 0:
+                return l, None
+            wait = ready_in if wait is None else min(wait, ready_in)
+        return None, wait
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            if self._next_at > now:
+                await asyncio.sleep(self._next_at - now)
+                continue
+            lane, wait = self._pick(now)
+            if lane is None:
+                self._wake.clear()
+                # ждём нового отправителя или пополнения бюджета
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), timeout=wait)
+                continue
+            if lane.rate > 0:
+                lane.tokens -= 1
+            self._next_at = now + self._interval
+            lane.waiters.popleft().set_result(None)
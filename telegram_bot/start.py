@@ -1,7 +1,7 @@
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 
 def make_start_kb(is_admin: bool = False) -> ReplyKeyboardMarkup:
-    rows = [[KeyboardButton(text="📝 Регистрация")]]
+    rows = [[KeyboardButton(text="📝 Регистрация"), KeyboardButton(text="🏙️ Города")]]
     if is_admin:
         rows.append([KeyboardButton(text="🛡️ Регистрация (админ)"), KeyboardButton(text="Админ")])
     return ReplyKeyboardMarkup(keyboard=rows, resize_keyboard=True)
\ No newline at end of file
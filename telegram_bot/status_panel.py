@@ -0,0 +1,184 @@
+import asyncio
+import contextlib
+import logging
+import time
+from datetime import datetime
+from typing import Callable, Optional
+
+from aiogram.exceptions import TelegramBadRequest
+
+from db.data_access import StateActions
+from telegram_bot.outgoing import OutgoingScheduler, ADMIN_INFO
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# панель статуса в чате админа: не чаще раза в STATUS_PANEL_SEC секунд, 0 - выключена
+STATUS_PANEL_SEC = int(os.getenv("STATUS_PANEL_SEC", "0"))
+STATE_KEY = "status_panel"
+MAX_TEXT = 4000  # лимит Telegram - 4096 символов
+
+STEP_NAMES = {
+    "start": "запуск",
+    "open": "открытие сайта",
+    "login_form": "форма входа",
+    "login": "вход",
+    "start_new_booking": "новая запись",
+    "appointment_details": "выбор города",
+    "check_slots": "проверка слотов",
+}
+
+def _hm(ts: Optional[float]) -> str:
+    # абсолютное время, а не "N с назад": пока состояние не меняется, не меняется и текст панели
+    return datetime.fromtimestamp(ts).strftime("%H:%M") if ts else "-"
+
+def render(status: dict) -> str:
+    """Текст панели по Controller.status()."""
+    lines = [("▶️ Работает" if status["running"] else "⏹ Остановлен")
+             + f" · профиль {status['profile'] or 'default'}"
+             + (f" · сводка {status['digest_interval']} с" if status["digest_interval"] else "")]
+    if status.get("next_run_at"):
+        lines.append(f"Следующий тик: {status['next_run_at']:%H:%M:%S}")
+
+    bot = status.get("bot")
+    if not bot:
+        lines.append("Браузер: не запущен")
+    else:
+        if bot["command"]:
+            step = STEP_NAMES.get(bot["step"], bot["step"] or "-")
+            lines.append(f"Браузер: {bot['command']} {bot['city'] or ''} — {step} (с {_hm(bot.get('step_at'))})")
+        else:
+            lines.append("Браузер: свободен" if bot["alive"] else "Браузер: поток остановлен")
+        lines.append(f"Очередь команд: {bot['queue']} · сессия с {_hm(bot.get('session_started'))}")
+
+    for p in status.get("parked") or []:
+        lines.append(f"⏸ {p['park_id']}: {p['kind']} ({p.get('city') or '-'}), ждёт с {_hm(p['parked_at'])}, "
+                     f"закроется в {_hm(p['deadline'])} — /continue {p['park_id']}")
+
+    results = status.get("last_results") or {}
+    if results:
+        lines.append("")
+        lines.append("Последние прогоны:")
+        slots = status.get("slots") or {}
+        for city, r in sorted(results.items()):
+            mark = "✅" if r["ok"] else "▫️"
+            extra = f", слотов {slots[city]}" if slots.get(city) else ""
+            lines.append(f"{mark} {city}: {r['message'][:60]}{extra} ({_hm(r['at'])})")
+
+    lines.append("")
+    lines.append(f"Обновлено {datetime.now():%H:%M:%S}")
+    text = "\n".join(lines)
+    return text if len(text) <= MAX_TEXT else text[:MAX_TEXT - 1] + "…"
+
+class StatusPanel:
+    """
+    Одно закреплённое сообщение в чате админа, которое обновляется на месте
+    (edit_message_text) не чаще раза в interval_sec и только при изменении текста.
+    Рутинные события планировщика админу тогда не шлются - они видны в панели,
+    поэтому число запросов к API ограничено сверху, а не растёт с числом прогонов.
+    id сообщения хранится в runtime_state: после рестарта (или на новой ведущей
+    реплике) обновляется то же сообщение.
+    """
+    def __init__(self, outgoing: OutgoingScheduler, chat_id: int,
+                 source: Callable[[], dict], interval_sec: int = STATUS_PANEL_SEC):
+        self._outgoing = outgoing
+        self._chat_id = chat_id
+        self._source = source
+        self.interval_sec = interval_sec
+        self.state_actions = StateActions()
+        self._message_id: Optional[int] = None
+        self._last_text: Optional[str] = None
+        self._last_edit = 0.0
+        self._poke = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_sec > 0 and bool(self._chat_id)
+
+    # ---- жизненный цикл ----
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        with contextlib.suppress(Exception):
+            state = await self.state_actions.get(STATE_KEY) or {}
+            if state.get("chat_id") == self._chat_id:
+                self._message_id = state.get("message_id")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+
+    def poke(self):
+        """Что-то изменилось - обновить панель при ближайшей возможности (с учётом интервала)."""
+        self._poke.set()
+
+    async def recreate(self) -> bool:
+        """Команда /panel: новая панель внизу чата (старая откреплена)."""
+        if not self.enabled:
+            return False
+        old = self._message_id
+        await self._send_new(render(self._source()))
+        if old:
+            with contextlib.suppress(Exception):
+                await self._outgoing.call(ADMIN_INFO, self._outgoing.bot.unpin_chat_message,
+                                          chat_id=self._chat_id, message_id=old)
+        return True
+
+    # ---- обновление ----
+    async def _run(self):
+        while True:
+            try:
+                await self.update()
+            except Exception:
+                log.warning("status panel update failed", exc_info=True)
+            self._poke.clear()
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._poke.wait(), timeout=self.interval_sec)
+            # не чаще раза в interval_sec, даже если события идут потоком
+            delay = self._last_edit + self.interval_sec - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def update(self):
+        text = render(self._source())
+        if self._message_id is None:
+            await self._send_new(text)
+            return
+        # строка "Обновлено" меняется всегда - сравниваем без неё
+        if self._last_text is not None and _body(text) == _body(self._last_text):
+            return
+        try:
+            await self._outgoing.call(ADMIN_INFO, self._outgoing.bot.edit_message_text,
+                                      text=text, chat_id=self._chat_id, message_id=self._message_id)
+        except TelegramBadRequest as e:
+            msg = str(e).lower()
+            if "not modified" in msg:
+                pass
+            elif "not found" in msg or "can't be edited" in msg:
+                # панель удалили - создаём заново
+                await self._send_new(text)
+                return
+            else:
+                raise
+        self._last_text, self._last_edit = text, time.monotonic()
+
+    async def _send_new(self, text: str):
+        m = await self._outgoing.send(ADMIN_INFO, self._chat_id, text, disable_notification=True)
+        self._message_id = m.message_id
+        self._last_text, self._last_edit = text, time.monotonic()
+        with contextlib.suppress(Exception):
+            await self._outgoing.call(ADMIN_INFO, self._outgoing.bot.pin_chat_message, chat_id=self._chat_id,
+                                      message_id=m.message_id, disable_notification=True)
+        await self.state_actions.set(STATE_KEY, {"chat_id": self._chat_id, "message_id": m.message_id})
+        log.info("status panel created", extra={"message_id": m.message_id})
+
+def _body(text: str) -> str:
+    return text.rsplit("\n", 1)[0]
@@ -7,21 +7,54 @@ from aiogram.types import (ReplyKeyboardMarkup, KeyboardButton,
                            InlineKeyboardMarkup, InlineKeyboardButton,
                            ReplyKeyboardRemove)
 from telegram_bot.start import make_start_kb
-from db.data_access import UserActions
+from db.data_access import UserActions, SubscriptionActions
+from db.subscriptions import subscription_index
+from app_config import config
+
+AGREEMENT_FALLBACK = ("Соглашение об обработке персональных данных:\n\n"
+                      "Нажимая «Согласен», вы подтверждаете согласие на обработку ваших персональных данных "
+                      "в объёме, необходимом для работы бота.")
+
+# выбор городов пользователем
+class UserCities(StatesGroup):
+    choose = State()
 
 # регистрация для пользователя
 def create_user_registration_router(agreement_path: str) -> Router:
+    """
+    Города (ALLOWED_CITIES) и текст соглашения берутся из app_config при каждом обращении:
+    они перечитываются при изменении файлов, обработчики диск не трогают.
+    """
     router = Router()
+    config.add_resource(agreement_path)
+
+    def _cities() -> list[str]:
+        return list(config.current.allowed_cities)
+
+    def _cities_kb(selected: list[str]) -> InlineKeyboardMarkup:
+        # в callback_data индекс города - чтобы уложиться в 64 байта
+        rows = [[InlineKeyboardButton(
+            text=("✅ " if c in selected else "▫️ ") + c,
+            callback_data=f"ucity:t:{i}",
+        )] for i, c in enumerate(_cities())]
+        rows.append([
+            InlineKeyboardButton(text="🌐 Все города", callback_data="ucity:all"),
+            InlineKeyboardButton(text="💾 Сохранить", callback_data="ucity:done"),
+        ])
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    async def _ask_cities(message: types.Message, chat_id: int, state: FSMContext):
+        current = [c for c in await SubscriptionActions().get_cities(chat_id=chat_id) if c in _cities()]
+        await state.set_state(UserCities.choose)
+        await state.update_data(cities=current)
+        await message.answer(
+            "Выберите города, по которым присылать уведомления.\n"
+            "Если ничего не выбрать — будут приходить уведомления по всем городам.",
+            reply_markup=_cities_kb(current),
+        )
 
     def _load_agreement() -> str:
-        try:
-            with open(agreement_path, "r", encoding="utf-8") as f:
-                text = f.read().strip()
-            return text
-        except Exception:
-            return ("Соглашение об обработке персональных данных:\n\n"
-                    "Нажимая «Согласен», вы подтверждаете согласие на обработку ваших персональных данных "
-                    "в объёме, необходимом для работы бота.")
+        return (config.text(agreement_path) or "").strip() or AGREEMENT_FALLBACK
 
     @router.message(F.text.in_(["📝 Регистрация", "Регистрация", "/register"]))
     async def user_registration_start(m: types.Message):
@@ -45,7 +78,7 @@ def create_user_registration_router(agreement_path: str) -> Router:
         await q.answer()
 
     @router.callback_query(F.data == "ureg:agree")
-    async def user_registration_confirm(q: types.CallbackQuery):
+    async def user_registration_confirm(q: types.CallbackQuery, state: FSMContext):
         if not q.from_user.username:
             with suppress(Exception):
                 await q.message.edit_reply_markup(reply_markup=None)
@@ -76,6 +109,51 @@ def create_user_registration_router(agreement_path: str) -> Router:
         await q.message.answer("Готово. Когда появятся окна для записи - вам придет уведомление.", reply_markup=make_start_kb())
         await q.answer()
 
+        # индекс подписок: до выбора городов - уведомления по всем (или по ранее сохранённым)
+        await subscription_index.update_user(user.chat_id, await SubscriptionActions().get_cities(chat_id=user.chat_id))
+        if _cities():
+            await _ask_cities(q.message, q.from_user.id, state)
+
+    @router.message(F.text.in_(["🏙️ Города", "/cities"]))
+    async def user_cities_start(m: types.Message, state: FSMContext):
+        if not _cities():
+            return await m.answer("Список городов не настроен.")
+        await _ask_cities(m, m.from_user.id, state)
+
+    @router.callback_query(UserCities.choose, F.data.startswith("ucity:t:"))
+    async def user_cities_toggle(q: types.CallbackQuery, state: FSMContext):
+        try:
+            city = _cities()[int(q.data.rsplit(":", 1)[1])]
+        except (ValueError, IndexError):
+            return await q.answer()
+        selected = list((await state.get_data()).get("cities", []))
+        if city in selected:
+            selected.remove(city)
+        else:
+            selected.append(city)
+        await state.update_data(cities=selected)
+        with suppress(Exception):
+            await q.message.edit_reply_markup(reply_markup=_cities_kb(selected))
+        await q.answer()
+
+    @router.callback_query(UserCities.choose, F.data.in_(["ucity:all", "ucity:done"]))
+    async def user_cities_save(q: types.CallbackQuery, state: FSMContext):
+        selected = [] if q.data == "ucity:all" else list((await state.get_data()).get("cities", []))
+        try:
+            saved = await SubscriptionActions().set_cities(chat_id=q.from_user.id, cities=selected)
+        except ValueError as e:
+            await state.clear()
+            await q.message.answer(f"❌ {e}")
+            return await q.answer()
+
+        await subscription_index.update_user(q.from_user.id, saved)
+        await state.clear()
+        with suppress(Exception):
+            await q.message.edit_reply_markup(reply_markup=None)
+        text = ("Города: " + ", ".join(saved)) if saved else "Уведомления будут приходить по всем городам."
+        await q.message.answer(f"✅ Сохранено. {text}\nИзменить: /cities", reply_markup=make_start_kb())
+        await q.answer()
+
     return router
 
 # регистрация для админа
@@ -0,0 +1,129 @@
+import asyncio
+import csv
+import itertools
+import logging
+from typing import Optional
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from db.data_access import UserActions, SubscriptionActions
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# строк на один многострочный upsert при импорте
+USER_IMPORT_BATCH = int(os.getenv("USER_IMPORT_BATCH", "1000"))
+
+# колонки CSV: города через ";" (пусто - все города), is_active - 1/0
+USER_CSV_FIELDS = ["chat_id", "telegram_username", "cities", "is_active"]
+CITY_SEP = ";"
+# границы колонок Users: chat_id - BIGINT, telegram_username - String(64)
+CHAT_ID_MIN, CHAT_ID_MAX = -2**63, 2**63 - 1
+USERNAME_MAX = 64
+MAX_ERRORS = 5
+
+_FALSE = {"0", "false", "no", "нет", "f", "n"}
+
+def _parse_row(row: dict, allowed_cities: list[str]) -> tuple[dict, Optional[list[str]]]:
+    """Строка CSV -> (параметры upsert, города или None - колонки нет). Ошибка - ValueError."""
+    try:
+        chat_id = int((row.get("chat_id") or "").strip())
+    except ValueError:
+        raise ValueError(f"chat_id '{row.get('chat_id')}' - не число")
+    if not CHAT_ID_MIN <= chat_id <= CHAT_ID_MAX:
+        raise ValueError(f"chat_id {chat_id} вне диапазона BIGINT")
+    username = (row.get("telegram_username") or "").strip().lstrip("@")
+    if len(username) > USERNAME_MAX:
+        raise ValueError(f"telegram_username длиннее {USERNAME_MAX} символов")
+    is_active = (row.get("is_active") or "1").strip().lower() not in _FALSE
+    cities = None
+    if row.get("cities") is not None:
+        cities = list(dict.fromkeys(c.strip() for c in row["cities"].split(CITY_SEP) if c.strip()))
+        bad = [c for c in cities if allowed_cities and c not in allowed_cities]
+        if bad:
+            raise ValueError(f"города не из ALLOWED_CITIES: {', '.join(bad)}")
+    return {"chat_id": chat_id, "telegram_username": username, "is_active": is_active}, cities
+
+async def import_users(path: str, allowed_cities: list[str], batch_size: int = USER_IMPORT_BATCH) -> dict:
+    """
+    Импорт подписчиков из CSV (USER_CSV_FIELDS, обязателен только chat_id).
+    Файл читается пачками в отдельном потоке; каждая пачка - один многострочный upsert
+    по chat_id и одна замена городов, в своей транзакции. Повторный импорт того же файла безопасен.
+    Ошибка БД в пачке пропускает только её (попадает в errors), импорт продолжается.
+    Возвращает {"rows", "imported", "skipped", "errors": [первые ошибки]}.
+    """
+    users, subs = UserActions(), SubscriptionActions()
+    stats = {"rows": 0, "imported": 0, "skipped": 0, "errors": []}
+    f = await asyncio.to_thread(open, path, "r", encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.DictReader(f)
+        fieldnames = await asyncio.to_thread(lambda: reader.fieldnames)  # читает заголовок
+        if not fieldnames or "chat_id" not in fieldnames:
+            raise ValueError(f"нет колонки chat_id (ожидаются {', '.join(USER_CSV_FIELDS)})")
+        line = 1
+        while True:
+            chunk = await asyncio.to_thread(list, itertools.islice(reader, batch_size))
+            if not chunk:
+                break
+            # дубли chat_id внутри пачки: побеждает последняя строка
+            rows, cities_by_chat = {}, {}
+            for row in chunk:
+                line += 1
+                try:
+                    params, cities = _parse_row(row, allowed_cities)
+                except ValueError as e:
+                    stats["skipped"] += 1
+                    _add_error(stats, f"строка {line}: {e}")
+                    continue
+                rows[params["chat_id"]] = params
+                if cities is not None:
+                    cities_by_chat[params["chat_id"]] = cities
+            stats["rows"] += len(chunk)
+            lines = f"строки {line - len(chunk) + 1}-{line}"
+
+            try:
+                ids = await users.upsert_subscribers(list(rows.values()))
+            except SQLAlchemyError as e:
+                log.warning("users import batch failed", extra={"lines": lines}, exc_info=True)
+                stats["skipped"] += len(rows)
+                _add_error(stats, f"{lines}: ошибка БД, пачка пропущена ({_db_error(e)})")
+                continue
+            stats["imported"] += len(ids)
+            try:
+                await subs.replace_many({uid: cities_by_chat[cid] for uid, cid in ids if cid in cities_by_chat})
+            except SQLAlchemyError as e:
+                log.warning("users import cities failed", extra={"lines": lines}, exc_info=True)
+                _add_error(stats, f"{lines}: подписчики записаны, города не обновлены ({_db_error(e)})")
+    finally:
+        await asyncio.to_thread(f.close)
+    log.info("users imported", extra={k: v for k, v in stats.items() if k != "errors"})
+    return stats
+
+def _add_error(stats: dict, error: str):
+    if len(stats["errors"]) < MAX_ERRORS:
+        stats["errors"].append(error)
+
+def _db_error(e: SQLAlchemyError) -> str:
+    # текст исходной ошибки драйвера без SQL и параметров пачки
+    orig = getattr(e, "orig", None) or e
+    return f"{type(orig).__name__}: {str(orig).splitlines()[0][:200]}"
+
+async def export_users(path: str) -> int:
+    """Выгрузить подписчиков в CSV (USER_CSV_FIELDS) потоково. Возвращает число строк."""
+    total = 0
+    f = await asyncio.to_thread(open, path, "w", encoding="utf-8", newline="")
+    try:
+        writer = csv.writer(f)
+        writer.writerow(USER_CSV_FIELDS)
+        async for chunk in UserActions().iter_subscribers():
+            rows = [(chat_id, username, CITY_SEP.join(cities), int(is_active))
+                    for chat_id, username, is_active, cities in chunk]
+            await asyncio.to_thread(writer.writerows, rows)
+            total += len(rows)
+    finally:
+        await asyncio.to_thread(f.close)
+    log.info("users exported", extra={"rows": total})
+    return total
@@ -0,0 +1,144 @@
+import asyncio
+import contextlib
+import logging
+import time
+from collections import Counter
+from typing import Awaitable, Callable, Optional
+
+log = logging.getLogger(__name__)
+
+# события, которые требуют действий админа — всегда уходят сразу (и в срочную полосу исходящих)
+URGENT_TYPES = {"captcha", "new_tab", "park_expired", "restore"}
+
+class AdminDigest:
+    """
+    Обёртка над send_admin_event с тем же интерфейсом async (event: dict).
+    Срочные события (URGENT_TYPES, найденные слоты) отправляются сразу,
+    рутинные (результаты планировщика, "нет слотов", ошибки прогонов)
+    копятся и раз в interval_sec уходят одной сводкой.
+    interval_sec <= 0 — режим выключен, всё отправляется как раньше.
+    """
+    def __init__(self, send_coro: Callable[[dict], Awaitable[None]], interval_sec: int = 0):
+        self._send = send_coro
+        self.interval_sec = interval_sec
+        self._task: Optional[asyncio.Task] = None
+        self._reset()
+
+    def _reset(self):
+        self._since = time.time()
+        self._events = 0
+        self._by_city: dict[str, Counter] = {}
+        self._errors: Counter = Counter()
+        self._other: Counter = Counter()
+        self._pruned = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval_sec > 0
+
+    @staticmethod
+    def is_urgent(event: dict) -> bool:
+        if event.get("type") in URGENT_TYPES:
+            return True
+        # новые слоты админу важнее сводки (повтор уже известных - рутина)
+        result = event.get("result") or {}
+        if "new_slots" in result:
+            return bool(result["new_slots"])
+        return bool(result.get("ok"))
+
+    async def __call__(self, event: dict):
+        if not self.enabled or self.is_urgent(event):
+            await self._send(event)
+            return
+        self._add(event)
+
+    def _add(self, event: dict):
+        self._events += 1
+        t = event.get("type", "event")
+        self._pruned += int(event.get("pruned") or 0)
+        if t != "scheduler":
+            self._other[t] += 1
+            return
+
+        city = event.get("city") or "-"
+        result = event.get("result") or {}
+        c = self._by_city.setdefault(city, Counter())
+        if result.get("error"):
+            c["error"] += 1
+            self._errors[str(result["error"])[:200]] += 1
+        elif "no" in str(result.get("message", "")).lower() and "slots" in str(result.get("message", "")).lower():
+            c["no_slots"] += 1
+        else:
+            c[str(result.get("message") or "other")[:60]] += 1
+
+    def render(self) -> str:
+        minutes = max(1, round((time.time() - self._since) / 60))
+        lines = [f"Сводка за {minutes} мин, событий: {self._events}"]
+        for city, c in sorted(self._by_city.items()):
+            parts = ", ".join(f"{k}: {v}" for k, v in c.most_common())
+            lines.append(f"• {city} — {parts}")
+        if self._pruned:
+            lines.append(f"Отключено недоступных получателей: {self._pruned}")
+        if self._other:
+            lines.append("Прочее: " + ", ".join(f"{k}: {v}" for k, v in self._other.most_common()))
+        if self._errors:
+            lines.append("Ошибки:")
+            for err, n in self._errors.most_common(5):
+                lines.append(f"  {n}× {err}")
+        return "\n".join(lines)
+
+    async def flush(self):
+        """Отправить накопленное одной сводкой (если есть что отправлять)."""
+        if not self._events:
+            return
+        text = self.render()
+        # события, пришедшие во время отправки, копятся уже в следующую сводку
+        sent = self._take()
+        try:
+            await self._send({"type": "digest", "message": text})
+        except Exception:
+            # не отправилось - накопленное возвращается и уйдёт следующей сводкой
+            self._merge(sent)
+            raise
+
+    def _take(self) -> dict:
+        state = {k: getattr(self, k) for k in ("_since", "_events", "_by_city", "_errors", "_other", "_pruned")}
+        self._reset()
+        return state
+
+    def _merge(self, state: dict):
+        self._since = min(self._since, state["_since"])
+        self._events += state["_events"]
+        self._pruned += state["_pruned"]
+        self._errors.update(state["_errors"])
+        self._other.update(state["_other"])
+        for city, c in state["_by_city"].items():
+            self._by_city.setdefault(city, Counter()).update(c)
+
+    # ---- периодическая отправка ----
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self, flush: bool = True):
+        if self._task:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if flush:
+            with contextlib.suppress(Exception):
+                await self.flush()
+
+    def set_interval(self, interval_sec: int):
+        self.interval_sec = max(0, int(interval_sec))
+
+    async def _loop(self):
+        while True:
+            # при выключенном режиме просто проверяем раз в минуту, не включили ли
+            await asyncio.sleep(self.interval_sec if self.enabled else 60)
+            try:
+                await self.flush()
+            except Exception:
+                # сводка не должна ронять цикл; следующая попытка через интервал
+                log.warning("admin digest flush failed", exc_info=True)
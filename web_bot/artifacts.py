@@ -0,0 +1,169 @@
+import gzip
+import json
+import logging
+import os
+import queue
+import shutil
+import threading
+import time
+import uuid
+from typing import Optional
+
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# артефакты падений: скриншот, DOM (gzip), консоль браузера - в примонтированный ./logs
+ARTIFACTS_ENABLED = os.getenv("ARTIFACTS_ENABLED", "1").strip().lower() in ("1", "true", "yes")
+ARTIFACTS_DIR = os.getenv("ARTIFACTS_DIR", "logs/artifacts")
+ARTIFACTS_MAX_MB = float(os.getenv("ARTIFACTS_MAX_MB", "200"))     # общий объём кольцевого буфера
+ARTIFACTS_MAX_COUNT = int(os.getenv("ARTIFACTS_MAX_COUNT", "100"))
+
+class ArtifactStore:
+    """
+    Кольцевой буфер артефактов падений на диске: каталог <dir>/<artifact_id>/
+    со screenshot.png, dom.html.gz, console.json и meta.json.
+
+    capture() вызывается в потоке браузера и делает только то, что требует
+    живой страницы (скриншот, page_source, лог консоли). Сжатие, запись
+    и вытеснение - в отдельном фоновом потоке-писателе.
+    При превышении ARTIFACTS_MAX_MB / ARTIFACTS_MAX_COUNT удаляются давно
+    не использованные артефакты (LRU по mtime каталога; get() его обновляет).
+    """
+    def __init__(self, root: str = ARTIFACTS_DIR, *,
+                 max_bytes: int = int(ARTIFACTS_MAX_MB * 1024 * 1024),
+                 max_count: int = ARTIFACTS_MAX_COUNT,
+                 enabled: bool = ARTIFACTS_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_count = max_count
+        self.enabled = enabled
+        self._q: "queue.Queue[Optional[tuple]]" = queue.Queue(maxsize=16)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    # ---- захват (поток браузера) ----
+    def capture(self, driver, *, reason: str = "", context: Optional[dict] = None) -> Optional[str]:
+        """Снять артефакты текущей страницы и поставить в очередь на запись. Возвращает artifact_id."""
+        if not self.enabled or driver is None:
+            return None
+        artifact_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        meta = {"id": artifact_id, "created_at": time.time(), "reason": reason[:2000], **(context or {})}
+
+        png = dom = console = None
+        try:
+            meta["url"] = driver.current_url
+        except Exception:
+            pass
+        try:
+            png = driver.get_screenshot_as_png()
+        except Exception:
+            pass
+        try:
+            dom = driver.page_source
+        except Exception:
+            pass
+        try:
+            # нужен capability goog:loggingPrefs (см. BotThread._setup_bot)
+            console = driver.get_log("browser")
+        except Exception:
+            pass
+
+        self._ensure_writer()
+        try:
+            self._q.put_nowait((artifact_id, meta, png, dom, console))
+        except queue.Full:
+            # писатель не успевает - лучше потерять артефакт, чем тормозить прогон
+            return None
+        return artifact_id
+
+    # ---- чтение ----
+    def path(self, artifact_id: str) -> str:
+        return os.path.join(self.root, os.path.basename(artifact_id))
+
+    def get(self, artifact_id: str) -> Optional[dict]:
+        """meta.json артефакта + список файлов; отмечает артефакт как использованный (LRU)."""
+        folder = self.path(artifact_id)
+        try:
+            with open(os.path.join(folder, "meta.json"), encoding="utf-8") as f:
+                meta = json.load(f)
+            os.utime(folder)
+        except (OSError, ValueError):
+            return None
+        meta["files"] = sorted(os.listdir(folder))
+        return meta
+
+    # ---- фоновая запись ----
+    def _ensure_writer(self):
+        with self._lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run, daemon=True, name="artifact-writer")
+                self._writer.start()
+
+    def close(self, timeout: float = 5.0):
+        """Дописать очередь и остановить писателя."""
+        with self._lock:
+            writer = self._writer
+            self._writer = None
+        if writer and writer.is_alive():
+            self._q.put(None)
+            writer.join(timeout=timeout)
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is None:
+                return
+            try:
+                self._write(*item)
+                self._evict()
+            except Exception:
+                # диск/права - артефакты вспомогательные, прогоны не трогаем
+                log.warning("artifact write failed", extra={"artifact_id": item[0]}, exc_info=True)
+
+    def _write(self, artifact_id: str, meta: dict, png: Optional[bytes], dom: Optional[str], console):
+        folder = self.path(artifact_id)
+        os.makedirs(folder, exist_ok=True)
+        if png:
+            with open(os.path.join(folder, "screenshot.png"), "wb") as f:
+                f.write(png)
+        if dom:
+            with gzip.open(os.path.join(folder, "dom.html.gz"), "wt", encoding="utf-8", compresslevel=6) as f:
+                f.write(dom)
+        if console:
+            with open(os.path.join(folder, "console.json"), "w", encoding="utf-8") as f:
+                json.dump(console, f, ensure_ascii=False)
+        with open(os.path.join(folder, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+
+    @staticmethod
+    def _dir_size(folder: str) -> int:
+        total = 0
+        for name in os.listdir(folder):
+            try:
+                total += os.path.getsize(os.path.join(folder, name))
+            except OSError:
+                pass
+        return total
+
+    def _evict(self):
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        entries = []
+        for name in names:
+            folder = os.path.join(self.root, name)
+            if not os.path.isdir(folder):
+                continue
+            entries.append((os.path.getmtime(folder), folder, self._dir_size(folder)))
+        entries.sort()  # самые давно использованные - первыми
+        total = sum(size for _, _, size in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_count):
+            _, folder, size = entries.pop(0)
+            shutil.rmtree(folder, ignore_errors=True)
+            total -= size
+
+# общее хранилище процесса
+artifact_store = ArtifactStore()
@@ -0,0 +1,288 @@
+import asyncio
+import base64
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import aiohttp
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+WEBDRIVER_URL = os.getenv("WEBDRIVER_URL", "http://localhost:4444")
+
+# ключ ссылки на элемент в протоколе W3C WebDriver
+ELEMENT_KEY = "element-6066-11e4-a52e-4f735466cecf"
+
+# тот же JS-признак видимости, что и в utils._JS_SCAN
+_JS_IS_VISIBLE = r"""
+const el = arguments[0];
+if (!el || !el.isConnected) return false;
+const style = window.getComputedStyle(el);
+if (style.visibility === 'hidden' || style.display === 'none') return false;
+const r = el.getBoundingClientRect();
+return (r.width || 0) > 0 && (r.height || 0) > 0;
+"""
+
+# ---- ошибки ----
+class WebDriverError(Exception):
+    def __init__(self, error: str, message: str = "", status: int = 0):
+        super().__init__(f"{error}: {message}" if message else error)
+        self.error = error
+        self.status = status
+
+class NoSuchElementError(WebDriverError):
+    pass
+
+class StaleElementError(WebDriverError):
+    pass
+
+class ClickInterceptedError(WebDriverError):
+    pass
+
+class WebDriverTimeout(WebDriverError):
+    pass
+
+_ERRORS = {
+    "no such element": NoSuchElementError,
+    "stale element reference": StaleElementError,
+    "element click intercepted": ClickInterceptedError,
+    "timeout": WebDriverTimeout,
+    "script timeout": WebDriverTimeout,
+}
+
+def _locator(by: str, value: str) -> dict:
+    """W3C знает только css/xpath/link text/tag name - id и name переводим в css, как делает selenium."""
+    if by == By.ID:
+        return {"using": "css selector", "value": f'[id="{value}"]'}
+    if by == By.NAME:
+        return {"using": "css selector", "value": f'[name="{value}"]'}
+    if by == By.CLASS_NAME:
+        return {"using": "css selector", "value": f".{value}"}
+    return {"using": by, "value": value}
+
+
+class WebDriverClient:
+    """
+    Общий HTTP-клиент к Selenium Grid / драйверу.
+    Одна aiohttp-сессия с keep-alive пулом на все браузерные сессии процесса:
+    команды идут прямо из event loop, без отдельного потока на каждый браузер.
+    Сейчас на нём работает проверка сайта (web_bot/site_check.py, /site_check);
+    основной сценарий пока в BotThread.
+    """
+    def __init__(self, url: str = WEBDRIVER_URL, *, pool_size: int = 32, timeout: float = 60):
+        self.url = url.rstrip("/")
+        self._pool_size = pool_size
+        self._timeout = aiohttp.ClientTimeout(total=timeout)
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._pool_size, keepalive_timeout=60),
+                timeout=self._timeout,
+            )
+        return self._http
+
+    async def close(self):
+        if self._http and not self._http.closed:
+            await self._http.close()
+        self._http = None
+
+    async def request(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        """Выполнить команду и вернуть поле value; ошибки W3C превращаются в WebDriverError."""
+        async with self._session().request(method, self.url + path, json=payload) as resp:
+            try:
+                data = await resp.json(content_type=None)
+            except ValueError:
+                data = None
+        value = data.get("value") if isinstance(data, dict) else None
+        if resp.status >= 400:
+            err = value if isinstance(value, dict) else {}
+            error = err.get("error") or f"http {resp.status}"
+            raise _ERRORS.get(error, WebDriverError)(error, err.get("message", ""), resp.status)
+        return value
+
+    async def new_session(self, options: Optional[Options] = None) -> "AsyncWebDriver":
+        """Создать браузерную сессию (по умолчанию chrome с теми же опциями, что у BotThread)."""
+        if options is None:
+            options = Options()
+            options.add_argument("--disable-blink-features=AutomationControlled")
+        caps = {"capabilities": {"alwaysMatch": options.to_capabilities(), "firstMatch": [{}]}}
+        value = await self.request("POST", "/session", caps)
+        return AsyncWebDriver(self, value["sessionId"], value.get("capabilities") or {})
+
+
+class AsyncWebDriver:
+    """Подмножество команд WebDriver, которое использует сценарий (web_bot.BotThread)."""
+    def __init__(self, client: WebDriverClient, session_id: str, capabilities: dict):
+        self.client = client
+        self.session_id = session_id
+        self.capabilities = capabilities
+
+    async def _cmd(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        return await self.client.request(method, f"/session/{self.session_id}{path}", payload)
+
+    # ---- сериализация элементов ----
+    def _wrap(self, value: Any) -> Any:
+        if isinstance(value, dict):
+            if ELEMENT_KEY in value:
+                return AsyncElement(self, value[ELEMENT_KEY])
+            return {k: self._wrap(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._wrap(v) for v in value]
+        return value
+
+    @staticmethod
+    def _unwrap(value: Any) -> Any:
+        if isinstance(value, AsyncElement):
+            return {ELEMENT_KEY: value.id}
+        if isinstance(value, (list, tuple)):
+            return [AsyncWebDriver._unwrap(v) for v in value]
+        if isinstance(value, dict):
+            return {k: AsyncWebDriver._unwrap(v) for k, v in value.items()}
+        return value
+
+    # ---- сессия и навигация ----
+    async def quit(self):
+        try:
+            await self._cmd("DELETE", "")
+        except (WebDriverError, aiohttp.ClientError):
+            pass
+
+    async def get(self, url: str):
+        await self._cmd("POST", "/url", {"url": url})
+
+    async def current_url(self) -> str:
+        return await self._cmd("GET", "/url")
+
+    async def title(self) -> str:
+        return await self._cmd("GET", "/title")
+
+    async def page_source(self) -> str:
+        return await self._cmd("GET", "/source")
+
+    async def set_timeouts(self, *, implicit: Optional[float] = None,
+                           page_load: Optional[float] = None, script: Optional[float] = None):
+        data = {}
+        if implicit is not None:
+            data["implicit"] = int(implicit * 1000)
+        if page_load is not None:
+            data["pageLoad"] = int(page_load * 1000)
+        if script is not None:
+            data["script"] = int(script * 1000)
+        await self._cmd("POST", "/timeouts", data)
+
+    # ---- окна и фреймы ----
+    async def window_handles(self) -> list[str]:
+        return await self._cmd("GET", "/window/handles")
+
+    async def switch_to_window(self, handle: str):
+        await self._cmd("POST", "/window", {"handle": handle})
+
+    async def switch_to_frame(self, frame: "AsyncElement | int | None"):
+        """None - верхний документ."""
+        await self._cmd("POST", "/frame", {"id": self._unwrap(frame)})
+
+    async def switch_to_parent_frame(self):
+        await self._cmd("POST", "/frame/parent", {})
+
+    # ---- поиск и скрипты ----
+    async def find_element(self, by: str, value: str) -> "AsyncElement":
+        return self._wrap(await self._cmd("POST", "/element", _locator(by, value)))
+
+    async def find_elements(self, by: str, value: str) -> list["AsyncElement"]:
+        return self._wrap(await self._cmd("POST", "/elements", _locator(by, value)))
+
+    async def execute_script(self, script: str, *args) -> Any:
+        value = await self._cmd("POST", "/execute/sync", {"script": script, "args": self._unwrap(list(args))})
+        return self._wrap(value)
+
+    async def screenshot_png(self) -> bytes:
+        return base64.b64decode(await self._cmd("GET", "/screenshot"))
+
+    # ---- ожидание ----
+    async def wait_until(self, predicate: Callable[["AsyncWebDriver"], Awaitable[Any]],
+                         timeout: float = 10, poll: float = 0.2,
+                         ignored: tuple = (NoSuchElementError, StaleElementError)) -> Any:
+        """
+        Аналог WebDriverWait.until: ждёт truthy-результата predicate(driver).
+        Ожидание не занимает поток - между попытками просто asyncio.sleep.
+        """
+        end = time.monotonic() + timeout
+        while True:
+            try:
+                value = await predicate(self)
+                if value:
+                    return value
+            except ignored:
+                pass
+            if time.monotonic() >= end:
+                raise WebDriverTimeout("timeout", f"condition not met in {timeout}s")
+            await asyncio.sleep(poll)
+
+    async def wait_for_element(self, by: str, value: str, timeout: float = 10,
+                               visible: bool = False) -> "AsyncElement":
+        async def present(d: "AsyncWebDriver"):
+            el = await d.find_element(by, value)
+            if visible and not await el.is_displayed():
+                return None
+            return el
+        return await self.wait_until(present, timeout=timeout)
+
+
+class AsyncElement:
+    def __init__(self, driver: AsyncWebDriver, element_id: str):
+        self.driver = driver
+        self.id = element_id
+
+    def __eq__(self, other):
+        return isinstance(other, AsyncElement) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __repr__(self):
+        return f"<AsyncElement {self.id}>"
+
+    async def _cmd(self, method: str, path: str, payload: Optional[dict] = None) -> Any:
+        return await self.driver._cmd(method, f"/element/{self.id}{path}", payload)
+
+    async def click(self):
+        await self._cmd("POST", "/click", {})
+
+    async def clear(self):
+        await self._cmd("POST", "/clear", {})
+
+    async def send_keys(self, text: str):
+        await self._cmd("POST", "/value", {"text": str(text)})
+
+    async def text(self) -> str:
+        return await self._cmd("GET", "/text")
+
+    async def tag_name(self) -> str:
+        return await self._cmd("GET", "/name")
+
+    async def get_attribute(self, name: str) -> Optional[str]:
+        return await self._cmd("GET", f"/attribute/{name}")
+
+    async def get_property(self, name: str) -> Any:
+        return self.driver._wrap(await self._cmd("GET", f"/property/{name}"))
+
+    async def is_enabled(self) -> bool:
+        return bool(await self._cmd("GET", "/enabled"))
+
+    async def is_displayed(self) -> bool:
+        # в W3C нет команды displayed - проверяем скриптом
+        return bool(await self.driver.execute_script(_JS_IS_VISIBLE, self))
+
+    async def find_element(self, by: str, value: str) -> "AsyncElement":
+        return self.driver._wrap(await self._cmd("POST", "/element", _locator(by, value)))
+
+    async def find_elements(self, by: str, value: str) -> list["AsyncElement"]:
+        return self.driver._wrap(await self._cmd("POST", "/elements", _locator(by, value)))
+
+# общий клиент процесса (пул соединений к WEBDRIVER_URL), закрывается при остановке бота
+webdriver_client = WebDriverClient()
@@ -1,25 +1,40 @@
 import asyncio
 import contextlib
-import threading
+import logging
+import time
+from datetime import datetime, timezone
 from typing import Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.interval import IntervalTrigger
 
-from web_bot.web_bot import BotThread 
-from db.data_access import JobActions, UserActions 
+from web_bot.web_bot import BotThread, PARK_MAX
+from web_bot.admin_digest import AdminDigest
+from web_bot.slots import slot_keys, describe
+from web_bot.profiles import PollProfile, PollWindow, load_profiles, default_profile, POLL_PROFILE, POLL_PROFILES_FILE
+from db.data_access import JobActions, UserActions, StateActions
+from db.subscriptions import subscription_index
+from app_logging import job_context, job_id_var, new_job_id
+from app_config import config, Settings
 
 import os, random
 from dotenv import load_dotenv
 
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 EMAIL = str(os.getenv("EMAIL", "0"))
 PASSWORD = str(os.getenv("PASSWORD", "0"))
-ALLOWED_CITIES = os.getenv("ALLOWED_CITIES", "")
-ALLOWED_CITIES = [c.strip() for c in ALLOWED_CITIES.split(",") if c.strip()]
+# период сводки рутинных событий для админа, 0 - каждое событие отдельным сообщением
+ADMIN_DIGEST_SEC = int(os.getenv("ADMIN_DIGEST_SEC", "0"))
+# как часто сохранять состояние контроллера в runtime_state (плюс при каждом изменении)
+CHECKPOINT_SEC = int(os.getenv("CHECKPOINT_SEC", "30"))
+CHECKPOINT_KEY = "controller"
+# ответы сценария "слотов нет" (web_bot.BotThread._handle_test_vfs)
+NO_SLOTS_MESSAGES = {"no application slots", "no_application_slots"}
 
 # ==== Контроллер жизненного цикла внешнего веб-бота ====
+
 class Controller():
     def __init__(self) -> None:
         self.bot: Optional[BotThread] = None
@@ -34,107 +49,406 @@ class Controller():
         # для создания пауз в работе бота и обращения к админу
         self._loop: Optional[asyncio.AbstractEventLoop] = None # ссылка на event loop, в котором всё запускается
         self._send_admin_coro = None  # async callable(dict)
+        self._digest: Optional[AdminDigest] = None # сводка рутинных событий
+        self._digest_interval = ADMIN_DIGEST_SEC
         self._notify_users = None # async callable(list[int], bool)
-        self._resume_evt = threading.Event() # событие паузы
-        self._resume_evt.set()
-
-    async def _process_next_user(self):
+        # прогоны, отложенные паузой (captcha/new_tab) до /continue: park_id -> сведения
+        self._parked: dict[str, dict] = {}
+        self._tasks: set[asyncio.Task] = set()  # продолженные прогоны, которые ещё идут
+
+        # последний известный набор слотов по городу - уведомляем только об изменениях
+        self._last_slots: dict[str, set[str]] = {}
+        self._last_availability: dict[str, dict] = {}
+        self._last_results: dict[str, dict] = {}  # последний исход прогона по городу (панель статуса)
+
+        # чекпоинт для тёплого рестарта
+        self.state_actions = StateActions()
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._checkpoint_owner = True  # False после потери лидерства: чекпоинт ведёт новая ведущая
+        self._in_flight: Optional[dict] = None      # прогон, который сейчас в браузере
+        self._pending_cities: list[str] = []        # прогоны, прерванные рестартом - повторяем первыми
+
+        # профиль опроса (web_bot.profiles): окна со своим интервалом, городами и лимитом прогонов
+        self._profile_name: Optional[str] = POLL_PROFILE or None
+        self._profile: Optional[PollProfile] = None
+        self._poll_slots: Optional[asyncio.Semaphore] = None
+        config.subscribe(self._on_config_change)
+
+    def _recipients(self, city: str):
+        """
+        Получатели события по городу: подписчики города из индекса в памяти.
+        Пока индекс не построен - все пользователи пачками с серверного курсора.
+        """
+        if subscription_index.loaded:
+            return subscription_index.iter_chunks(city)
+        return self.user_actions.iter_chat_ids_by_status()
+
+    async def _process_next_user(self, cities: Optional[list[str]] = None):
         
         row = await self.user_actions.next_user_to_apply()
         if not row:
             return {"ok": False, "message": "no users in queue"}, ""  # (dict, None)
 
         user_id, login, password, _, _ = row
-        city = random.choice(ALLOWED_CITIES)
+        city = self._take_pending_city(cities) or random.choice(cities or config.current.allowed_cities)
+        log.info("job started", extra={"user_id": user_id, "city": city})
+        fut = self.bot.submit("test_vfs", form_data={"login": login, "password": password, "city": city})
+        return await self._run_job(fut, user_id, city), city
+
+    def _take_pending_city(self, cities: Optional[list[str]]) -> Optional[str]:
+        """Первый прерванный рестартом город, который входит в cities окна (пусто - любой)."""
+        for i, city in enumerate(self._pending_cities):
+            if not cities or city in cities:
+                return self._pending_cities.pop(i)
+        return None
+
+    async def _run_job(self, fut: asyncio.Future, user_id: int, city: str) -> dict:
+        """Дождаться команды браузера (новый прогон или продолженный) и сохранить результат."""
+        result = await self._await_job(fut, user_id, city)
+        self._last_results[city] = {"ok": bool(result.get("ok")), "at": time.time(),
+                                    "message": result.get("message") or result.get("error") or ""}
+        return result
+
+    async def _await_job(self, fut: asyncio.Future, user_id: int, city: str) -> dict:
+        job_id = job_id_var.get()
+        self._in_flight = {"job_id": job_id, "user_id": user_id, "city": city, "started_at": time.time()}
 
         try:
-            fut = self.bot.submit("test_vfs", form_data={"login": login, "password": password, "city": city})
             # не даём таймауту отменять исходный future:
             result = await asyncio.wait_for(asyncio.shield(fut), timeout=120)
 
+            if result.get("parked"):
+                # сессия отложена до /continue - результат сохраним, когда прогон завершится
+                park = {**result["parked"], "user_id": user_id, "city": city}
+                self._parked[park["park_id"]] = park
+                log.info("job parked", extra={"city": city, "park_id": park["park_id"], "kind": park["kind"]})
+                return result
+
+            payload = {**result, "job_id": job_id}
+            changed = self._diff_slots(city, result)
+            if not changed and "availability" in payload:
+                # тот же набор слотов уже сохранён в прошлых результатах
+                payload.pop("availability")
+                payload["availability_unchanged"] = True
+
             await self.job_actions.save_result(
                 status="ok" if result.get("ok") else "fail",
                 user_id=user_id,
                 url=result.get("url"),
-                payload={**result},
+                payload=payload,
             )
-            return result, city
+            log.info("job finished", extra={"city": city, "ok": bool(result.get("ok")),
+                                            "result_message": result.get("message"), "new_slots": len(result["new_slots"])})
+            return result
 
         except asyncio.TimeoutError:
-            await self.job_actions.save_result(status="fail", user_id=user_id, url=None, payload={"error": "timeout"})
+            log.error("job timed out", extra={"city": city})
+            await self.job_actions.save_result(status="fail", user_id=user_id, url=None,
+                                               payload={"error": "timeout", "job_id": job_id})
             await self.user_actions.change_user_status(user_id=user_id, apply_status='0_waiting')
-            return {"ok": False, "error": "timeout"}, city
+            return {"ok": False, "error": "timeout"}
 
         except Exception as e:
-            await self.job_actions.save_result(status="fail", user_id=user_id, url=None, payload={"error": str(e)})
+            artifact_id = getattr(e, "artifact_id", None)  # артефакты падения (web_bot.artifacts)
+            log.error("job failed: %s", e, extra={"city": city, "artifact_id": artifact_id})
+            await self.job_actions.save_result(status="fail", user_id=user_id, url=None,
+                                               payload={"error": str(e), "job_id": job_id},
+                                               artifact_id=artifact_id)
             await self.user_actions.change_user_status(user_id=user_id, apply_status='0_waiting')
-            return {"ok": False, "error": str(e)}, city
+            result = {"ok": False, "error": str(e)}
+            if artifact_id:
+                result["artifact_id"] = artifact_id
+            return result
+
+        finally:
+            self._in_flight = None
             
-    async def _scheduled_job(self):
-        # рандомная задержка перед выполнением (костыль)
-        await asyncio.sleep(random.randint(0, 60))
-        
+    def _diff_slots(self, city: str, result: dict) -> bool:
+        """
+        Сравнить слоты результата с последним снимком города и обновить снимок.
+        В result добавляются new_slots (появились) и slots_gone (слотов больше нет).
+        Возвращает True, если набор слотов изменился.
+        Снимок меняется только по ответу сайта (слоты есть / "нет слотов"): капча
+        и ошибки прогона ничего не говорят о слотах и снимок не трогают.
+        """
+        previous = self._last_slots.get(city, set())
+        if result.get("ok"):
+            current = slot_keys(result.get("availability"))
+        elif result.get("no_slots") or result.get("message") in NO_SLOTS_MESSAGES:
+            current = set()
+        else:
+            result["new_slots"], result["slots_gone"] = [], False
+            return False
+        new = current - previous
+        result["new_slots"] = sorted(new)
+        result["slots_gone"] = bool(previous) and not current
+        self._last_slots[city] = current
+        if current:
+            self._last_availability[city] = result.get("availability") or {}
+        else:
+            self._last_availability.pop(city, None)
+        return current != previous
+
+    async def _notify_result(self, result: dict, city: str):
+        """Пользователям - только изменения: новые слоты или их исчезновение."""
+        if not self._notify_users:
+            return
+        if result.get("new_slots"):
+            await self._notify_users(self._recipients(city), city, True,
+                                     details=describe(set(result["new_slots"])))
+        elif result.get("slots_gone"):
+            await self._notify_users(self._recipients(city), city, False)
+
+    def last_slots(self) -> dict[str, dict]:
+        """Последние известные слоты по городам (для админа)."""
+        return dict(self._last_availability)
+
+    def status(self) -> dict:
+        """Текущее состояние для панели статуса админа (без обращения к БД)."""
+        next_run_at = None
+        if self.scheduler and self.running:
+            times = [job.next_run_time for job in self.scheduler.get_jobs() if job.next_run_time]
+            next_run_at = min(times) if times else None
+        return {
+            "running": self.running,
+            "profile": self._profile_name,
+            "digest_interval": self._digest_interval,
+            "next_run_at": next_run_at,
+            "in_flight": self._in_flight,
+            "bot": self.bot.status() if self.bot else None,
+            "parked": self.parked(),
+            "last_results": dict(self._last_results),
+            "slots": {city: len(keys) for city, keys in self._last_slots.items() if keys},
+        }
+
+    async def _scheduled_job(self, window: Optional[PollWindow] = None):
         if not self.running or not self.bot:
             return
-        result, city = await self._process_next_user()
-
-        if result.get('ok'):
-            chat_ids = await self.user_actions.get_chat_ids_by_status()
-            await self._notify_users(chat_ids, city, True)
-
-        if not result.get('ok'): # это для отладки
-            chat_ids = await self.user_actions.get_chat_ids_by_status()
-            await self._notify_users(chat_ids, city, False)
+        if len(self._parked) >= PARK_MAX:
+            # все места парковки заняты - каждый новый прогон упрётся в ту же паузу
+            log.info("tick skipped: parked jobs wait for /continue", extra={"parked": len(self._parked)})
+            return
+        slots = self._poll_slots
+        if slots is not None and slots.locked():
+            # лимит параллельных прогонов профиля - тик пропускаем, а не копим очередь в браузер
+            log.info("tick skipped: concurrency cap", extra={"window": window.name if window else None})
+            return
+        async with slots or contextlib.nullcontext():
+            # рандомная задержка перед выполнением (костыль)
+            await asyncio.sleep(random.randint(0, window.jitter_sec if window else 60))
+
+            if not self.running or not self.bot:
+                return
+            # один job_id на тик: контроллер, шаги браузера и записи в БД
+            with job_context(new_job_id()):
+                result, city = await self._process_next_user(window.cities if window else None)
+                await self._notify_result(result, city)
+
+                if self._send_admin_coro:
+                    await self._send_admin_coro({"type":"scheduler", "message": str(result), "url": result.get("url",""),
+                                                 "city": city, "result": result})
+        await self.checkpoint()
+
+    # ---- профили опроса ----
+    def profiles(self) -> tuple[dict[str, PollProfile], str]:
+        """Профили из POLL_PROFILES_FILE и имя активного (ValueError - ошибка в файле)."""
+        profiles, default = load_profiles()
+        return profiles, self._profile_name or default
+
+    async def _on_config_change(self, settings: Settings, changed: set[str]):
+        """Файл профилей или SCHED_INTERVAL_SEC изменились - пересобрать окна активного профиля."""
+        if not self.scheduler or not ({POLL_PROFILES_FILE, config.path} & changed):
+            return
+        try:
+            profiles, name = self.profiles()
+        except ValueError as e:
+            log.error("polling profiles invalid, keeping current: %s", e)
+            return
+        profile = profiles.get(name)
+        if profile is None:
+            log.error("polling profile disappeared, keeping current", extra={"profile": name})
+            return
+        if profile != self._profile:
+            self._schedule_profile(profile)
+            log.info("polling profile reloaded", extra={"profile": name})
+
+    def _schedule_profile(self, profile: PollProfile):
+        """Заменить задания планировщика окнами профиля: одно задание на окно."""
+        for job in self.scheduler.get_jobs():
+            if job.id.startswith("poll:"):
+                job.remove()
+        for window in profile.windows:
+            self.scheduler.add_job(
+                self._scheduled_job,
+                profile.trigger(window),
+                args=[window],
+                id=f"poll:{window.name}",
+                max_instances=1,        # чтобы не было параллельных накладок
+                coalesce=True,          # объединять пропуски
+                misfire_grace_time=60,
+            )
+        self._profile = profile
+        self._profile_name = profile.name
+        self._poll_slots = asyncio.Semaphore(profile.max_concurrent)
 
-        if self._send_admin_coro:
-            await self._send_admin_coro({"type":"scheduler", "message": str(result), "url": result.get("url",""), "city": city})
+    async def set_profile(self, name: str) -> str:
+        """Команда /profile <имя>: переключить профиль опроса на лету."""
+        try:
+            profiles, _ = self.profiles()
+        except ValueError as e:
+            return f"Ошибка в файле профилей: {e}"
+        profile = profiles.get(name)
+        if profile is None:
+            return f"Нет профиля '{name}'. Доступны: {', '.join(sorted(profiles))}"
+        if self.scheduler:
+            self._schedule_profile(profile)
+        else:
+            self._profile_name = name  # применится при /start_job
+        log.info("polling profile switched", extra={"profile": name, "running": self.running})
+        await self.checkpoint()
+        return f"Профиль опроса: {name}" + ("" if self.running else " (применится при запуске)")
 
 
-    async def start(self, loop: asyncio.AbstractEventLoop, send_admin_coro=None, notify_users=None):
+    async def start(self, loop: asyncio.AbstractEventLoop, send_admin_coro=None, notify_users=None,
+                    first_run_at: Optional[datetime] = None):
         if self.running:
             return "Уже запущен."
         
         self._loop = loop
-        self._send_admin_coro = send_admin_coro # сообщения для админа
+        # сообщения для админа (через сводку: срочное сразу, рутинное - пачкой)
+        self._digest = AdminDigest(send_admin_coro, self._digest_interval) if send_admin_coro else None
+        if self._digest:
+            self._digest.start()
+        self._send_admin_coro = self._digest
         self._notify_users = notify_users # сообщения для пользователей
 
         # коллбек из потока веб-бота в event loop
         def notify(event: dict):
+            if event.get("type") == "park_expired":
+                loop.call_soon_threadsafe(self._spawn, self._park_expired(event))
             if self._send_admin_coro:
                 loop.call_soon_threadsafe(asyncio.create_task, self._send_admin_coro(event))
 
-        self.bot = BotThread(loop, notify=notify, resume_evt=self._resume_evt)
+        self.bot = BotThread(loop, notify=notify)
         self.bot.start()
 
         self.stop_event = asyncio.Event()
 
-        # интервал можно вынести в .env
-        interval_seconds = int(os.getenv("SCHED_INTERVAL_SEC", "30"))  # по умолчанию каждые 5 минут
+        # окна опроса из профиля; без файла профилей - один интервал SCHED_INTERVAL_SEC
+        try:
+            profiles, name = self.profiles()
+        except ValueError as e:
+            log.error("polling profiles invalid, using default: %s", e)
+            profiles, name = {"default": default_profile()}, "default"
+        profile = profiles.get(name) or profiles["default"]
 
         self.scheduler = AsyncIOScheduler()
-        self.scheduler.add_job(
-            self._scheduled_job,
-            IntervalTrigger(seconds=interval_seconds),
-            id="vfsglobal_job",
-            max_instances=1,        # чтобы не было параллельных накладок
-            coalesce=True,          # объединять пропуски
-            misfire_grace_time=60
-        )
+        self._schedule_profile(profile)
+        if first_run_at:
+            # после рестарта: прерванные прогоны / пропущенный тик - разовым заданием
+            self.scheduler.add_job(self._scheduled_job, "date", run_date=first_run_at,
+                                   id="catch_up", misfire_grace_time=None)
         self.scheduler.start()
 
         self.running = True
-        return "Запущено: bot + scheduler."
+        self._checkpoint_owner = True
+        log.info("controller started", extra={"profile": profile.name,
+                                              "windows": [w.name for w in profile.windows]})
+        self._checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        await self.checkpoint()
+        return f"Запущено: bot + scheduler (профиль {profile.name})."
     
-    async def resume(self) -> bool:
-        """Команда /continue от админа: снять паузу, если она активна."""
-        if not self._resume_evt.is_set():
-            self._resume_evt.set()
-            return True
-        return False
-
-    async def stop(self):
+    # ---- отложенные прогоны (пауза для админа) ----
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def parked(self) -> list[dict]:
+        """Отложенные прогоны с временем ожидания (для админа и чекпоинта)."""
+        now = time.time()
+        return [{**p, "waited_sec": round(now - p["parked_at"]), "left_sec": max(0, round(p["deadline"] - now))}
+                for p in sorted(self._parked.values(), key=lambda p: p["parked_at"])]
+
+    async def resume(self, park_id: Optional[str] = None) -> bool:
+        """Команда /continue от админа: продолжить отложенный прогон (по id или самый старый)."""
+        if not self.bot or not self._parked:
+            return False
+        if not park_id:
+            park_id = self.parked()[0]["park_id"]
+        park = self._parked.pop(park_id, None)
+        if park is None:
+            return False
+        log.info("resuming parked job", extra={"park_id": park_id, "kind": park["kind"],
+                                               "waited_sec": round(time.time() - park["parked_at"])})
+        # продолжение идёт под job_id исходного прогона
+        with job_context(park.get("job_id")):
+            fut = self.bot.submit("resume", park_id=park_id, city=park["city"])
+            self._spawn(self._finish_resumed(fut, park))
+        return True
+
+    async def _finish_resumed(self, fut: asyncio.Future, park: dict):
+        city = park["city"]
+        result = await self._run_job(fut, park["user_id"], city)
+        await self._notify_result(result, city)
+        if self._send_admin_coro:
+            await self._send_admin_coro({"type": "scheduler", "message": str(result), "url": result.get("url", ""),
+                                         "city": city, "result": result})
+        await self.checkpoint()
+
+    async def _park_expired(self, event: dict):
+        """Поток закрыл отложенную сессию по PARK_TIMEOUT_SEC - прогон считается неудачным."""
+        park = self._parked.pop(event.get("park_id"), None)
+        if park is None:
+            return
+        with job_context(park.get("job_id")):
+            await self.job_actions.save_result(status="fail", user_id=park["user_id"], url=park.get("url"),
+                                               payload={"error": "pause timeout", "kind": park["kind"],
+                                                        "waited_sec": event.get("waited_sec"),
+                                                        "job_id": park.get("job_id")})
+            await self.user_actions.change_user_status(user_id=park["user_id"], apply_status='0_waiting')
+        await self.checkpoint()
+
+    async def admin_event(self, event: dict, send_admin_coro=None):
+        """Событие для админа из других частей приложения: через сводку, если бот запущен."""
+        send = self._send_admin_coro or send_admin_coro
+        if send:
+            await send(event)
+
+    async def set_digest_interval(self, interval_sec: int) -> str:
+        """Команда /digest: 0 - выключить сводку, иначе период в секундах."""
+        self._digest_interval = max(0, int(interval_sec))
+        if self._digest:
+            if not self._digest_interval:
+                await self._digest.flush()  # накопленное не теряем
+            self._digest.set_interval(self._digest_interval)
+        await self.checkpoint()
+        if self._digest_interval:
+            return f"Сводка включена: раз в {self._digest_interval} с."
+        return "Сводка выключена: события приходят сразу."
+
+    async def stop(self, persist: bool = True, demoted: bool = False):
+        """
+        persist=True  - остановка админом: в чекпоинт пишется, что работа остановлена.
+        persist=False - выключение процесса: в чекпоинт пишется последнее рабочее состояние
+                        (до остановки потока), после рестарта работа продолжится.
+        demoted=True  - потеря лидерства: чекпоинт не пишется вовсе (и до следующего запуска),
+                        его уже ведёт новая ведущая реплика.
+        """
         if not self.running:
             return "И так остановлено."
+        if demoted:
+            # прогоны, которые ещё дорабатывают на этой реплике, тоже не должны его перезаписать
+            self._checkpoint_owner = False
+
+        if self._checkpoint_task:
+            self._checkpoint_task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._checkpoint_task
+            self._checkpoint_task = None
+        if not persist and not demoted:
+            # последнее состояние - до остановки потока (in-flight прогон ещё виден)
+            await self.checkpoint()
         
         # попросим остановиться
         if self.stop_event:
@@ -146,30 +460,128 @@ class Controller():
                 self.scheduler.remove_all_jobs()
                 self.scheduler.shutdown(wait=False)
             except Exception:
-                pass
+                log.warning("scheduler shutdown failed", exc_info=True)
             self.scheduler = None
 
         # остановим поток с ботом
         if self.bot:
             self.bot.stop()
 
+        # остаток сводки отправим сразу
+        if self._digest:
+            await self._digest.stop(flush=True)
+            self._digest = None
+
         # очистка
         self.bot = None
         self.stop_event = None
         self.running = False
+        self._in_flight = None
+        self._parked.clear()  # сессии закрыл поток браузера; города - в чекпоинте
+        if persist and not demoted:
+            await self.checkpoint()
+        log.info("controller stopped", extra={"persist": persist, "demoted": demoted})
         return "Остановлено: bot + scheduler."
 
+    # ---- чекпоинт / тёплый рестарт ----
+    def snapshot(self) -> dict:
+        """Состояние для восстановления после рестарта (JSON)."""
+        next_run_at = None
+        if self.scheduler:
+            times = [job.next_run_time for job in self.scheduler.get_jobs() if job.next_run_time]
+            if times:
+                next_run_at = min(times).isoformat()
+        pending = []
+        if self.bot:
+            # только метаданные: логин/пароль из form_data не сохраняем
+            for cmd in self.bot.pending():
+                form = cmd.kwargs.get("form_data") or {}
+                pending.append({"name": cmd.name, "city": form.get("city") or cmd.kwargs.get("city"),
+                                "job_id": cmd.job_id})
+        return {
+            "running": self.running,
+            "parked": self.parked(),
+            "profile": self._profile_name,
+            "digest_interval": self._digest_interval,
+            "next_run_at": next_run_at,
+            "in_flight": self._in_flight,
+            "pending_commands": pending,
+            "pending_cities": list(self._pending_cities),
+            "last_slots": {city: sorted(keys) for city, keys in self._last_slots.items()},
+            "last_availability": self._last_availability,
+            "saved_at": time.time(),
+        }
+
+    async def checkpoint(self):
+        if not self._checkpoint_owner:
+            return
+        try:
+            await self.state_actions.set(CHECKPOINT_KEY, self.snapshot())
+        except Exception:
+            log.warning("checkpoint failed", exc_info=True)
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(CHECKPOINT_SEC)
+            await self.checkpoint()
+
+    async def restore(self, loop: asyncio.AbstractEventLoop, send_admin_coro=None, notify_users=None) -> Optional[str]:
+        """
+        Поднять состояние из чекпоинта при старте (или при избрании ведущей репликой).
+        Если перед остановкой бот работал - запускается снова, прерванные прогоны
+        повторяются первыми. Возвращает текст для админа или None, если восстанавливать нечего.
+        """
+        self._checkpoint_owner = True  # эта реплика снова ведущая
+        try:
+            state = await self.state_actions.get(CHECKPOINT_KEY)
+        except Exception:
+            log.warning("checkpoint read failed", exc_info=True)
+            return None
+        if not state:
+            return None
+
+        self._digest_interval = int(state.get("digest_interval", self._digest_interval))
+        self._last_slots = {city: set(keys) for city, keys in (state.get("last_slots") or {}).items()}
+        self._last_availability = state.get("last_availability") or {}
+        if not POLL_PROFILE and state.get("profile"):
+            self._profile_name = state["profile"]  # переключённый через /profile переживает рестарт
+        if not state.get("running"):
+            log.info("checkpoint restored, controller was stopped")
+            return None
+
+        # прерванные прогоны: тот, что был в браузере, отложенные до /continue и команды в очереди потока
+        cities = list(state.get("pending_cities") or [])
+        if state.get("in_flight"):
+            cities.append(state["in_flight"].get("city"))
+        parked = state.get("parked") or []
+        cities += [p.get("city") for p in parked]
+        cities += [c.get("city") for c in state.get("pending_commands") or []]
+        self._pending_cities = [c for i, c in enumerate(cities) if c and c not in cities[:i]]
+
+        # окна профиля сами продолжат по расписанию; сразу - только если есть что доделать
+        # или тик был пропущен, пока процесс не работал
+        first_run_at = None
+        now = datetime.now(timezone.utc)
+        next_run_at = datetime.fromisoformat(state["next_run_at"]) if state.get("next_run_at") else None
+        if self._pending_cities or (next_run_at and next_run_at < now):
+            first_run_at = now
+
+        msg = await self.start(loop, send_admin_coro, notify_users, first_run_at=first_run_at)
+        parts = [f"Восстановлено после рестарта: {msg}"]
+        if self._pending_cities:
+            parts.append("Повторю прерванные прогоны: " + ", ".join(self._pending_cities))
+        if parked:
+            kinds = ", ".join(sorted({p.get("kind") or "?" for p in parked}))
+            parts.append(f"Перед остановкой {len(parked)} прогон(а) ждали /continue ({kinds}), "
+                         "их сессии закрыты - прогоны будут начаты заново.")
+        log.info("checkpoint restored", extra={"pending_cities": self._pending_cities,
+                                               "first_run_at": str(first_run_at)})
+        return "\n".join(parts)
+
     async def run_once(self):
         if not self.running or not self.bot:
             return {"ok": False, "error": "Не запущено. Сначала /start_job"}
-        result, city = await self._process_next_user()
-
-        if result.get('ok'):
-            chat_ids = await self.user_actions.get_chat_ids_by_status()
-            await self._notify_users(chat_ids, city, True)
-
-        if not result.get('ok'): # это для отладки
-            chat_ids = await self.user_actions.get_chat_ids_by_status()
-            await self._notify_users(chat_ids, city, False)
-
+        with job_context(new_job_id()):
+            result, city = await self._process_next_user()
+            await self._notify_result(result, city)
         return result
\ No newline at end of file
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Optional
+
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+from db.data_access import LocatorActions
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# сколько ждать один локатор за попытку; дальше переходим к следующему по рейтингу
+LOCATOR_PROBE_SEC = float(os.getenv("LOCATOR_PROBE_SEC", "2"))
+
+Locator = tuple[str, str]  # (By.*, selector)
+
+@dataclass
+class LocatorStats:
+    hits: int = 0
+    misses: int = 0
+    avg_ms: Optional[float] = None
+
+    def score(self) -> tuple[float, float]:
+        # доля попаданий со сглаживанием (новый локатор ~0.5) и среднее время до находки
+        rate = (self.hits + 1) / (self.hits + self.misses + 2)
+        return -rate, self.avg_ms if self.avg_ms is not None else float("inf")
+
+    def record(self, hit: bool, ms: Optional[float] = None):
+        if not hit:
+            self.misses += 1
+            return
+        self.hits += 1
+        if ms is not None:
+            self.avg_ms = ms if self.avg_ms is None else self.avg_ms * 0.8 + ms * 0.2
+
+def locator_key(locator: Locator) -> str:
+    by, value = locator
+    return f"{by}={value}"[:255]
+
+class LocatorRegistry:
+    """
+    Рейтинг альтернативных локаторов одного элемента (группы).
+    find() пробует локаторы от лучшего по истории к худшему короткими попытками
+    по LOCATOR_PROBE_SEC и ходит по кругу до общего таймаута - неработающий
+    локатор стоит секунды, а не полный WebDriverWait.
+    Работает в потоке BotThread; статистика пишется в БД (locator_stats)
+    в event loop'е async-части, поток запись не ждёт.
+    """
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None, probe_sec: float = LOCATOR_PROBE_SEC):
+        self._loop = loop
+        self.probe_sec = probe_sec
+        self._stats: dict[tuple[str, str], LocatorStats] = {}
+        self._dirty: set[tuple[str, str]] = set()
+        self._lock = threading.Lock()
+        self.actions = LocatorActions()
+
+    # ---- хранение ----
+    def load(self, timeout: float = 10):
+        """Подтянуть статистику из БД (вызывается из потока бота)."""
+        if not self._loop:
+            return
+        try:
+            rows = asyncio.run_coroutine_threadsafe(self.actions.load_all(), self._loop).result(timeout)
+        except Exception:
+            log.warning("locator stats load failed", exc_info=True)
+            return
+        with self._lock:
+            for group, key, hits, misses, avg_ms in rows:
+                self._stats[(group, key)] = LocatorStats(hits or 0, misses or 0, avg_ms)
+
+    def _persist(self):
+        if not self._loop:
+            return
+        with self._lock:
+            rows = [(g, k, s.hits, s.misses, s.avg_ms)
+                    for (g, k), s in self._stats.items() if (g, k) in self._dirty]
+            self._dirty.clear()
+        if rows:
+            asyncio.run_coroutine_threadsafe(self._save(rows), self._loop)
+
+    async def _save(self, rows):
+        try:
+            await self.actions.save_many(rows)
+        except Exception:
+            # статистика вспомогательная - падение записи не должно ломать прогон
+            log.warning("locator stats save failed", exc_info=True)
+
+    # ---- рейтинг ----
+    def ranked(self, group: str, locators: list[Locator]) -> list[Locator]:
+        """Локаторы в порядке попыток; при равных оценках сохраняется исходный порядок."""
+        with self._lock:
+            scores = {loc: self._stats.get((group, locator_key(loc)), LocatorStats()).score() for loc in locators}
+        return sorted(locators, key=lambda loc: scores[loc])
+
+    def record(self, group: str, locator: Locator, hit: bool, ms: Optional[float] = None):
+        key = (group, locator_key(locator))
+        with self._lock:
+            self._stats.setdefault(key, LocatorStats()).record(hit, ms)
+            self._dirty.add(key)
+
+    def stats(self, group: str) -> dict[str, LocatorStats]:
+        with self._lock:
+            return {k: s for (g, k), s in self._stats.items() if g == group}
+
+    # ---- поиск ----
+    def find(self, driver, group: str, locators: list[Locator], *,
+             timeout: float = 30,
+             condition: Optional[Callable] = None):
+        """
+        Вернуть (element, locator) первого сработавшего локатора или бросить TimeoutError.
+        condition(el) -> bool - дополнительная проверка (видимость, доступность).
+        """
+        ranked = self.ranked(group, locators)
+        deadline = time.monotonic() + timeout
+        tried: set[Locator] = set()
+
+        while True:
+            for loc in ranked:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    break
+                tried.add(loc)
+                probe_start = time.monotonic()
+                try:
+                    el = WebDriverWait(driver, min(self.probe_sec, left)).until(EC.presence_of_element_located(loc))
+                    if condition is not None and not condition(el):
+                        continue
+                except Exception:
+                    continue
+
+                # время именно этой попытки, без промахов других локаторов перед ней
+                self.record(group, loc, True, (time.monotonic() - probe_start) * 1000)
+                # остальные опробованные не нашли элемент там, где этот нашёл
+                for other in tried - {loc}:
+                    self.record(group, other, False)
+                self._persist()
+                return el, loc
+
+            if time.monotonic() >= deadline:
+                for loc in tried:
+                    self.record(group, loc, False)
+                self._persist()
+                raise TimeoutError(f"Локаторы группы '{group}' не нашли элемент за {timeout} с")
+            # элемент есть, но condition не прошёл - не долбим драйвер без паузы
+            time.sleep(0.2)
@@ -0,0 +1,133 @@
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Optional
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+
+from app_config import config
+
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+log = logging.getLogger(__name__)
+
+# профили опроса: окна по времени суток со своим интервалом и городами
+POLL_PROFILES_FILE = os.getenv("POLL_PROFILES_FILE", "config/polling_profiles.json")
+POLL_PROFILE = os.getenv("POLL_PROFILE", "").strip()  # профиль при старте (иначе "default" из файла)
+config.add_resource(POLL_PROFILES_FILE)  # файл читается через кеш конфигурации и перечитывается при изменении
+
+_CRON_FIELDS = {"year", "month", "day", "week", "day_of_week", "hour", "minute", "second"}
+
+class WindowTrigger(BaseTrigger):
+    """
+    Каждые interval_sec секунд, но только пока открыто окно cron.
+    Поля cron описывают, когда окно открыто (незаданные minute/second = "*"):
+    {"day_of_week": "mon-fri", "hour": "9-10"} - будни с 9:00 до 10:59:59.
+    Без cron - обычный интервал. Время, выпавшее на закрытое окно,
+    переносится на ближайшее открытие.
+    """
+    def __init__(self, interval_sec: int, cron: Optional[dict] = None, timezone=None):
+        self.interval = timedelta(seconds=interval_sec)
+        self.window = None
+        if cron:
+            self.window = CronTrigger(timezone=timezone, **{"minute": "*", "second": "*", **cron})
+
+    def get_next_fire_time(self, previous_fire_time: Optional[datetime], now: datetime) -> Optional[datetime]:
+        if previous_fire_time is not None:
+            candidate = previous_fire_time + self.interval
+        elif self.window is not None:
+            candidate = now  # окно уже открыто - первый прогон сразу
+        else:
+            candidate = now + self.interval
+        if self.window is None:
+            return candidate
+        return self.window.get_next_fire_time(None, candidate)
+
+    def __str__(self):
+        return f"window[{self.window or 'always'}, every {int(self.interval.total_seconds())}s]"
+
+@dataclass
+class PollWindow:
+    name: str
+    interval_sec: int
+    cron: Optional[dict] = None
+    cities: list[str] = field(default_factory=list)  # пусто - все ALLOWED_CITIES
+    jitter_sec: int = 60                             # случайная задержка перед прогоном
+
+    def describe(self) -> str:
+        when = ", ".join(f"{k}={v}" for k, v in (self.cron or {}).items()) or "всегда"
+        cities = ", ".join(self.cities) or "все города"
+        return f"{self.name}: {when}; каждые {self.interval_sec} с; {cities}"
+
+@dataclass
+class PollProfile:
+    name: str
+    windows: list[PollWindow]
+    max_concurrent: int = 1         # прогонов одновременно; всегда 1 - браузер один (BotThread), лишние тики пропускаются
+    timezone: Optional[str] = None  # часовой пояс окон (по умолчанию - локальный)
+
+    def trigger(self, window: PollWindow) -> WindowTrigger:
+        return WindowTrigger(window.interval_sec, window.cron, self.timezone)
+
+def default_profile() -> PollProfile:
+    """Профиль, совпадающий со старым поведением: один интервал SCHED_INTERVAL_SEC (из текущих настроек)."""
+    return PollProfile(name="default",
+                       windows=[PollWindow(name="always", interval_sec=config.current.sched_interval_sec)])
+
+def _parse_profile(name: str, data: dict, allowed_cities: list[str]) -> PollProfile:
+    timezone = data.get("timezone")
+    windows = []
+    for i, w in enumerate(data.get("windows") or []):
+        wname = str(w.get("name") or f"w{i}")
+        interval = int(w.get("interval_sec") or 0)
+        if interval <= 0:
+            raise ValueError(f"{name}/{wname}: interval_sec должен быть > 0")
+        cron = w.get("cron") or None
+        if cron:
+            unknown = set(cron) - _CRON_FIELDS
+            if unknown:
+                raise ValueError(f"{name}/{wname}: неизвестные поля cron {sorted(unknown)}")
+            cron = {k: str(v) for k, v in cron.items()}
+            # проверка выражений - CronTrigger бросит ValueError
+            WindowTrigger(interval, cron, timezone)
+        cities = [str(c) for c in w.get("cities") or []]
+        bad = [c for c in cities if allowed_cities and c not in allowed_cities]
+        if bad:
+            raise ValueError(f"{name}/{wname}: города не из ALLOWED_CITIES: {', '.join(bad)}")
+        windows.append(PollWindow(name=wname, interval_sec=interval, cron=cron, cities=cities,
+                                  jitter_sec=max(0, int(w.get("jitter_sec", 60)))))
+    if not windows:
+        raise ValueError(f"{name}: нет ни одного окна")
+    if int(data.get("max_concurrent", 1)) > 1:
+        # все прогоны идут через один поток браузера - больше одного одновременно не бывает
+        log.warning("max_concurrent > 1 is not supported, using 1", extra={"profile": name})
+    return PollProfile(name=name, windows=windows, max_concurrent=1, timezone=timezone)
+
+def load_profiles(path: str = POLL_PROFILES_FILE,
+                  allowed_cities: Optional[list[str]] = None) -> tuple[dict[str, PollProfile], str]:
+    """
+    Профили из JSON-файла -> ({имя: профиль}, имя профиля по умолчанию).
+    Файл берётся из кеша app_config (без чтения с диска).
+    Нет файла - только профиль "default" с SCHED_INTERVAL_SEC. Ошибка в файле - ValueError.
+    """
+    text = config.text(path)
+    if text is None:
+        return {"default": default_profile()}, "default"
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{path}: {e}") from e
+
+    if allowed_cities is None:
+        allowed_cities = list(config.current.allowed_cities)
+    profiles = {name: _parse_profile(name, p, allowed_cities)
+                for name, p in (data.get("profiles") or {}).items()}
+    profiles.setdefault("default", default_profile())
+    default = data.get("default") or "default"
+    if default not in profiles:
+        raise ValueError(f"{path}: профиль по умолчанию '{default}' не описан")
+    return profiles, default
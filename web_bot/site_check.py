@@ -0,0 +1,64 @@
+import logging
+import time
+from typing import Optional
+
+import aiohttp
+from selenium.webdriver.common.by import By
+
+from web_bot.async_driver import WebDriverClient, WebDriverError, WebDriverTimeout, webdriver_client
+from web_bot.utils.utils import _JS_SCAN
+from web_bot.web_bot import LOGIN_URL, COOKIE_ACCEPT_ID, LOGIN_FORM_LOCATORS, locators_for
+
+log = logging.getLogger(__name__)
+
+async def check_site(client: Optional[WebDriverClient] = None, *, url: str = LOGIN_URL, timeout: float = 30) -> dict:
+    """
+    Шаг "open" сценария в отдельной браузерной сессии прямо из event loop (async_driver):
+    открыть страницу входа, принять cookies, дождаться формы входа, проверить капчу.
+    Поток браузера и его очередь команд не занимаются - проверку можно делать посреди прогона.
+    Возвращает {"ok", "url", "title", "login_form", "captcha", "elapsed_sec", "error"}.
+    """
+    client = client or webdriver_client
+    started = time.monotonic()
+    result = {"ok": False, "url": url, "title": "", "login_form": False, "captcha": False, "error": None}
+    try:
+        driver = await client.new_session()
+    except (WebDriverError, aiohttp.ClientError, TimeoutError) as e:
+        result["error"] = f"сессия не создана: {e}"
+        result["elapsed_sec"] = round(time.monotonic() - started, 1)
+        return result
+    try:
+        await driver.set_timeouts(page_load=timeout)
+        await driver.get(url)
+
+        # баннер cookies закрываем, если есть (как _click_if_visible в сценарии)
+        try:
+            banner = await driver.wait_for_element(By.ID, COOKIE_ACCEPT_ID, timeout=5, visible=True)
+            await banner.click()
+        except WebDriverError:
+            pass
+
+        locators = locators_for("login_form", LOGIN_FORM_LOCATORS)
+
+        async def login_form(d):
+            for by, value in locators:
+                if await d.find_elements(by, value):
+                    return True
+            return False
+
+        try:
+            result["login_form"] = await driver.wait_until(login_form, timeout=timeout)
+        except WebDriverTimeout:
+            pass
+        scan = await driver.execute_script(_JS_SCAN)
+        result["captcha"] = bool(isinstance(scan, dict) and scan.get("captcha"))
+        result["url"] = await driver.current_url()
+        result["title"] = await driver.title()
+        result["ok"] = result["login_form"] and not result["captcha"]
+    except (WebDriverError, aiohttp.ClientError, TimeoutError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        await driver.quit()
+    result["elapsed_sec"] = round(time.monotonic() - started, 1)
+    log.info("site check", extra={k: v for k, v in result.items() if k != "title"})
+    return result
@@ -0,0 +1,61 @@
+import re
+from datetime import date
+
+# даты на сайте в европейском формате: 25-11-2025, 25/11/2025, 25.11.2025; плюс ISO 2025-11-25
+_DATE_DMY = re.compile(r"\b(\d{1,2})[./-](\d{1,2})[./-](\d{4})\b")
+_DATE_ISO = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_TIME = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_COUNT = re.compile(r"\b(\d+)\s+(?:available\s+)?(?:slots?|appointments?|слот\w*|мест\w*)\b", re.IGNORECASE)
+
+# ключ "слоты есть, но разобрать не удалось" - чтобы о таком писать один раз, а не каждый прогон
+UNKNOWN_SLOT = "?"
+
+def _iso(y: int, m: int, d: int) -> str | None:
+    try:
+        return date(y, m, d).isoformat()
+    except ValueError:
+        return None
+
+def parse_availability(lines: list[str]) -> dict:
+    """Даты, время и количество слотов из текстов страницы (alert'ы, строки со словами slot/available)."""
+    dates, times, counts = set(), set(), []
+    for line in lines or []:
+        line = line or ""
+        for m in _DATE_ISO.finditer(line):
+            iso = _iso(int(m[1]), int(m[2]), int(m[3]))
+            if iso:
+                dates.add(iso)
+        for m in _DATE_DMY.finditer(line):
+            iso = _iso(int(m[3]), int(m[2]), int(m[1]))
+            if iso:
+                dates.add(iso)
+        for m in _TIME.finditer(line):
+            times.add(f"{int(m[1]):02d}:{m[2]}")
+        counts += [int(m[1]) for m in _COUNT.finditer(line)]
+    return {
+        "dates": sorted(dates),
+        "times": sorted(times),
+        "count": max(counts) if counts else None,
+    }
+
+def slot_keys(availability: dict[str, dict] | None) -> set[str]:
+    """
+    Плоское множество слотов по категориям: "SEAMEN 2025-11-25", "SEAMEN 10:30", "SEAMEN count=3".
+    Пустая разборка при найденных слотах даёт "<категория> ?".
+    """
+    keys = set()
+    for category, av in (availability or {}).items():
+        items = [*(av.get("dates") or []), *(av.get("times") or [])]
+        if av.get("count") is not None:
+            items.append(f"count={av['count']}")
+        for item in items or [UNKNOWN_SLOT]:
+            keys.add(f"{category} {item}")
+    return keys
+
+def describe(keys: set[str], limit: int = 10) -> str:
+    """Список новых слотов для текста уведомления."""
+    items = sorted(keys)
+    text = "\n".join(f"• {k}" for k in items[:limit] if not k.endswith(" " + UNKNOWN_SLOT))
+    if len(items) > limit:
+        text += f"\n… и ещё {len(items) - limit}"
+    return text
@@ -1,3 +1,4 @@
+import re
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import StaleElementReferenceException, WebDriverException
 
@@ -295,3 +296,181 @@ def has_captcha(driver) -> bool:
 def has_cookie_banner(driver) -> bool:
     """True, если на странице виден баннер согласия с cookies (CMP/ GDPR-диалог)."""
     return _scan(driver)['cookie']
+
+# Снимок light DOM одним вызовом: формы, поля, кнопки, алерты и mat-select
+# с видимостью, доступностью, текстом и ссылками на элементы
+_JS_DOM_SNAPSHOT = r"""
+return (function () {
+  function isVisible(el) {
+    const style = window.getComputedStyle(el);
+    if (style.visibility === 'hidden' || style.display === 'none') return false;
+    const r = el.getBoundingClientRect();
+    return (r.width || 0) > 0 && (r.height || 0) > 0;
+  }
+  const forms = Array.from(document.forms);
+  function node(el) {
+    const f = el.closest('form');
+    const ariaDisabled = el.getAttribute('aria-disabled');
+    const type = (el.getAttribute('type') || '').toLowerCase();
+    // у полей ввода текст - только подпись кнопки, значения (пароль) не отдаём
+    const raw = el.tagName === 'INPUT'
+      ? (type === 'submit' || type === 'button' ? el.value : '')
+      : (el.innerText || el.textContent);
+    return {
+      el: el,
+      tag: el.tagName.toLowerCase(),
+      type: type,
+      id: el.id || '',
+      name: el.getAttribute('name') || '',
+      placeholder: el.getAttribute('placeholder') || '',
+      formcontrol: el.getAttribute('formcontrolname') || '',
+      text: (raw || '').trim().replace(/\s+/g, ' ').slice(0, 200),
+      visible: isVisible(el),
+      enabled: !el.disabled && ariaDisabled !== 'true',
+      form: f ? forms.indexOf(f) : -1,
+    };
+  }
+  const q = (sel) => Array.from(document.querySelectorAll(sel)).map(node);
+  return {
+    url: location.href,
+    forms: forms.map(node),
+    inputs: q('input:not([type=hidden]), textarea'),
+    buttons: q('button, input[type=submit], input[type=button], a[role=button], [role=button]'),
+    alerts: q("div[role='alert'], .alert, .alert-info, .alert-info-blue"),
+    selects: q('mat-select, select'),
+  };
+})();
+"""
+
+class DomSnapshot:
+    """
+    Результат одного JS-вызова dom_snapshot(): дальнейшие выборки идут локально,
+    без find_element / is_displayed / is_enabled на каждого кандидата.
+    Элементы - словари с полями из _JS_DOM_SNAPSHOT, в поле 'el' лежит WebElement.
+    """
+    KINDS = ("forms", "inputs", "buttons", "alerts", "selects")
+
+    def __init__(self, data: dict | None):
+        data = data if isinstance(data, dict) else {}
+        self.url = data.get("url") or ""
+        self._nodes = {kind: list(data.get(kind) or []) for kind in self.KINDS}
+
+    def find(self, kind: str, *, id: str | None = None, types: tuple | None = None,
+             form: int | None = None, text_contains: str | None = None,
+             visible: bool | None = True, enabled: bool | None = True, **attrs) -> list[dict]:
+        """Фильтр по полям снимка; visible/enabled=None - не проверять."""
+        needle = text_contains.lower() if text_contains else None
+        out = []
+        for n in self._nodes.get(kind, ()):
+            if id is not None and n.get("id") != id:
+                continue
+            if types is not None and n.get("type") not in types:
+                continue
+            if form is not None and n.get("form") != form:
+                continue
+            if visible is not None and bool(n.get("visible")) != visible:
+                continue
+            if enabled is not None and bool(n.get("enabled")) != enabled:
+                continue
+            if needle and needle not in (n.get("text") or "").lower():
+                continue
+            if any(n.get(k) != v for k, v in attrs.items()):
+                continue
+            out.append(n)
+        return out
+
+    def first(self, kind: str, **filters):
+        """WebElement первого подходящего узла или None."""
+        found = self.find(kind, **filters)
+        return found[0]["el"] if found else None
+
+    def node_of(self, element) -> dict | None:
+        """Узел снимка по WebElement (сравнение по id элемента Selenium)."""
+        key = getattr(element, "id", None)
+        for nodes in self._nodes.values():
+            for n in nodes:
+                if getattr(n.get("el"), "id", None) == key:
+                    return n
+        return None
+
+def dom_snapshot(driver) -> DomSnapshot:
+    """Снять DomSnapshot текущего документа (пустой снимок, если скрипт не выполнился)."""
+    try:
+        return DomSnapshot(driver.execute_script(_JS_DOM_SNAPSHOT))
+    except WebDriverException:
+        return DomSnapshot(None)
+
+# Поиск фраз по видимому тексту всего дерева: документ, открытые shadowRoot
+# и same-origin iframe (рекурсивно). Текст каждого корня берётся один раз,
+# проверка - одним регулярным выражением (arguments[0]).
+_JS_FIND_PHRASE = r"""
+const re = new RegExp(arguments[0], 'i');
+function textOf(root) {
+  if (root.body !== undefined) return root.body ? (root.body.innerText || '') : '';
+  const parts = [];
+  for (const ch of root.children) parts.push(ch.innerText || ch.textContent || '');
+  return parts.join('\n');
+}
+function scan(root, path) {
+  const text = textOf(root).replace(/\s+/g, ' ');
+  const m = re.exec(text);
+  if (m) {
+    return {
+      phrase: m[0].toLowerCase(),
+      location: path,
+      snippet: text.slice(Math.max(0, m.index - 60), m.index + m[0].length + 60).trim(),
+    };
+  }
+  for (const host of root.querySelectorAll('*')) {
+    if (!host.shadowRoot) continue;
+    const r = scan(host.shadowRoot, path + ' > ' + host.tagName.toLowerCase() + '::shadow');
+    if (r) return r;
+  }
+  const frames = root.querySelectorAll('iframe, frame');
+  for (let i = 0; i < frames.length; i++) {
+    let doc = null;
+    try { doc = frames[i].contentDocument; } catch (e) {}  // cross-origin - пропускаем
+    if (!doc) continue;
+    const r = scan(doc, path + ' > iframe[' + i + ']' + (frames[i].id ? '#' + frames[i].id : ''));
+    if (r) return r;
+  }
+  return null;
+}
+return scan(document, 'document');
+"""
+
+def compile_phrases(phrases) -> str:
+    """
+    Один шаблон на все фразы (длинные раньше коротких, пробелы - любые пробельные символы).
+    Синтаксис общий для python re и JS RegExp.
+    """
+    uniq = sorted({" ".join(p.lower().split()) for p in phrases if p and p.strip()}, key=len, reverse=True)
+    return "|".join(r"\s+".join(re.escape(w) for w in p.split()) for p in uniq)
+
+def find_phrase(driver, pattern: str) -> dict | None:
+    """
+    {'phrase', 'location', 'snippet'} первого совпадения pattern (см. compile_phrases)
+    в видимом тексте страницы, её shadow DOM и доступных iframe; None - не найдено.
+    """
+    if not pattern:
+        return None
+    try:
+        res = driver.execute_script(_JS_FIND_PHRASE, pattern)
+    except WebDriverException:
+        return None
+    return res if isinstance(res, dict) else None
+
+# Видимые строки страницы, похожие на информацию о слотах (для разбора дат/времени)
+_JS_AVAILABILITY_LINES = r"""
+const re = /slot|available|availability|earliest|appointment|слот|дата|запис/i;
+const text = document.body ? (document.body.innerText || '') : '';
+return text.split('\n').map(s => s.trim()).filter(s => s && s.length < 400 && re.test(s)).slice(0, 50);
+"""
+
+def availability_lines(driver) -> list[str]:
+    """Строки видимого текста со словами slot/available/earliest и т.п."""
+    try:
+        res = driver.execute_script(_JS_AVAILABILITY_LINES)
+    except WebDriverException:
+        return []
+    return [str(s) for s in res] if isinstance(res, list) else []
@@ -1,5 +1,6 @@
-import threading, queue, traceback, time
+import threading, queue, logging, time, re
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Any, Callable, Optional
 import asyncio
 
@@ -14,14 +15,30 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import ElementClickInterceptedException, TimeoutException
 
 
-from web_bot.utils.utils import get_inputs, get_buttons, has_captcha, has_cookie_banner
+from web_bot.utils.utils import get_inputs, get_buttons, has_captcha, has_cookie_banner, dom_snapshot, \
+    compile_phrases, find_phrase, availability_lines
 from web_bot.utils.actions import input_login, input_password, press_button
+from web_bot.locators import LocatorRegistry
+from web_bot.slots import parse_availability
+from web_bot.artifacts import artifact_store
+from app_logging import job_context, job_id_var
+from app_config import config
 
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
+log = logging.getLogger(__name__)
+
 WEBDRIVER_URL = os.getenv("WEBDRIVER_URL", "http://localhost:4444")
+LOGIN_URL = "https://visa.vfsglobal.com/rus/en/nld/login"
+COOKIE_ACCEPT_ID = "onetrust-accept-btn-handler"
+# пауза для админа (captcha/new_tab) паркует сессию браузера: сколько ждать /continue и сколько
+# сессий держать в стороне одновременно (Selenium должен разрешать PARK_MAX + 2 сессий с /site_check, SE_NODE_MAX_SESSIONS)
+PARK_TIMEOUT_SEC = int(os.getenv("PARK_TIMEOUT_SEC", "900"))
+PARK_MAX = int(os.getenv("PARK_MAX", "1"))
+# как часто трогать отложенную сессию, чтобы Selenium не закрыл её по SE_NODE_SESSION_TIMEOUT (300 с по умолчанию)
+PARK_KEEPALIVE_SEC = int(os.getenv("PARK_KEEPALIVE_SEC", "60"))
 
 NO_SLOTS_PHRASES = [
     "no appointment slots are currently available",
@@ -31,30 +48,118 @@ NO_SLOTS_PHRASES = [
     "slots are currently unavailable",
 ]
 
+# те же сообщения на других языках сайта; NO_SLOTS_LOCALES выбирает, какие проверять
+NO_SLOTS_LOCALE_PHRASES = {
+    "ru": [
+        "нет доступных слотов",
+        "нет свободных слотов",
+        "нет доступных дат",
+        "свободных мест для записи нет",
+    ],
+    "nl": [
+        "geen afspraken beschikbaar",
+        "er zijn momenteel geen afspraken beschikbaar",
+    ],
+}
+
+@lru_cache(maxsize=4)
+def _no_slots_pattern(phrases: tuple, locales: tuple, extra: tuple) -> tuple[str, re.Pattern]:
+    pattern = compile_phrases(
+        list(phrases)
+        + [p for loc in locales for p in NO_SLOTS_LOCALE_PHRASES.get(loc, [])]
+        + list(extra)
+    )
+    return pattern, re.compile(pattern, re.IGNORECASE)
+
+def no_slots_pattern() -> tuple[str, re.Pattern]:
+    """
+    Общий шаблон "нет слотов" по текущим настройкам (app_config): английские фразы
+    (или no_slots.phrases из файла), локали NO_SLOTS_LOCALES и NO_SLOTS_EXTRA.
+    Пересобирается только когда настройки меняются.
+    """
+    cfg = config.current
+    phrases = NO_SLOTS_PHRASES if cfg.no_slots_phrases is None else cfg.no_slots_phrases
+    return _no_slots_pattern(tuple(phrases), cfg.no_slots_locales, cfg.no_slots_extra)
+
+# альтернативные локаторы одного элемента - порядок попыток выбирает LocatorRegistry
+LOGIN_FORM_LOCATORS = [
+    (By.ID, "email"),
+    (By.ID, "password"),
+    (By.ID, "username"),  # не используем, но для надёжности
+]
+START_NEW_BOOKING_LOCATORS = [
+    (By.XPATH, "//a[@id='start_new_booking' or contains(@id,'start_new_booking')]"),
+    (By.XPATH, "//button[.//span[normalize-space()='Start New Booking'] or contains(normalize-space(), 'Start New Booking')]"),
+    (By.XPATH, "//a[.//span[normalize-space()='Start New Booking'] or contains(normalize-space(), 'Start New Booking')]"),
+    (By.XPATH, "//*[self::button or self::a][contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'),'START NEW BOOKING')]"),
+]
+
+def locators_for(group: str, default: list) -> list:
+    """Локаторы группы: из app_config (locators.<group>), если заданы, иначе встроенные."""
+    return config.current.locators.get(group) or default
+
 @dataclass
 class Command:
     name: str
     args: tuple
     kwargs: dict
     future: asyncio.Future  # future из event loop'а async-части
+    job_id: Optional[str] = None  # id прогона для логов (app_logging.job_id_var)
+
+@dataclass
+class ParkedJob:
+    """Прогон, остановленный паузой для админа: сессия браузера отложена до /continue."""
+    park_id: str
+    kind: str                 # captcha / new_tab
+    name: str                 # команда, которую продолжим
+    kwargs: dict
+    resume_at: str            # шаг сценария, с которого продолжить
+    driver: Any
+    url: str = ""
+    job_id: Optional[str] = None
+    parked_at: float = 0.0
+    deadline: float = 0.0
+    session_started: float = 0.0
+    last_keepalive: float = 0.0
+
+    def info(self) -> dict:
+        """Без драйвера и данных формы - для контроллера и админа."""
+        return {"park_id": self.park_id, "kind": self.kind, "url": self.url, "job_id": self.job_id,
+                "city": (self.kwargs.get("form_data") or {}).get("city"),
+                "parked_at": self.parked_at, "deadline": self.deadline}
+
+class JobParked(Exception):
+    """Сценарий дошёл до паузы: сессия отложена, поток свободен для других команд."""
+    def __init__(self, park: ParkedJob):
+        super().__init__(f"parked: {park.kind}")
+        self.park = park
 
 class BotThread:
     def __init__(self, loop: asyncio.AbstractEventLoop,
-                 notify: Optional[Callable[[dict], None]] = None,
-                 resume_evt: Optional[threading.Event] = None):
+                 notify: Optional[Callable[[dict], None]] = None):
         self._loop = loop                      # event loop async-части
         self._q: "queue.Queue[Command]" = queue.Queue()
         self._stop_evt = threading.Event()
         self._thread = threading.Thread(target=self._run, daemon=True)
+        self._current: Optional[Command] = None  # команда, которая выполняется сейчас
         self._driver: Optional[webdriver.Remote] = None
-
-        # куда отправлять статусы и где хранить события-паузы (задаем в controller)
+        self._driver_started = 0.0               # когда открыта активная сессия браузера
+        self._step: Optional[str] = None         # шаг сценария текущей команды (для панели статуса)
+        self._step_at = 0.0
+        # сессии, отложенные паузой для админа: park_id -> ParkedJob (только этот поток)
+        self._parked: dict[str, ParkedJob] = {}
+        self._park_seq = 0
+
+        # куда отправлять статусы (задаем в controller)
         self._notify = notify or (lambda e: None) #функция уведомлений
-        self._resume_evt = resume_evt or threading.Event()  # NEW
+
+        # рейтинг локаторов (статистика в БД, пишется через event loop)
+        self._locators = LocatorRegistry(loop)
 
         # обработчики команд
         self._handlers: dict[str, Callable[..., Any]] = {
-            "test_vfs": self._handle_test_vfs
+            "test_vfs": self._handle_test_vfs,
+            "resume": self._handle_resume,
         }
 
     # ---- публичные методы ----
@@ -72,66 +177,171 @@ class BotThread:
         которое можно await-ить, чтобы получить результат/ошибку.
         """
         fut = self._loop.create_future()
-        cmd = Command(name=name, args=args, kwargs=kwargs, future=fut)
+        cmd = Command(name=name, args=args, kwargs=kwargs, future=fut, job_id=job_id_var.get())
         self._q.put(cmd)
         return fut
 
+    def status(self) -> dict:
+        """Снимок для панели статуса админа; читается из event loop без блокировок."""
+        cmd, now = self._current, time.time()
+        form = (cmd.kwargs.get("form_data") or {}) if cmd else {}
+        return {
+            "alive": self._thread.is_alive(),
+            "command": cmd.name if cmd else None,
+            "city": form.get("city") or (cmd.kwargs.get("city") if cmd else None),
+            "step": self._step if cmd else None,
+            "step_sec": round(now - self._step_at) if cmd and self._step else None,
+            "step_at": self._step_at if cmd and self._step else None,
+            "queue": self._q.qsize(),
+            "session_age_sec": round(now - self._driver_started) if self._driver else None,
+            "session_started": self._driver_started if self._driver else None,
+            "parked": len(self._parked),
+        }
+
+    def pending(self) -> list[Command]:
+        """Текущая и ожидающие команды (для чекпоинта контроллера)."""
+        with self._q.mutex:
+            queued = [c for c in self._q.queue if c is not None]
+        current = self._current
+        return ([current] if current else []) + queued
+
     # ---- внутренняя жизнь потока ----
     def _run(self):
         try:
             self._setup_bot()
             while not self._stop_evt.is_set():
-                cmd = self._q.get()
+                try:
+                    # просыпаемся раз в секунду, чтобы снимать просроченные парковки
+                    cmd = self._q.get(timeout=1.0)
+                except queue.Empty:
+                    self._expire_parked()
+                    continue
                 if cmd is None:  # сигнал остановки
                     break
+                self._expire_parked()
                 self._dispatch(cmd)
+        except Exception:
+            log.exception("bot thread crashed")
         finally:
             self._teardown_bot()
 
     def _setup_bot(self):
-        """Создаём один Remote WebDriver в этом потоке и переиспользуем между задачами."""
+        """Создаём Remote WebDriver в этом потоке и переиспользуем между задачами."""
+        self._driver = self._new_driver()
+        self._driver_started = time.time()
+        self._locators.load()
+
+    @staticmethod
+    def _new_driver() -> webdriver.Remote:
         opts = Options()
         opts.add_argument("--disable-blink-features=AutomationControlled")
+        # лог консоли браузера для артефактов падений
+        opts.set_capability("goog:loggingPrefs", {"browser": "ALL"})
 
-        self._driver = webdriver.Remote(
+        driver = webdriver.Remote(
             command_executor=WEBDRIVER_URL,
             options=opts,
         )
+        log.info("webdriver session started", extra={"webdriver_url": WEBDRIVER_URL})
+        return driver
 
-    def _pause_for_admin(self, kind: str, message: str):
-        """Блокирует поток до тех пор, пока контроллер не снимет паузу через /continue)."""
-        # чтобы более ранний /continue не считался
-        self._resume_evt.clear()
+    def _ensure_driver(self):
+        """После парковки активной сессии нет - открываем новую под следующую команду."""
+        if self._driver is None:
+            self._driver = self._new_driver()
+            self._driver_started = time.time()
+
+    @staticmethod
+    def _quit(driver):
+        try:
+            driver.quit()
+        except Exception:
+            log.exception("webdriver quit failed")
+
+    def _pause_for_admin(self, kind: str, message: str, *, resume_at: str):
+        """
+        Пауза до /continue без блокировки потока: текущая сессия браузера паркуется
+        на PARK_TIMEOUT_SEC, команда завершается JobParked, поток берёт следующую
+        команду в новой сессии. /continue продолжает прогон с шага resume_at.
+        """
+        cmd = self._current
+        if cmd is None:
+            raise RuntimeError("pause outside of a command")
+        if len(self._parked) >= PARK_MAX:
+            # мест нет - прогон завершается ошибкой, но поток не зависает
+            raise RuntimeError(f"Пауза ({kind}) невозможна: уже отложено {len(self._parked)} сессий, ждут /continue")
 
-        # отправим уведомление админу
         url = ""
         try:
             if self._driver:
                 url = self._driver.current_url
         except Exception:
             pass
-        self._notify({"type": kind, "message": message, "url": url})
-
-        # ждём снятия паузы
-        self._resume_evt.wait()
+        self._park_seq += 1
+        now = time.time()
+        park = ParkedJob(park_id=str(self._park_seq), kind=kind, name=cmd.name, kwargs=dict(cmd.kwargs),
+                         resume_at=resume_at, driver=self._driver, url=url, job_id=cmd.job_id,
+                         parked_at=now, deadline=now + PARK_TIMEOUT_SEC, session_started=self._driver_started,
+                         last_keepalive=now)
+        self._parked[park.park_id] = park
+        self._driver = None
+
+        log.warning("paused for admin: %s", kind, extra={"url": url, "park_id": park.park_id, "resume_at": resume_at})
+        hint = f"/continue {park.park_id}" if len(self._parked) > 1 else "/continue"
+        self._notify({"type": kind, "message": f"{message}\nПрогон отложен ({hint}, ждёт до {PARK_TIMEOUT_SEC} с).",
+                      "url": url, "park_id": park.park_id})
+        raise JobParked(park)
+
+    def _expire_parked(self):
+        now = time.time()
+        for park in [p for p in self._parked.values() if p.deadline <= now]:
+            del self._parked[park.park_id]
+            self._quit(park.driver)
+            log.warning("parked job expired", extra={"park_id": park.park_id, "kind": park.kind,
+                                                     "waited_sec": round(now - park.parked_at)})
+            self._notify({"type": "park_expired", **park.info(), "waited_sec": round(now - park.parked_at),
+                          "message": f"Отложенный прогон {park.park_id} ({park.kind}) не дождался /continue и закрыт."})
+        for park in self._parked.values():
+            if PARK_KEEPALIVE_SEC > 0 and now - park.last_keepalive >= PARK_KEEPALIVE_SEC:
+                park.last_keepalive = now
+                try:
+                    park.driver.current_url  # любая команда сбрасывает таймер простоя сессии в Selenium
+                except Exception:
+                    log.warning("parked session keepalive failed", extra={"park_id": park.park_id}, exc_info=True)
 
     def _teardown_bot(self):
-        try:
-            if self._driver:
-                self._driver.quit()
-                pass
-        except Exception:
-            traceback.print_exc()
+        for park in self._parked.values():
+            self._quit(park.driver)
+        self._parked.clear()
+        if self._driver:
+            self._quit(self._driver)
+            self._driver = None
+
+    def _set_step(self, step: str):
+        self._step, self._step_at = step, time.time()
 
     def _dispatch(self, cmd: Command):
+        self._current = cmd
+        self._set_step("start")
         try:
             handler = self._handlers[cmd.name]
-            result = handler(*cmd.args, **cmd.kwargs)
+            # логи шагов браузера - с job_id прогона, который прислал команду
+            with job_context(cmd.job_id):
+                if cmd.name != "resume":
+                    self._ensure_driver()
+                result = handler(*cmd.args, **cmd.kwargs)
+        except JobParked as e:
+            # прогон не упал - ждёт админа; контроллер узнаёт park_id из результата
+            result = {"ok": False, "url": e.park.url, "message": f"paused: {e.park.kind}", "parked": e.park.info()}
+            self._loop.call_soon_threadsafe(cmd.future.set_result, result)
         except Exception as e:
             # результат в event loop'е async-части:
             self._loop.call_soon_threadsafe(cmd.future.set_exception, e)
         else:
             self._loop.call_soon_threadsafe(cmd.future.set_result, result)
+        finally:
+            self._current = None
+            self._step = None
 
     # ---- обработчики команд ----
     @staticmethod        
@@ -319,81 +529,52 @@ class BotThread:
         )
 
     def _match_no_slots(self, txt: str) -> bool:
-        t = (txt or "").strip().lower()
-        return any(p in t for p in NO_SLOTS_PHRASES)
+        return bool(no_slots_pattern()[1].search(" ".join((txt or "").split())))
 
-    def _has_no_slots_alert(self) -> bool:
+    def _find_no_slots(self) -> dict | None:
         """
-        True, если на странице есть информация об отсутствии окон для записи
+        Сообщение об отсутствии окон для записи: {'phrase', 'location', 'snippet'} или None.
+        Один скрипт проверяет видимый текст документа, shadow DOM и same-origin iframe.
         """
         d = self._driver
         if not d:
-            return False
-
-        def check_current_context() -> bool:
-            # 1) подождём рендер (иногда alert грузится ajax'ом)
-            try:
-                WebDriverWait(d, 3).until(
-                    lambda x: x.execute_script("return document.readyState") == "complete"
-                )
-            except Exception:
-                pass
-
-            # 2) сначала попробуем типичные alert-контейнеры
-            try:
-                candidates = d.find_elements(
-                    By.CSS_SELECTOR,
-                    "div[role='alert'], .alert, .alert-info, .alert-info-blue"
-                )
-            except Exception:
-                candidates = []
-
-            for el in candidates:
-                # a) Selenium .text
-                if self._match_no_slots(el.text):
-                    return True
-                # b) textContent (часто спасает)
-                try:
-                    if self._match_no_slots(el.get_attribute("textContent")):
-                        return True
-                except Exception:
-                    pass
-
-            # 3) глобальный поиск по всему DOM
-            try:
-                nodes = d.find_elements(
-                    By.XPATH,
-                    "//*[contains(translate(normalize-space(string(.)),"
-                    "'ABCDEFGHIJKLMNOPQRSTUVWXYZ','abcdefghijklmnopqrstuvwxyz'),"
-                    "'no appointment slots')]"
-                )
-                if nodes:
-                    return True
-            except Exception:
-                pass
-
-            return False
+            return None
 
+        # подождём рендер (иногда alert грузится ajax'ом)
         try:
-            # Текущий документ
-            if check_current_context():
-                return True
-
-            # Проверим все iframe
-            frames = d.find_elements(By.CSS_SELECTOR, "iframe")
-            for fr in frames:
-                try:
-                    d.switch_to.frame(fr)
-                    if check_current_context():
-                        return True
-                finally:
-                    d.switch_to.parent_frame()
+            WebDriverWait(d, 3).until(
+                lambda x: x.execute_script("return document.readyState") == "complete"
+            )
         except Exception:
             pass
 
-        return False
+        return find_phrase(d, no_slots_pattern()[0])
 
-    def _handle_test_vfs(self, *, form_data: dict = {'email': '123', 'password': '123', 'city': 'Moscow'}):
+    def _has_no_slots_alert(self) -> bool:
+        """
+        True, если на странице есть информация об отсутствии окон для записи
+        """
+        return self._find_no_slots() is not None
+
+    def _handle_resume(self, *, park_id: str, city: Optional[str] = None):
+        """/continue: отложенная сессия снова становится активной, сценарий идёт с шага паузы."""
+        park = self._parked.pop(park_id, None)
+        if park is None:
+            raise RuntimeError(f"Отложенного прогона {park_id} нет (истёк или уже продолжен)")
+        if self._driver is not None:
+            # сессия, открытая на время парковки, больше не нужна
+            self._quit(self._driver)
+        self._driver = park.driver
+        self._driver_started = park.session_started
+        log.info("parked job resumed", extra={"park_id": park_id, "resume_at": park.resume_at,
+                                              "waited_sec": round(time.time() - park.parked_at)})
+        # повторная пауза в продолженном прогоне паркует исходную команду
+        self._current = Command(name=park.name, args=(), kwargs=park.kwargs,
+                                future=self._current.future, job_id=park.job_id)
+        return self._handlers[park.name](**park.kwargs, resume_at=park.resume_at)
+
+    def _handle_test_vfs(self, *, form_data: dict = {'email': '123', 'password': '123', 'city': 'Moscow'},
+                         resume_at: Optional[str] = None):
         if self._driver is None:
             raise RuntimeError("WebDriver not initialized")
 
@@ -407,67 +588,56 @@ class BotThread:
         email_or_username = form_data.get("email") or form_data.get("username") or form_data.get("login") or ""
         password = form_data.get("password") or ""
 
-        try:
-            LOGIN_URL = "https://visa.vfsglobal.com/rus/en/nld/login"
-
-            # 1) первый заход именно на /login и принятие cookies
-            driver.get(LOGIN_URL)
-            self._click_if_visible(driver, By.ID, "onetrust-accept-btn-handler", timeout=5)
+        # шаг сценария: паузы паркуют прогон, /continue продолжает с resume_at
+        step = resume_at or "open"
 
-            self._pause_for_admin("new_tab", "Зайди на сайт через другую вкладку и нажми /continue")
-
-            # после /continue
-            for h in driver.window_handles:
-                driver.switch_to.window(h)
-                try:
-                    if "/login" in driver.current_url:
-                        break
-                except Exception:
-                    continue
+        try:
+            if step == "open":
+                # 1) первый заход именно на /login и принятие cookies
+                self._set_step("open")
+                driver.get(LOGIN_URL)
+                log.info("login page opened", extra={"url": LOGIN_URL})
+                self._click_if_visible(driver, By.ID, COOKIE_ACCEPT_ID, timeout=5)
+
+                self._pause_for_admin("new_tab", "Зайди на сайт через другую вкладку и нажми /continue",
+                                      resume_at="login_form")
+
+            if step == "login_form":
+                # после /continue
+                self._set_step("login_form")
+                for h in driver.window_handles:
+                    driver.switch_to.window(h)
+                    try:
+                        if "/login" in driver.current_url:
+                            break
+                    except Exception:
+                        continue
 
 
-            # ждём появления хотя бы одного поля из логин-формы
-            wait.until(
-                EC.any_of(
-                    EC.presence_of_element_located((By.ID, "email")),
-                    EC.presence_of_element_located((By.ID, "password")),
-                    EC.presence_of_element_located((By.ID, "username"))  # не используем, но для надёжности
-                )
-            )
+                # ждём появления хотя бы одного поля из логин-формы
+                self._locators.find(driver, "login_form", locators_for("login_form", LOGIN_FORM_LOCATORS), timeout=30)
 
-            # cookie banner закрываем, если есть
-            self._click_if_visible(driver, By.ID, "onetrust-accept-btn-handler", timeout=5)
+                # cookie banner закрываем, если есть
+                self._click_if_visible(driver, By.ID, COOKIE_ACCEPT_ID, timeout=5)
 
-            # если всплыла капча - ставим паузу
-            if has_captcha(driver):
-                self._pause_for_admin("captcha", "Обнаружена капча — реши её, пришли /continue - вход продолжится и нажмется Login.")
+                # если всплыла капча - ставим паузу
+                if has_captcha(driver):
+                    self._pause_for_admin("captcha", "Обнаружена капча — реши её, пришли /continue - вход продолжится и нажмется Login.",
+                                          resume_at="login")
 
             check_cancel()
+            self._set_step("login")
 
-            # берём только видимые поля
-            email_input = None
-            pwd_input = None
-            try:
-                cand = driver.find_element(By.ID, "email")
-                if cand.is_displayed() and cand.is_enabled():
-                    email_input = cand
-            except Exception:
-                pass
-
-            try:
-                cand = driver.find_element(By.ID, "password")
-                if cand.is_displayed() and cand.is_enabled():
-                    pwd_input = cand
-            except Exception:
-                pass
+            # берём только видимые поля: один снимок DOM вместо find/is_displayed на каждого кандидата
+            snap = dom_snapshot(driver)
+            email_input = snap.first("inputs", id="email")
+            pwd_input = snap.first("inputs", id="password")
 
             # фолбэки (если id поменяли)
             if email_input is None:
-                vis_texts = [el for el in driver.find_elements(By.CSS_SELECTOR, "input[type='text'], input[type='email']") if el.is_displayed() and el.is_enabled()]
-                email_input = vis_texts[0] if vis_texts else None
+                email_input = snap.first("inputs", types=("text", "email"))
             if pwd_input is None:
-                vis_pwds = [el for el in driver.find_elements(By.CSS_SELECTOR, "input[type='password']") if el.is_displayed() and el.is_enabled()]
-                pwd_input = vis_pwds[0] if vis_pwds else None
+                pwd_input = snap.first("inputs", types=("password",))
 
             if not email_input or not pwd_input:
                 raise RuntimeError("Не нашли видимые поля логина/пароля (возможно, мешает баннер или другая модалка).")
@@ -478,18 +648,20 @@ class BotThread:
             self._fill_visible(email_input, email_or_username)
             self._fill_visible(pwd_input, password)
 
-            # ищем submit-кнопку в ближайшей форме
-            form_el = self._closest_form(driver, pwd_input) or self._closest_form(driver, email_input)
+            # ищем submit-кнопку в ближайшей форме (новый снимок - кнопка могла включиться после ввода)
+            snap = dom_snapshot(driver)
+            submit_types = ("submit",)
             submit_btn = None
-            if form_el:
-                try:
-                    submit_btn = self._first_visible_enabled(form_el, By.CSS_SELECTOR, "button[type='submit'], input[type='submit']")
-                except Exception:
-                    submit_btn = None
+            for field in (pwd_input, email_input):
+                node = snap.node_of(field)
+                if node and node.get("form", -1) >= 0:
+                    submit_btn = snap.first("buttons", types=submit_types, form=node["form"])
+                    if submit_btn is not None:
+                        break
 
             # фолбэк: первый видимый enabled submit на странице
             if submit_btn is None:
-                submit_btn = self._first_visible_enabled(driver, By.CSS_SELECTOR, "button[type='submit'], input[type='submit']")
+                submit_btn = snap.first("buttons", types=submit_types)
 
             if submit_btn is None:
                 # иногда кнопку активируют только после blur - отдадим enter
@@ -500,41 +672,35 @@ class BotThread:
                 # ждём, пока она действительно станет enabled
                 self._wait_enabled_clickable(driver, submit_btn, timeout=10)
                 submit_btn.click()
+            log.info("login submitted", extra={"via": "button" if submit_btn is not None else "enter"})
 
             # Можно дождаться смены URL или появления индикатора ошибки
             time.sleep(5)
             # --- нажать кнопку "Start New Booking" после логина ---
 
-            # пробуем наиболее надёжные локаторы по очереди
-            clicked = False
-            for locator in [
-                (By.XPATH, "//a[@id='start_new_booking' or contains(@id,'start_new_booking')]"),
-                (By.XPATH, "//button[.//span[normalize-space()='Start New Booking'] or contains(normalize-space(), 'Start New Booking')]"),
-                (By.XPATH, "//a[.//span[normalize-space()='Start New Booking'] or contains(normalize-space(), 'Start New Booking')]"),
-                (By.XPATH, "//*[self::button or self::a][contains(translate(., 'abcdefghijklmnopqrstuvwxyz', 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'),'START NEW BOOKING')]"),
-            ]:
+            # локаторы по очереди от лучшего по истории, короткими попытками
+            self._set_step("start_new_booking")
+            try:
+                el, locator = self._locators.find(
+                    driver, "start_new_booking", locators_for("start_new_booking", START_NEW_BOOKING_LOCATORS), timeout=30,
+                    condition=lambda e: e.is_displayed() and e.is_enabled(),
+                )
+            except TimeoutError:
+                raise RuntimeError("Не удалось найти кнопку 'Start New Booking'.")
+
+            # доводим до кликабельности/активности
+            self._wait_enabled_clickable(driver, el, timeout=10)
+            try:
+                el.click()
+            except Exception:
+                # скролл к элементу и JS-клик как фолбэк
+                driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
                 try:
-                    el = wait.until(EC.presence_of_element_located(locator))
-                    if el.is_displayed() and el.is_enabled():
-                        # доводим до кликабельности/активности
-                        self._wait_enabled_clickable(driver, el, timeout=10)
-                        try:
-                            el.click()
-                        except Exception:
-                            # скролл к элементу и JS-клик как фолбэк
-                            driver.execute_script("arguments[0].scrollIntoView({block:'center'});", el)
-                            try:
-                                el.click()
-                            except Exception:
-                                driver.execute_script("arguments[0].click();", el)
-                        clicked = True
-                        break
+                    el.click()
                 except Exception:
-                    continue
+                    driver.execute_script("arguments[0].click();", el)
+            log.info("start new booking clicked", extra={"locator": locator[1]})
 
-            if not clicked:
-                raise RuntimeError("Не удалось найти кнопку 'Start New Booking'.")
-            
             # ждём перехода на следующий шаг/страницу бронирования
             try:
                 wait.until(EC.url_changes("https://visa.vfsglobal.com/rus/en/nld/dashboard"))
@@ -543,7 +709,10 @@ class BotThread:
 
             # === Appointment Details ===
             city = (form_data or {}).get("city", "")
-            self._fill_appointment_details(city=city, subcategory="SEAMEN")
+            subcategory = "SEAMEN"
+            self._set_step("appointment_details")
+            self._fill_appointment_details(city=city, subcategory=subcategory)
+            log.info("appointment details filled", extra={"city": city, "subcategory": subcategory})
 
             # ждём перехода на следующий шаг
             try:
@@ -552,6 +721,7 @@ class BotThread:
                 pass
 
             # добавить задержку 5 секунд
+            self._set_step("check_slots")
 
             if has_captcha(driver):
                 return {
@@ -560,19 +730,26 @@ class BotThread:
                     "message": "infinite captcha",
                 }
 
-            if self._has_no_slots_alert():
+            no_slots = self._find_no_slots()
+            if no_slots:
                 return {
                     "ok": False,
                     "url": driver.current_url,
                     "message": "no application slots",
+                    "no_slots": no_slots,  # какая фраза и где найдена - для разбора ложных срабатываний
                 }
 
+            # что именно доступно: даты/время/количество по категории
             return {
                 "ok": True,
                 "url": driver.current_url,
                 "message": "have application slots!!!",
+                "availability": {subcategory: parse_availability(availability_lines(driver))},
             }
 
+        except JobParked:
+            raise
+
         except Exception as e:
             info = {
                 "ok": False,
@@ -589,4 +766,16 @@ class BotThread:
             if "no_application_slots" in str(e):
                 info["message"] = "no_application_slots"
 
+            # скриншот/DOM/консоль на момент падения; запись на диск - в фоне
+            try:
+                e.artifact_id = artifact_store.capture(
+                    driver, reason=f"{type(e).__name__}: {e}",
+                    context={"city": (form_data or {}).get("city"), "message": info["message"],
+                             "job_id": job_id_var.get()},
+                )
+            except Exception:
+                pass
+            log.warning("scenario failed at %s", info["url"], exc_info=True,
+                        extra={"artifact_id": getattr(e, "artifact_id", None)})
+
             raise
\ No newline at end of file